@@ -0,0 +1,94 @@
+"""
+邮件正文提取微基准
+
+读取语料目录下的 .eml 文件，分别用旧的 BeautifulSoup 路径和 mime_text 快速路径提取正文，
+输出每秒解析的邮件数。
+
+用法：
+    python benchmarks/bench_mime.py [语料目录] [--rounds N]
+"""
+
+import argparse
+import email
+import sys
+import textwrap
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from email_assistant import mime_text
+from email_assistant.mime_text import clean_text, extract_body
+
+DEFAULT_CORPUS = Path(__file__).parent / "corpus"
+
+
+def legacy_get_email_content(msg) -> str:
+    """优化前 EmailClient.get_email_content 的实现，作为对照"""
+    from bs4 import BeautifulSoup
+
+    content = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            if part.get_content_type() == "text/plain":
+                encoding = part.get_content_charset() or 'utf-8'
+                content = part.get_payload(decode=True).decode(encoding=encoding, errors='ignore')
+                break
+            elif part.get_content_type() == "text/html":
+                html = part.get_payload(decode=True).decode('utf-8', errors='ignore')
+                soup = BeautifulSoup(html, 'html.parser')
+                content = soup.get_text()
+    else:
+        encoding = msg.get_content_charset() or 'utf-8'
+        content = msg.get_payload(decode=True).decode(encoding=encoding, errors='ignore')
+    if content.startswith("BEGIN:VCALENDAR"):
+        return content
+    dedented_text = textwrap.dedent(content).strip()
+    lines = [line for line in dedented_text.splitlines()
+             if line.strip()
+             and not line.startswith('发件人：')
+             and not line.startswith('收件人：')
+             and not line.startswith('抄送：')]
+    wrapped_text = textwrap.fill('\n'.join(lines), width=100)
+    return wrapped_text.replace(' _____ ', '\n_____\n')
+
+
+def fast_get_email_content(msg) -> str:
+    return clean_text(extract_body(msg))
+
+
+def load_corpus(corpus: Path) -> List[bytes]:
+    files = sorted(corpus.glob("**/*.eml"))
+    if not files:
+        raise SystemExit(f"语料目录中没有 .eml 文件: {corpus}")
+    return [f.read_bytes() for f in files]
+
+
+def bench(name: str, fn: Callable, raw_messages: List[bytes], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for raw in raw_messages:
+            fn(email.message_from_bytes(raw))
+    elapsed = time.perf_counter() - start
+    rate = len(raw_messages) * rounds / elapsed
+    print(f"{name:<10} {rate:>10.1f} 封/秒  ({elapsed:.3f}s)")
+    return rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="邮件正文提取微基准")
+    parser.add_argument("corpus", nargs="?", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    raw_messages = load_corpus(args.corpus)
+    total_bytes = sum(len(raw) for raw in raw_messages)
+    print(f"语料: {len(raw_messages)} 封邮件, {total_bytes / 1024:.1f} KB, "
+          f"HTML引擎: {mime_text.html_to_text.__name__}")
+
+    legacy = bench("legacy", legacy_get_email_content, raw_messages, args.rounds)
+    fast = bench("fast", fast_get_email_content, raw_messages, args.rounds)
+    print(f"加速比: {fast / legacy:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+对比两次基准测试结果
+
+逐项输出基线与当前结果的数值和变化百分比，吞吐量越高越好，耗时越低越好。
+
+用法：
+    python -m benchmarks.compare baseline.json current.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+# 指标名后缀 -> 数值越大越好
+HIGHER_IS_BETTER = {"_per_sec": True, "_ms": False, "seconds": False}
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, float(value)
+
+
+def direction(metric: str):
+    for suffix, higher in HIGHER_IS_BETTER.items():
+        if metric.endswith(suffix) and not metric.endswith("build_seconds"):
+            return higher
+    return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """打印对比结果，返回退化的指标数量"""
+    base_metrics = dict(flatten(baseline["results"]))
+    regressions = 0
+    print(f"基线: {baseline['environment'].get('git_revision')}  当前: {current['environment'].get('git_revision')}")
+    for metric, value in flatten(current["results"]):
+        higher = direction(metric)
+        if higher is None or metric not in base_metrics:
+            continue
+        old = base_metrics[metric]
+        change = (value - old) / old * 100 if old else 0.0
+        regressed = (change < -threshold) if higher else (change > threshold)
+        regressions += regressed
+        flag = "退化" if regressed else ""
+        print(f"{metric:<55} {old:>12.3f} {value:>12.3f} {change:>+8.1f}% {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="判定退化的变化百分比")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    current = json.loads(args.current.read_text(encoding="utf-8"))
+    return 1 if compare(baseline, current, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+合成邮件语料生成器
+
+按固定随机种子生成可复现的 .eml 语料：中文纯文本、HTML 营销邮件、回复链和会议邀请。
+
+用法：
+    python -m benchmarks.corpus 输出目录 [--count N] [--seed S]
+"""
+
+import argparse
+import random
+from email.header import Header
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+SENDERS = [
+    "张三 <zhang.san@example.com>",
+    "李四 <li.si@example.com>",
+    "王五 <wang.wu@example.com>",
+    "系统通知 <noreply@example.com>",
+]
+TOPICS = ["IT采购计划", "堡垒机报价", "大数据平台JVM监控", "季度预算", "合同到期提醒", "周会安排"]
+PHRASES = [
+    "请于本周五前提交{topic}的进度说明，谢谢。",
+    "附件为{topic}的相关材料，敬请查收。",
+    "关于{topic}，目前在测试环境已通过测试，更多细节见附件文档。",
+    "需要各部门配合完成{topic}的梳理工作，如有问题请及时反馈。",
+    "待办：{topic}方案评审，时间另行通知。",
+]
+TZ = timezone(timedelta(hours=8))
+
+
+def _body(rng: random.Random, topic: str, lines: int) -> str:
+    return "\n".join(rng.choice(PHRASES).format(topic=topic) for _ in range(lines))
+
+
+def _headers(msg, rng: random.Random, index: int, subject: str, date: datetime):
+    msg['Subject'] = Header(subject, 'utf-8')
+    msg['From'] = rng.choice(SENDERS)
+    msg['To'] = "马老师 <chenxin.ma@example.com>"
+    msg['Date'] = format_datetime(date)
+    msg['Message-ID'] = f"<bench-{index}@example.com>"
+
+
+def make_message(rng: random.Random, index: int, base_date: datetime) -> bytes:
+    topic = rng.choice(TOPICS)
+    date = base_date + timedelta(minutes=index * 7)
+    kind = rng.random()
+
+    if kind < 0.5:
+        msg = MIMEText(_body(rng, topic, rng.randint(3, 30)), 'plain', 'utf-8')
+        _headers(msg, rng, index, topic, date)
+    elif kind < 0.75:
+        rows = "".join(f"<tr><td>{topic} 第{i}项</td><td>￥{rng.randint(1, 9999)}.00</td></tr>"
+                       for i in range(rng.randint(20, 400)))
+        html = f"<html><head><style>td{{padding:4px}}</style></head><body><h1>{topic}</h1><table>{rows}</table></body></html>"
+        msg = MIMEMultipart('alternative')
+        _headers(msg, rng, index, f"【通知】{topic}", date)
+        msg.attach(MIMEText(html, 'html', rng.choice(['utf-8', 'gbk'])))
+    elif kind < 0.95 and index > 0:
+        parent = rng.randrange(0, index)
+        quoted = _body(rng, topic, rng.randint(5, 20))
+        msg = MIMEText(f"{_body(rng, topic, 2)}\n_____\n发件人：{rng.choice(SENDERS)}\n{quoted}", 'plain', 'utf-8')
+        _headers(msg, rng, index, f"回复：{topic}", date)
+        msg['In-Reply-To'] = f"<bench-{parent}@example.com>"
+        msg['References'] = f"<bench-{parent}@example.com>"
+    else:
+        start = date + timedelta(days=1)
+        ical = "\r\n".join([
+            "BEGIN:VCALENDAR", "VERSION:2.0", "BEGIN:VEVENT",
+            f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+            f"DTEND:{(start + timedelta(hours=1)).strftime('%Y%m%dT%H%M%S')}",
+            f"SUMMARY:{topic}讨论会", "LOCATION:3楼会议室",
+            "END:VEVENT", "END:VCALENDAR", ""
+        ])
+        msg = MIMEText(ical, 'calendar', 'utf-8')
+        _headers(msg, rng, index, f"会议邀请：{topic}讨论会", date)
+    return msg.as_bytes()
+
+
+def generate_corpus(count: int, seed: int = 42, base_date: datetime = datetime(2025, 8, 18, 8, 0, tzinfo=TZ)) -> List[bytes]:
+    """生成 count 封邮件原文"""
+    rng = random.Random(seed)
+    return [make_message(rng, i, base_date) for i in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成合成邮件语料")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    for i, raw in enumerate(generate_corpus(args.count, args.seed)):
+        (args.output / f"{i:06d}.eml").write_bytes(raw)
+    print(f"已生成 {args.count} 封邮件: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+基准测试使用的本地替身：内存 IMAP 客户端和 OpenAI 兼容的嵌入/对话服务。
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+
+class FakeIMAP:
+    """imaplib.IMAP4 的内存替身，实现 EmailClient 用到的接口"""
+
+    def __init__(self, messages: List[bytes], latency: float = 0.0):
+        self.messages = messages
+        self.latency = latency
+
+    def login(self, username, password):
+        return 'OK', [b'LOGIN completed']
+
+    def select(self, folder="INBOX"):
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def search(self, charset, *criteria):
+        return 'OK', [b" ".join(str(i + 1).encode() for i in range(len(self.messages)))]
+
+    def fetch(self, message_id, parts):
+        if self.latency:
+            time.sleep(self.latency)
+        raw = self.messages[int(message_id) - 1]
+        return 'OK', [(f"{int(message_id)} (RFC822 {{{len(raw)}}}".encode(), raw), b')']
+
+    def close(self):
+        return 'OK', []
+
+    def logout(self):
+        return 'BYE', []
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """按文本哈希生成确定的向量"""
+    rng = random.Random(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest())
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+class FakeOpenAIServer:
+    """OpenAI 兼容的本地服务，支持 /v1/embeddings 和 /v1/chat/completions
+
+    latency 为每个请求的固定延迟（秒），用于模拟远程服务。
+    """
+
+    def __init__(self, latency: float = 0.0, chat_latency: float = 0.0, dim: int = 1024):
+        self.latency = latency
+        self.chat_latency = chat_latency
+        self.dim = dim
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                server.requests += 1
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+                if self.path.endswith("/embeddings"):
+                    time.sleep(server.latency)
+                    inputs = body.get("input", "")
+                    inputs = inputs if isinstance(inputs, list) else [inputs]
+                    payload = {
+                        "object": "list",
+                        "model": body.get("model", ""),
+                        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(str(text), server.dim)}
+                                 for i, text in enumerate(inputs)],
+                        "usage": {"prompt_tokens": sum(len(str(t)) for t in inputs),
+                                  "total_tokens": sum(len(str(t)) for t in inputs)},
+                    }
+                elif self.path.endswith("/chat/completions"):
+                    time.sleep(server.chat_latency)
+                    prompt = json.dumps(body.get("messages", []), ensure_ascii=False)
+                    content = "## 今日摘要\n- 基准测试生成的摘要内容"
+                    payload = {
+                        "id": "chatcmpl-bench",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", ""),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content),
+                                  "total_tokens": len(prompt) + len(content)},
+                    }
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
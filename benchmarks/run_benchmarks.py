@@ -0,0 +1,260 @@
+"""
+离线基准测试
+
+使用合成语料、内存 IMAP 替身和本地 OpenAI 兼容服务，测量以下热点路径：
+
+- fetch_emails：每秒获取并解析的邮件数
+- save_emails_to_db：每秒向量化入库的分段数
+- search_similar_emails：不同向量规模下的 p50/p99 延迟
+- generate_summary：单日摘要的端到端耗时
+
+结果写入 JSON 文件，可用 benchmarks/compare.py 对比两个版本。
+
+用法：
+    python -m benchmarks.run_benchmarks [--output results.json] [--emails 500]
+        [--vectors 10000,100000,1000000] [--latency 0.005] [--chat-latency 0.2]
+        [--local-embedding BAAI/bge-large-zh-v1.5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import sqlite_vec
+
+from email_assistant import ai_processor
+from email_assistant.ai_processor import AIProcessor
+from email_assistant.content_codec import get_codec
+from email_assistant.embedding_backend import EmbeddingBackend, LocalEmbeddingBackend
+from email_assistant.email_processor import EmailClient, EmailPresistence
+from email_assistant.mime_parse import MessageParsePool
+
+from .corpus import generate_corpus
+from .fakes import FakeIMAP, FakeOpenAIServer
+
+SUMMARY_DATE = date(2025, 8, 18)
+VECTOR_DIM = 1024
+
+
+def open_db(db_file: str) -> sqlite3.Connection:
+    """与 main.get_conn 相同的连接初始化"""
+    conn = sqlite3.connect(db_file)
+    conn.enable_load_extension(True)
+    sqlite_vec.load(conn)
+    conn.enable_load_extension(False)
+    get_codec(db_file).register(conn)
+    return conn
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def bench_fetch(messages: List[bytes], workers: Optional[int]) -> Dict[str, Any]:
+    client = EmailClient("localhost", 993, "bench", "bench")
+    client.client = FakeIMAP(messages)  # pyright: ignore[reportAttributeAccessIssue]
+    pool = MessageParsePool(workers=workers)
+    try:
+        start = time.perf_counter()
+        count = 0
+        async for _ in client.fetch_emails("INBOX", parse_pool=pool):
+            count += 1
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+        client.client = None
+    return {"messages": count, "workers": pool.workers, "seconds": elapsed, "messages_per_sec": count / elapsed}
+
+
+async def bench_save(messages: List[bytes], db_file: str, base_url: str, compress: bool,
+                     backend: Optional[EmbeddingBackend] = None) -> Dict[str, Any]:
+    client = EmailClient("localhost", 993, "bench", "bench")
+    client.client = FakeIMAP(messages)  # pyright: ignore[reportAttributeAccessIssue]
+    emails = [email async for email in client.fetch_emails("INBOX")]
+    client.client = None
+
+    EmailPresistence.init_database(db_file)
+    persistence = EmailPresistence(db_file, base_url, compress_content=compress, embedding_backend=backend)
+    persistence.connect()
+    try:
+        start = time.perf_counter()
+        for email in emails:
+            await persistence.save_emails_to_db(email)
+        persistence.commit()
+        elapsed = time.perf_counter() - start
+        segments = persistence.conn.execute("SELECT count(1) FROM email_vectors").fetchone()[0]  # pyright: ignore[reportOptionalMemberAccess]
+    finally:
+        persistence.close()
+    return {"emails": len(emails), "segments": segments, "seconds": elapsed,
+            "segments_per_sec": segments / elapsed, "compress": compress}
+
+
+def populate_vectors(db_file: str, count: int, vectors_per_email: int = 5, chunk: int = 10000):
+    """直接写入随机向量，绕过嵌入服务以便快速构造大规模索引"""
+    EmailPresistence.init_database(db_file)
+    conn = open_db(db_file)
+    rng = np.random.default_rng(42)
+    email_count = (count + vectors_per_email - 1) // vectors_per_email
+    conn.executemany('''
+        INSERT INTO emails (uid, subject, sender, recipient, date, content, folder, snippet)
+        VALUES (?, ?, 'bench@example.com', 'bench@example.com', ?, ?, 'INBOX', ?)
+    ''', ((uid, f"邮件 {uid}", datetime(2025, 8, 18), f"正文 {uid}", f"正文 {uid}") for uid in range(1, email_count + 1)))
+    for offset in range(0, count, chunk):
+        size = min(chunk, count - offset)
+        vectors = rng.standard_normal((size, VECTOR_DIM), dtype=np.float32)
+        conn.executemany('''
+            INSERT INTO email_vectors (uid, embedding) VALUES (?, ?)
+        ''', (((offset + i) // vectors_per_email + 1, vectors[i].tobytes()) for i in range(size)))
+    conn.commit()
+    conn.close()
+
+
+async def bench_search(db_file: str, base_url: str, vectors: int, queries: int, top_k: int,
+                       backend: Optional[EmbeddingBackend] = None) -> Dict[str, Any]:
+    build_start = time.perf_counter()
+    populate_vectors(db_file, vectors)
+    build_seconds = time.perf_counter() - build_start
+
+    processor = AIProcessor(base_url, embedding_backend=backend)
+    conn = open_db(db_file)
+    latencies = []
+    try:
+        for i in range(queries):
+            start = time.perf_counter()
+            await processor.search_similar_emails(f"堡垒机报价 {i}", conn, top_k=top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        conn.close()
+    return {"vectors": vectors, "queries": queries, "top_k": top_k, "build_seconds": build_seconds,
+            "p50_ms": statistics.median(latencies), "p99_ms": percentile(latencies, 99),
+            "mean_ms": statistics.fmean(latencies)}
+
+
+async def bench_summary(db_file: str, base_url: str) -> Dict[str, Any]:
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    # 用 save 基准写入的邮件构造属性数据
+    conn = open_db(db_file)
+    conn.execute('''
+        INSERT OR REPLACE INTO email_attributes (uid, recipient, datetime, content)
+        SELECT uid, '各位同事', '-', subject || '：' || substr(snippet, 1, 120) FROM emails
+    ''')
+    conn.commit()
+
+    processor = AIProcessor(base_url)
+    model = OpenAIModel("bench", provider=OpenAIProvider(base_url=base_url, api_key="bench"))
+    ai_processor.summary_cache.clear()
+    calls = 0
+    original_run = processor.summary_agent.run
+
+    async def counted_run(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return await original_run(*args, **kwargs)
+
+    processor.summary_agent.run = counted_run  # pyright: ignore[reportAttributeAccessIssue]
+    try:
+        with processor.summary_agent.override(model=model):
+            start = time.perf_counter()
+            await processor.generate_summary(SUMMARY_DATE, "我是马老师", conn)
+            elapsed = time.perf_counter() - start
+        emails = conn.execute('''
+            SELECT count(1) FROM emails WHERE local_day = ?
+        ''', (SUMMARY_DATE.isoformat(),)).fetchone()[0]
+    finally:
+        conn.close()
+    return {"emails": emails, "llm_calls": calls, "seconds": elapsed}
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, cwd=Path(__file__).parent).stdout.strip()
+    except Exception:
+        revision = ""
+    try:
+        version = metadata.version("email-assistant")
+    except metadata.PackageNotFoundError:
+        version = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": revision,
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    messages = generate_corpus(args.emails, args.seed)
+    results: Dict[str, Any] = {"environment": environment(), "parameters": vars(args).copy(), "results": {}}
+    results["parameters"]["output"] = str(args.output)
+    # 指定本地模型时使用进程内嵌入，否则使用本地模拟的嵌入服务
+    backend = LocalEmbeddingBackend(args.local_embedding) if args.local_embedding else None
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOpenAIServer(latency=args.latency, chat_latency=args.chat_latency, dim=VECTOR_DIM) as server:
+        print(f"fetch_emails: {len(messages)} 封邮件")
+        results["results"]["fetch_emails"] = await bench_fetch(messages, args.workers)
+
+        print("save_emails_to_db")
+        save_db = os.path.join(tmp, "save.db")
+        results["results"]["save_emails_to_db"] = await bench_save(messages, save_db, server.base_url, args.compress, backend)
+
+        print("generate_summary")
+        results["results"]["generate_summary"] = await bench_summary(save_db, server.base_url)
+
+        search = {}
+        for vectors in args.vectors:
+            print(f"search_similar_emails: {vectors} 条向量")
+            search_db = os.path.join(tmp, f"search-{vectors}.db")
+            search[str(vectors)] = await bench_search(search_db, server.base_url, vectors, args.queries, args.top_k, backend)
+            os.remove(search_db)
+        results["results"]["search_similar_emails"] = search
+    if backend is not None:
+        backend.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="邮件助手离线基准测试")
+    parser.add_argument("--output", type=Path, default=Path("bench-results.json"))
+    parser.add_argument("--emails", type=int, default=500, help="合成邮件数量")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None, help="解析进程数，默认 CPU 核数")
+    parser.add_argument("--vectors", type=lambda s: [int(v) for v in s.split(",") if v],
+                        default=[10000, 100000, 1000000], help="逗号分隔的向量规模")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="嵌入服务单次请求延迟（秒）")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="对话服务单次请求延迟（秒）")
+    parser.add_argument("--compress", action="store_true", help="入库时压缩正文")
+    parser.add_argument("--local-embedding", default="", help="使用进程内嵌入模型（名称或路径）")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(json.dumps(results["results"], ensure_ascii=False, indent=2))
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,23 @@
 """
 
 import sys
-from .main import run, DB_FILE
-from .email_processor import EmailPresistence
+from .config import DB_FILE
 
 def main():
-    """应用入口"""
+    """应用入口，导入包时不加载 Web 应用，按命令导入需要的模块"""
+    from .email_processor import EmailPresistence
+
     if '--init' in sys.argv:
         EmailPresistence.init_database(DB_FILE)
+    elif '--compress' in sys.argv:
+        # 训练压缩字典并重新压缩已有邮件正文
+        EmailPresistence.init_database(DB_FILE)
+        emailPresistence = EmailPresistence(DB_FILE, "", compress_content=True)
+        emailPresistence.connect()
+        count = emailPresistence.compress_contents()
+        emailPresistence.close()
+        print(f"已压缩 {count} 封邮件")
     else:
+        from .main import run
+
         run()
@@ -0,0 +1,70 @@
+"""
+多邮箱账户模块
+
+mail 配置节本身是 0 号账户，mail.accounts 中的每一项是一个附加账户，
+未填写的服务器配置沿用 mail 配置节，例如：
+
+    "mail": {
+        "emailAddress": "a@example.com", "emailPassword": "...", "imapServer": "imap.example.com",
+        "accounts": [
+            {"id": 1, "name": "个人邮箱", "emailAddress": "b@qq.com", "emailPassword": "...",
+             "imapServer": "imap.qq.com"}
+        ]
+    }
+
+邮件 uid 的高 32 位是账户 id，低 32 位是账户邮箱内的编号。emails、email_vectors、
+email_attributes 等以 uid 为键的表因此按账户分区且互不冲突，跨账户检索仍是一次 vec0 查询，
+单个账户的检索在 vec0 中按 uid 范围过滤。0 号账户的 uid 与旧版本相同，无需迁移。
+多个账户的并发同步见 mail_sync 模块。
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from .type import MailAccount
+
+ACCOUNT_SHIFT = 32
+LOCAL_UID_MASK = (1 << ACCOUNT_SHIFT) - 1
+# uid 是 SQLite 的有符号 64 位整数
+MAX_ACCOUNT_ID = (1 << (63 - ACCOUNT_SHIFT)) - 1
+
+
+def make_uid(account_id: int, local_uid: int) -> int:
+    """由账户 id 和账户内编号生成全局 uid"""
+    return (account_id << ACCOUNT_SHIFT) | (local_uid & LOCAL_UID_MASK)
+
+
+def split_uid(uid: int) -> Tuple[int, int]:
+    """全局 uid 拆分为 (账户 id, 账户内编号)"""
+    return uid >> ACCOUNT_SHIFT, uid & LOCAL_UID_MASK
+
+
+def uid_range(account_id: int) -> Tuple[int, int]:
+    """账户的 uid 范围 [start, end)"""
+    return account_id << ACCOUNT_SHIFT, (account_id + 1) << ACCOUNT_SHIFT
+
+
+def _account_from_config(account_id: int, options: Dict[str, Any]) -> MailAccount:
+    return MailAccount(
+        id=account_id,
+        name=options.get("name") or options.get("emailAddress", ""),
+        email_address=options.get("emailAddress", ""),
+        email_password=options.get("emailPassword", ""),
+        imap_server=options.get("imapServer", ""),
+        imap_port=options.get("imapPort", 993),
+    )
+
+
+def load_accounts(mail_config: Dict[str, Any]) -> List[MailAccount]:
+    """读取 mail 配置节中的全部账户，0 号账户在前"""
+    base = {key: value for key, value in mail_config.items() if key != "accounts"}
+    accounts = []
+    if base.get("emailAddress"):
+        accounts.append(_account_from_config(0, base))
+    for i, options in enumerate(mail_config.get("accounts", [])):
+        account_id = options.get("id", i + 1)
+        if not 0 < account_id <= MAX_ACCOUNT_ID:
+            raise ValueError(f"邮箱账户 id 无效: {account_id}")
+        if any(account.id == account_id for account in accounts):
+            raise ValueError(f"邮箱账户 id 重复: {account_id}")
+        accounts.append(_account_from_config(account_id, {**base, **options}))
+    return accounts
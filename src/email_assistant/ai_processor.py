@@ -1,22 +1,28 @@
 """
 AI处理模块
 """
+import asyncio
 import datetime
-import re
+from functools import cached_property
 import sqlite3
 import textwrap
-from typing import List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 
 import cachetools
-import jieba
-from openai import AsyncOpenAI
-from pydantic_ai import Agent
 from sqlite_vec import serialize_float32
 
-from .models import qwen
+from .accounts import uid_range
+from .client_manager import client_manager
+from .embedding_backend import EmbeddingBackend, OpenAIEmbeddingBackend
+from .metrics import CACHE_HITS_TOTAL, CACHE_MISSES_TOTAL, record_tokens, span
+from .task_extract import TaskColumns, extract_tasks, extract_tasks_batch
+from .token_budget import TokenCounter, get_token_counter
 from .type import MailInfo, MailSummaryPrompt
 import logging
 
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
+
 summary_cache = cachetools.LRUCache(maxsize=100)
 
 logger = logging.getLogger(__name__)
@@ -34,38 +40,93 @@ class AIProcessorException(Exception):
 class AIProcessorNoDataException(AIProcessorException):
     pass
 
+# 摘要使用较小的模型以节省成本
+SUMMARY_MODEL = "qwen3-coder-flash"
+SUMMARY_INSTRUCTIONS = textwrap.dedent("""
+    你是一个专业的邮件摘要生成器。
+    你的任务是根据提供的邮件内容生成简洁、准确的摘要，突出关键信息和待办事项。
+    
+    - 输出的摘要文本采用Markdown格式。
+    - 把与你<User/>相关的内如放到前面，把与你<User/>无关的内如放到后面。
+    """)
+
+
+class SummaryBudget:
+    """摘要请求的 token 预算，对应配置项 ai.summary
+
+    Args:
+        context_window: 模型上下文窗口（contextWindow）
+        budget_ratio: 提示词和输出最多占用窗口的比例（budgetRatio）
+        max_output_tokens: 为模型输出预留的 token 数（maxOutputTokens）
+        max_mail_tokens: 单封邮件内容最多占用的 token 数，超出部分截断（maxMailTokens）
+        tokenizer: tiktoken 编码名称，默认按模型选择，"heuristic" 表示按字符估算（tokenizer）
+    """
+
+    def __init__(self, context_window: int = 32768, budget_ratio: float = 0.8,
+                 max_output_tokens: int = 2048, max_mail_tokens: int = 512, tokenizer: str = ""):
+        self.context_window = context_window
+        self.budget_ratio = budget_ratio
+        self.max_output_tokens = max_output_tokens
+        self.max_mail_tokens = max_mail_tokens
+        self.tokenizer = tokenizer
+
+    @property
+    def prompt_tokens(self) -> int:
+        """单次请求提示词可用的 token 数"""
+        return int(self.context_window * self.budget_ratio) - self.max_output_tokens
+
+    @classmethod
+    def from_config(cls, options: Dict[str, Any]) -> "SummaryBudget":
+        return cls(
+            context_window=options.get("contextWindow", 32768),
+            budget_ratio=options.get("budgetRatio", 0.8),
+            max_output_tokens=options.get("maxOutputTokens", 2048),
+            max_mail_tokens=options.get("maxMailTokens", 512),
+            tokenizer=options.get("tokenizer", ""),
+        )
+
+
 class AIProcessor:
     """AI处理类"""
     
-    def __init__(self, embedding_base_url:str, embedding_model: str = "bge-large-zh-v1.5"):
-        # 初始化模型
-        self.embedding_model = AsyncOpenAI(
-                        api_key="cannot be empty",
-                        base_url=embedding_base_url)
-        self.embedding_model_id = embedding_model
-        # 初始化摘要生成agent
-        self.summary_agent = Agent(
-            qwen("qwen3-coder-flash"),  # 使用较小的模型以节省成本
+    def __init__(self, embedding_base_url:str, embedding_model: str = "bge-large-zh-v1.5",
+                 embedding_backend: Optional[EmbeddingBackend] = None,
+                 summary_budget: Optional[SummaryBudget] = None):
+        # 初始化模型，未指定嵌入后端时使用 OpenAI 兼容的嵌入服务
+        self.embedding_backend = embedding_backend or OpenAIEmbeddingBackend(
+            embedding_base_url, model_id=embedding_model)
+        self.summary_budget = summary_budget or SummaryBudget()
+
+    @cached_property
+    def summary_agent(self) -> "Agent":
+        """摘要生成agent，pydantic_ai 加载较慢，第一次生成摘要时再创建"""
+        from pydantic_ai import Agent
+
+        from .models import qwen
+
+        return Agent(
+            qwen(SUMMARY_MODEL, settings={"max_tokens": self.summary_budget.max_output_tokens}),
             output_type=str,
-            instructions=textwrap.dedent("""
-            你是一个专业的邮件摘要生成器。
-            你的任务是根据提供的邮件内容生成简洁、准确的摘要，突出关键信息和待办事项。
-            
-            - 输出的摘要文本采用Markdown格式。
-            - 把与你<User/>相关的内如放到前面，把与你<User/>无关的内如放到后面。
-            """)
+            instructions=SUMMARY_INSTRUCTIONS
         )
 
+    def load_token_counter(self) -> TokenCounter:
+        """加载摘要模型的分词器，编码文件可能需要联网下载，应在线程中调用"""
+        return get_token_counter(SUMMARY_MODEL, self.summary_budget.tokenizer)
+
     def _make_mail_summary_prompt(self, whoami:str, summary: Optional[str], email_info_list: List[MailInfo])->str:
         prompt = MailSummaryPrompt(
             user=f"你是{whoami}",
-            work_content="结合历史摘要<HistoryDailySummary/>和新的邮件内容<MailContents/>输出完整的摘要。注意不要丢失历史摘要的信息。",
+            work_content="结合历史摘要<HistoryDailySummary/>和新的邮件内容<MailContents/>输出完整的摘要。注意不要丢失历史摘要的信息。"
+                         "<Thread/>相同的邮件属于同一会话，请合并为一条。",
             history_daily_summary=summary,
             mail_contents=email_info_list
         )
         prompt_str = prompt.to_xml(encoding='UTF-8',
                              standalone=True).decode('utf-8') # pyright: ignore[reportReturnType, reportAttributeAccessIssue]
-        logger.info(prompt_str)
+        # 提示词只在 DEBUG 级别记录，未启用时不做格式化
+        logger.debug("摘要提示词: %s", prompt_str,
+                     extra={"promptChars": len(prompt_str), "mailCount": len(email_info_list)})
         return prompt_str
 
     async def generate_summary(self, date: datetime.date, whoami:str, conn: sqlite3.Connection) -> str:
@@ -74,152 +135,146 @@ class AIProcessor:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
-        count = 0
-        row = cursor.execute(
+        # 查询指定日期的邮件属性数据，local_day 索引按会话顺序返回当天的邮件
+        rows = cursor.execute(
             """
             SELECT 
-                count(1)
+                emails.uid, 
+                email_attributes.recipient || ' ' || emails.recipient as recipient, 
+                email_attributes.datetime,
+                email_attributes.content,
+                emails.thread_id,
+                email_threads.subject as thread_subject,
+                email_threads.message_count as thread_size
             FROM emails
             INNER JOIN email_attributes
             ON emails.uid = email_attributes.uid
-            WHERE emails.date between date(?) and date(?, '+1 day')
+            LEFT JOIN email_threads
+            ON emails.thread_id = email_threads.id
+            WHERE emails.local_day = ?
+            order by emails.thread_id, emails.uid
             """,
-            [date.isoformat(), date.isoformat()]
-        ).fetchone()
-        if row:
-            count = row[0]
-            if count == 0:
-                raise AIProcessorNoDataException(f"{date.strftime('%Y-%m-%d')} 没有邮件内容")
-            
+            [date.isoformat()]
+        ).fetchall()
+        count = len(rows)
+        if count == 0:
+            raise AIProcessorNoDataException(f"{date.strftime('%Y-%m-%d')} 没有邮件内容")
+
         # 根据whoami count date 查询缓存
         key = f"{whoami}_{count}_{date.isoformat()}"
         if key in summary_cache:
+            CACHE_HITS_TOTAL.inc(cache="summary")
             return summary_cache[key]
+        CACHE_MISSES_TOTAL.inc(cache="summary")
 
-        # 查询指定日期的邮件属性数据
-        cursor.execute(
-            """
-            SELECT 
-                emails.uid, 
-                email_attributes.recipient || ' ' || emails.recipient as recipient, 
-                email_attributes.datetime,
-                email_attributes.content
-            FROM emails
-            INNER JOIN email_attributes
-            ON emails.uid = email_attributes.uid
-            WHERE emails.date between date(?) and date(?, '+1 day')
-            order by emails.uid
-            """,
-            [date.isoformat(), date.isoformat()]
-        )
-        
-        rows = cursor.fetchall()
-        if not rows:
-            raise AIProcessorException(f"{date.strftime('%Y-%m-%d')} 没有邮件内容")
-
-        # 初始化摘要内容
-        char_count = 0
-        email_info_list = []
+        # 按 token 预算打包邮件：每次请求包含历史摘要和尽可能多的邮件，单封邮件的内容有上限
+        budget = self.summary_budget
+        counter = await asyncio.to_thread(self.load_token_counter)
+        # 指令、提示词模板和每封邮件的 XML 标签是固定开销，只计算一次
+        fixed_tokens = counter.count(SUMMARY_INSTRUCTIONS) + counter.count(
+            self._make_mail_summary_prompt(whoami, None, []))
+        mail_tag_tokens = counter.count(MailInfo(recipient="", attention_datetime="", content="", thread="")
+                                        .to_xml(encoding='UTF-8').decode('utf-8'))  # pyright: ignore[reportAttributeAccessIssue]
         summary = None
+        history_tokens = 0
+        batch_tokens = 0
+        email_info_list: List[MailInfo] = []
         
-        # 逐条处理邮件内容，控制每次传递给agent的内容小于2000字符
         for row in rows:
             recipient = row['recipient'] or ''
-            content = row['content'] or ''
+            content = counter.truncate(row['content'] or '', budget.max_mail_tokens)
             attention_datetime = row['datetime'] or ''
             
+            # 多封邮件的会话通过编号关联，避免重复传递引用的历史内容
+            thread = None
+            if row['thread_id'] is not None and (row['thread_size'] or 0) > 1:
+                thread = f"#{row['thread_id']} {row['thread_subject'] or ''}".strip()
+
             # 构造邮件信息
             email_info = MailInfo(
                 recipient=recipient,
                 attention_datetime=attention_datetime,
-                content=content
+                content=content,
+                thread=thread
             )
-            mail_info_length = len(email_info.to_xml(encoding='UTF-8').decode('utf-8')) # pyright: ignore[reportAttributeAccessIssue]
+            mail_tokens = (mail_tag_tokens + counter.count(recipient) + counter.count(attention_datetime)
+                           + counter.count(content) + counter.count(thread))
 
-            # 如果当前摘要加上新邮件信息超过2000字符，或者这是第一条邮件，则生成摘要
-            if char_count + mail_info_length > 2000:
-                # 调用agent生成摘要
+            # 加入这封邮件会超出预算时，先用已有的邮件生成摘要；每次请求至少包含一封邮件
+            if email_info_list and fixed_tokens + history_tokens + batch_tokens + mail_tokens > budget.prompt_tokens:
                 prompt = self._make_mail_summary_prompt(whoami, summary, email_info_list)
-                result = await self.summary_agent.run(prompt)
+                result = await self._run_summary_agent(prompt)
 
                 summary = result.output
-                char_count = result.usage().response_tokens or 0
-
-                email_info_list.clear()
+                history_tokens = counter.count(summary)
+                batch_tokens = 0
+                email_info_list = []
 
             email_info_list.append(email_info)
-            char_count += mail_info_length
+            batch_tokens += mail_tokens
             
         # 处理最后一批邮件内容
-        if len(email_info_list) > 0:
-            prompt = self._make_mail_summary_prompt(whoami, summary, email_info_list)
-            result = await self.summary_agent.run(prompt)
-            summary_cache[key] = result.output
+        prompt = self._make_mail_summary_prompt(whoami, summary, email_info_list)
+        result = await self._run_summary_agent(prompt)
+        summary_cache[key] = result.output
+        return result.output
 
-            return result.output
-        else:
-            raise AIProcessorException(f"{date.strftime('%Y-%m-%d')} 的邮件摘要生成失败")
+    async def _run_summary_agent(self, prompt: str):
+        """调用摘要agent并记录耗时和token数"""
+        from .models import DASHSCOPE_BASE_URL
+
+        agent = self.summary_agent
+        with span("llm"):
+            result = await client_manager.call(DASHSCOPE_BASE_URL, agent.run, prompt)
+        record_tokens(getattr(self.summary_agent.model, "model_name", "summary"), result.usage())
+        return result
 
-    
     def extract_tasks(self, text: str) -> List[str]:
         """从文本中提取任务"""
-        tasks = []
-        
-        # 使用正则表达式匹配常见的任务关键词
-        task_patterns = [
-            r'(?:(?:需要|请|要|应该|必须|务必|得).*?)(?:完成|做|处理|执行|实施|开展|进行|推进|落实)',
-            r'(?:任务|工作|事项).*?(?:：|:)',
-            r'(?:待办|TODO|To-do).*?(?:：|:)',
-            r'- \[ \] .*',  # Markdown未完成任务项
-        ]
-        
-        for pattern in task_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            tasks.extend(matches)
-        
-        # 使用jieba分词进行更智能的识别
-        words = jieba.lcut(text)
-        task_indicators = ['任务', '工作', '待办', '计划', '安排']
-        for i, word in enumerate(words):
-            if word in task_indicators and i < len(words) - 1:
-                # 简单的任务提取逻辑
-                task = word + words[i+1] if i+1 < len(words) else word
-                tasks.append(task)
-        
-        # 去重并清理
-        tasks = list(set(tasks))
-        tasks = [task.strip(' -[]') for task in tasks if len(task.strip()) > 2]
-        
-        return tasks
+        return extract_tasks(text)
+
+    def extract_tasks_batch(self, texts: List[str], workers: int = 1) -> TaskColumns:
+        """批量提取任务，结果按列返回"""
+        return extract_tasks_batch(texts, workers=workers)
 
     async def generate_embedding(self, text: str) -> List[float]:
         """生成文本嵌入向量"""
-        query_embedding = \
-            await self.embedding_model.embeddings.create(input=text, 
-                                                         model=self.embedding_model_id)
-        return query_embedding.data[0].embedding
+        return await self.embedding_backend.embed_one(text)
     
     async def search_similar_emails(self, query: str, conn:sqlite3.Connection, 
-                                    folder: Optional[str] = None, top_k: int = 5) -> List[dict]:
-        """搜索相似邮件"""
+                                    folder: Optional[str] = None, top_k: int = 5,
+                                    account_id: Optional[int] = None) -> List[dict]:
+        """搜索相似邮件，未指定 account_id 时在全部账户中检索"""
         # 生成查询向量
         query_embedding = await self.generate_embedding(query)
-        logger.info(f"query: {query}")
+        logger.info("query: %s", query)
         
         # 连接数据库
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        
-        # 构建查询语句
+
+        # 账户按 uid 范围在 vec0 中过滤，文件夹在关联邮件表后过滤
+        vec_filter = ""
+        params: List[Union[bytes, int, str]] = [serialize_float32(query_embedding), top_k]
+        if account_id is not None:
+            vec_filter = "AND email_vectors.uid >= ? AND email_vectors.uid < ?"
+            params.extend(uid_range(account_id))
+        email_filter = ""
         if folder:
+            email_filter = "WHERE emails.folder = ?"
+            params.append(folder)
+        
+        with span("vec_query"):
             cursor.execute(
-                """
+                f"""
                 SELECT
                     emails.uid,
+                    emails.account_id,
                     emails.subject,
                     emails.sender,
                     emails.date,
-                    emails.content,
+                    email_content(emails.content, emails.content_codec) as content,
+                    emails.snippet,
                     vec.distance
                 FROM
                     emails
@@ -233,49 +288,21 @@ class AIProcessor:
                             distance
                         FROM email_vectors
                         WHERE embedding MATCH ?
-                            AND k = ?                    
+                            AND k = ?
+                            {vec_filter}
                         ORDER BY distance
                     ) sub
                     GROUP BY uid
                 ) vec ON emails.uid = vec.uid
-                WHERE emails.folder = ?
+                {email_filter}
                 ORDER BY vec.distance ASC
                 """,
-                [serialize_float32(query_embedding), top_k, folder])
+                params)
+
+            rows = cursor.fetchall()
 
-        else:
-            cursor.execute(
-                """
-                SELECT
-                    emails.uid,
-                    emails.subject,
-                    emails.sender,
-                    emails.date,
-                    emails.content,
-                    vec.distance
-                FROM
-                    emails
-                INNER JOIN (
-                    SELECT 
-                        uid,
-                        min(distance) as distance
-                    FROM (
-                        SELECT
-                            email_vectors.uid,
-                            distance
-                        FROM email_vectors
-                        WHERE embedding MATCH ?
-                            AND k = ?                    
-                        ORDER BY distance
-                    ) sub
-                    GROUP BY uid
-                ) vec ON emails.uid = vec.uid
-                ORDER BY vec.distance ASC
-                """,
-                [serialize_float32(query_embedding), top_k])
-        
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             results.append({k: row[k] for k in row.keys()})
 
         return results
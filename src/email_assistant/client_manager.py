@@ -0,0 +1,376 @@
+"""
+共享的模型服务客户端管理模块
+
+嵌入和 LLM 调用统一通过 client_manager 发出：
+- 同一服务地址复用 httpx 连接池（安装 h2 时启用 HTTP/2）
+- 每个服务地址一个令牌桶限速
+- AIMD 自适应并发：成功时缓慢增加并发上限，遇到 429 或超过目标延迟时减半
+- 带抖动的指数退避重试，优先遵循 Retry-After
+- 熔断：连续失败达到阈值后在冷却期内直接失败，冷却后放行一次试探请求
+"""
+
+import asyncio
+import importlib.util
+import random
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+from .metrics import RETRIES_TOTAL
+
+T = TypeVar("T")
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+DEFAULT_OPTIONS: Dict[str, Any] = {
+    "rate": 0,                # 每秒请求数，0 表示不限速，按服务商配额在 endpoints 中配置
+    "burst": 40,              # 令牌桶容量
+    "maxConcurrency": 16,     # 并发上限
+    "minConcurrency": 1,
+    "initialConcurrency": 4,
+    "targetLatency": 0,       # 目标延迟（秒），0 表示只根据 429 调整并发
+    "maxRetries": 5,
+    "backoffBase": 0.5,       # 退避基数（秒）
+    "backoffMax": 30.0,
+    "failureThreshold": 5,    # 连续失败多少次后熔断
+    "resetTimeout": 30.0,     # 熔断冷却时间（秒）
+    "timeout": 60.0,
+}
+
+
+class CircuitOpenException(Exception):
+    """熔断期间拒绝请求"""
+
+
+class TokenBucket:
+    """令牌桶限速，同时支持同步线程和协程"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """取一个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发限制"""
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float = 0):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def _try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    async def acquire(self):
+        delay = 0.005
+        while not self._try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def acquire_sync(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait(0.1)
+            self.in_flight += 1
+
+    def release(self, latency: Optional[float], overloaded: bool = False):
+        """释放并发槽位，并根据本次结果调整上限"""
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded or (self.target_latency and latency is not None and latency > self.target_latency):
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """熔断器"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """放行请求，返回是否为半开状态下的试探请求"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+        raise CircuitOpenException("服务熔断中，请稍后重试")
+
+    def cancel_probe(self):
+        """试探请求没有结果（如被取消）时放回试探机会"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class Endpoint:
+    """单个服务地址的限速、并发和熔断状态"""
+
+    def __init__(self, name: str, options: Dict[str, Any]):
+        self.name = name
+        self.options = options
+        self.bucket = TokenBucket(options["rate"], options["burst"])
+        self.limiter = AdaptiveLimiter(options["initialConcurrency"], options["minConcurrency"],
+                                       options["maxConcurrency"], options["targetLatency"])
+        self.breaker = CircuitBreaker(options["failureThreshold"], options["resetTimeout"])
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    # openai 按需加载，未加载时不可能是它的异常
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ClientManager:
+    """按服务地址共享客户端，并统一限速、重试和熔断"""
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        self.options: Dict[str, Any] = {}
+        self.endpoint_options: Dict[str, Dict[str, Any]] = {}
+        self.endpoints: Dict[str, Endpoint] = {}
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._sync_http: Optional[httpx.Client] = None
+        self._clients: Dict[Tuple[str, str, str], Any] = {}
+        self._lock = threading.Lock()
+        self.configure(options or {})
+
+    def configure(self, options: Dict[str, Any]):
+        """应用配置（对应配置文件的 http 节），endpoints 按服务地址覆盖默认值"""
+        self.options = {**DEFAULT_OPTIONS, **{k: v for k, v in options.items() if k != "endpoints"}}
+        self.endpoint_options = options.get("endpoints", {})
+        self.endpoints.clear()
+
+    def endpoint(self, base_url: str) -> Endpoint:
+        key = str(base_url).rstrip("/")
+        with self._lock:
+            endpoint = self.endpoints.get(key)
+            if endpoint is None:
+                options = {**self.options, **self.endpoint_options.get(key, {})}
+                endpoint = self.endpoints[key] = Endpoint(key, options)
+            return endpoint
+
+    def _limits(self) -> httpx.Limits:
+        maximum = max(self.options["maxConcurrency"], 1)
+        return httpx.Limits(max_connections=maximum * 4, max_keepalive_connections=maximum * 2)
+
+    @property
+    def http2(self) -> bool:
+        return importlib.util.find_spec("h2") is not None
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        if self._async_http is None or self._async_http.is_closed:
+            self._async_http = httpx.AsyncClient(http2=self.http2, limits=self._limits(),
+                                                 timeout=self.options["timeout"])
+        return self._async_http
+
+    def http_client(self) -> httpx.Client:
+        if self._sync_http is None or self._sync_http.is_closed:
+            self._sync_http = httpx.Client(http2=self.http2, limits=self._limits(),
+                                           timeout=self.options["timeout"])
+        return self._sync_http
+
+    def async_openai(self, base_url: str, api_key: str) -> "AsyncOpenAI":
+        """共享连接池的 AsyncOpenAI 客户端，重试由 call() 负责"""
+        key = ("async", str(base_url), api_key)
+        client = self._clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = self._clients[key] = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0,
+                                                      http_client=self.async_http_client())
+        return client
+
+    def openai(self, base_url: str, api_key: str) -> "OpenAI":
+        key = ("sync", str(base_url), api_key)
+        client = self._clients.get(key)
+        if client is None:
+            from openai import OpenAI
+
+            client = self._clients[key] = OpenAI(base_url=base_url, api_key=api_key, max_retries=0,
+                                                 http_client=self.http_client())
+        return client
+
+    def _backoff(self, endpoint: Endpoint, attempt: int, error: BaseException) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, endpoint.options["backoffMax"])
+        # 全抖动指数退避
+        return random.uniform(0, min(endpoint.options["backoffMax"], endpoint.options["backoffBase"] * 2 ** attempt))
+
+    async def call(self, base_url: str, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """通过限速、并发控制、重试和熔断调用异步函数"""
+        endpoint = self.endpoint(base_url)
+        attempt = 0
+        while True:
+            probe = endpoint.breaker.allow()
+            error: Optional[Exception] = None
+            try:
+                await endpoint.bucket.acquire()
+                await endpoint.limiter.acquire()
+                start = time.perf_counter()
+                latency: Optional[float] = None
+                try:
+                    result = await fn(*args, **kwargs)
+                    latency = time.perf_counter() - start
+                except Exception as e:
+                    error = e
+                finally:
+                    # 取消（CancelledError 不是 Exception）时同样释放并发槽位
+                    endpoint.limiter.release(latency, overloaded=error is not None and _status_code(error) == 429)
+            except BaseException:
+                if probe:
+                    endpoint.breaker.cancel_probe()
+                raise
+            if error is None:
+                endpoint.breaker.record_success()
+                return result
+            if not self._should_retry(endpoint, attempt, error):
+                raise error
+            await asyncio.sleep(self._backoff(endpoint, attempt, error))
+            attempt += 1
+
+    def call_sync(self, base_url: str, fn: Callable[..., T], *args, **kwargs) -> T:
+        """call() 的同步版本，供 langextract 等同步调用方使用"""
+        endpoint = self.endpoint(base_url)
+        attempt = 0
+        while True:
+            probe = endpoint.breaker.allow()
+            error: Optional[Exception] = None
+            try:
+                endpoint.bucket.acquire_sync()
+                endpoint.limiter.acquire_sync()
+                start = time.perf_counter()
+                latency: Optional[float] = None
+                try:
+                    result = fn(*args, **kwargs)
+                    latency = time.perf_counter() - start
+                except Exception as e:
+                    error = e
+                finally:
+                    endpoint.limiter.release(latency, overloaded=error is not None and _status_code(error) == 429)
+            except BaseException:
+                if probe:
+                    endpoint.breaker.cancel_probe()
+                raise
+            if error is None:
+                endpoint.breaker.record_success()
+                return result
+            if not self._should_retry(endpoint, attempt, error):
+                raise error
+            time.sleep(self._backoff(endpoint, attempt, error))
+            attempt += 1
+
+    def _should_retry(self, endpoint: Endpoint, attempt: int, error: BaseException) -> bool:
+        if not is_retryable(error):
+            # 参数错误等说明服务可达，不计入熔断
+            endpoint.breaker.record_success()
+            return False
+        endpoint.breaker.record_failure()
+        if attempt >= endpoint.options["maxRetries"] or endpoint.breaker.state == "open":
+            return False
+        RETRIES_TOTAL.inc(client=endpoint.name)
+        return True
+
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
+        if self._sync_http is not None:
+            self._sync_http.close()
+        self._clients.clear()
+
+
+# 进程内共享的客户端管理器，启动时通过 configure() 加载配置
+client_manager = ClientManager()
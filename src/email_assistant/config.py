@@ -8,6 +8,12 @@ from typing import Dict, Any, Optional, Union, TypeVar
 
 ConfigValueT = TypeVar('ConfigValueT', str, int, Dict[str, Any], None)
 
+# 配置文件路径
+CONFIG_FILE = os.environ.get("CONFIG_FILE", "data/config.json")
+
+# 数据库文件路径
+DB_FILE = os.environ.get("DB_FILE", "data/email_assistant.db")
+
 class ConfigManager:
     """配置管理类"""
     
@@ -0,0 +1,131 @@
+"""
+邮件正文压缩模块
+
+emails.content 可选使用 zstd 压缩存储，字典从本地邮件语料训练并保存在 compression_dicts 表中。
+emails.content_codec 记录每行的编码方式：0 为明文，-1 为无字典 zstd，正数为所用字典的 id。
+读取统一经过 ContentCodec.decode，SQL 查询中通过注册的 email_content(content, content_codec) 函数解压。
+"""
+
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖，未安装时只能读写明文
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_PLAIN = 0
+CODEC_ZSTD = -1
+
+# 列表查询使用的摘要长度，摘要列始终明文存储
+SNIPPET_LENGTH = 200
+
+_codecs: Dict[str, "ContentCodec"] = {}
+
+
+def get_codec(db_file: str, enabled: Optional[bool] = None, level: Optional[int] = None) -> "ContentCodec":
+    """获取数据库文件对应的编解码器，同一数据库共享字典缓存
+
+    enabled、level 为 None 时不修改已有编解码器的设置，只读取正文的调用方（如注册 SQL 函数）不传这两个参数。
+    """
+    codec = _codecs.get(db_file)
+    if codec is None:
+        codec = ContentCodec(db_file, enabled=bool(enabled), level=3 if level is None else level)
+        _codecs[db_file] = codec
+    else:
+        if enabled is not None:
+            codec.enabled = enabled and zstandard is not None
+        if level is not None:
+            codec.level = level
+    return codec
+
+
+class ContentCodec:
+    """邮件正文编解码器
+
+    字典一经写入不再修改，按 id 懒加载并缓存；压缩时使用最新训练的字典。
+    """
+
+    def __init__(self, db_file: str, enabled: bool = False, level: int = 3):
+        if enabled and zstandard is None:
+            logger.warning("未安装 zstandard，邮件正文将以明文存储")
+        self.db_file = db_file
+        self.enabled = enabled and zstandard is not None
+        self.level = level
+        self._dicts: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self._compressors: Dict[int, "zstandard.ZstdCompressor"] = {}
+        self._decompressors: Dict[int, "zstandard.ZstdDecompressor"] = {}
+        self._current_dict_id: Optional[int] = None
+
+    def _load_dict(self, dict_id: int) -> "zstandard.ZstdCompressionDict":
+        if dict_id not in self._dicts:
+            conn = sqlite3.connect(self.db_file)
+            try:
+                row = conn.execute("SELECT data FROM compression_dicts WHERE id = ?", (dict_id,)).fetchone()
+            finally:
+                conn.close()
+            if row is None:
+                raise ValueError(f"压缩字典不存在: {dict_id}")
+            self._dicts[dict_id] = zstandard.ZstdCompressionDict(row[0])  # pyright: ignore[reportOptionalMemberAccess]
+        return self._dicts[dict_id]
+
+    def current_dict_id(self, conn: sqlite3.Connection) -> int:
+        """最新字典的 id，没有训练过字典时返回 CODEC_ZSTD"""
+        if self._current_dict_id is None:
+            row = conn.execute("SELECT max(id) FROM compression_dicts").fetchone()
+            self._current_dict_id = row[0] if row and row[0] is not None else CODEC_ZSTD
+        return self._current_dict_id
+
+    def _compressor(self, codec: int) -> "zstandard.ZstdCompressor":
+        if codec not in self._compressors:
+            if codec == CODEC_ZSTD:
+                self._compressors[codec] = zstandard.ZstdCompressor(level=self.level)  # pyright: ignore[reportOptionalMemberAccess]
+            else:
+                self._compressors[codec] = zstandard.ZstdCompressor(  # pyright: ignore[reportOptionalMemberAccess]
+                    level=self.level, dict_data=self._load_dict(codec))
+        return self._compressors[codec]
+
+    def _decompressor(self, codec: int) -> "zstandard.ZstdDecompressor":
+        if codec not in self._decompressors:
+            if zstandard is None:
+                raise RuntimeError("未安装 zstandard，无法读取压缩的邮件正文")
+            if codec == CODEC_ZSTD:
+                self._decompressors[codec] = zstandard.ZstdDecompressor()
+            else:
+                self._decompressors[codec] = zstandard.ZstdDecompressor(dict_data=self._load_dict(codec))
+        return self._decompressors[codec]
+
+    def encode(self, text: str, conn: sqlite3.Connection) -> Tuple[Union[str, bytes], int]:
+        """编码邮件正文，返回 (存储值, 编码方式)"""
+        if not self.enabled:
+            return text, CODEC_PLAIN
+        codec = self.current_dict_id(conn)
+        return self._compressor(codec).compress(text.encode('utf-8')), codec
+
+    def decode(self, value: Union[str, bytes, None], codec: Optional[int]) -> str:
+        """解码邮件正文"""
+        if value is None:
+            return ""
+        if not codec:
+            return value if isinstance(value, str) else value.decode('utf-8')
+        return self._decompressor(codec).decompress(value).decode('utf-8')  # pyright: ignore[reportArgumentType]
+
+    def register(self, conn: sqlite3.Connection):
+        """在连接上注册 email_content(content, content_codec) SQL 函数"""
+        conn.create_function("email_content", 2, self.decode, deterministic=True)
+
+    def train(self, conn: sqlite3.Connection, samples: List[str], dict_size: int = 112640) -> int:
+        """用邮件正文样本训练字典并保存，返回字典 id"""
+        if zstandard is None:
+            raise RuntimeError("未安装 zstandard，无法训练压缩字典")
+        dict_data = zstandard.train_dictionary(dict_size, [s.encode('utf-8') for s in samples])
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO compression_dicts (data) VALUES (?)", (dict_data.as_bytes(),))
+        dict_id = cursor.lastrowid
+        conn.commit()
+        self._dicts[dict_id] = dict_data  # pyright: ignore[reportArgumentType]
+        self._current_dict_id = dict_id
+        return dict_id  # pyright: ignore[reportReturnType]
@@ -0,0 +1,244 @@
+"""
+中文日期表达式解析模块
+
+将抽取结果中的自由文本日期（如“2025年9月底”“下周三下午3点”“3个工作日内”）解析为具体时间，
+相对表达式以邮件日期为基准。只给出日期时返回当天结束时刻，作为截止时间使用；
+“8月20日-8月22日”“上午9点至下午5点”等区间取区间结束作为截止时间。
+"""
+
+import calendar
+import re
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional, Tuple
+
+_NUM = r'[0-9〇零一二两三四五六七八九十]+'
+_CN_DIGITS = {'〇': 0, '零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4,
+              '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_WEEKDAYS = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6, '天': 6,
+             '1': 0, '2': 1, '3': 2, '4': 3, '5': 4, '6': 5, '7': 6}
+_RELATIVE_DAYS = {'今': 0, '明': 1, '后': 2, '大后': 3}
+
+# 日期部分，按从具体到模糊的顺序尝试
+_FULL_DATE = re.compile(
+    rf'(?P<y>\d{{4}}|[〇零一二三四五六七八九]{{4}})\s*[年\-/.]\s*(?P<m>{_NUM})\s*[月\-/.]\s*(?P<d>{_NUM})\s*[日号]?')
+_YEAR_MONTH = re.compile(rf'(?P<y>\d{{4}})\s*年\s*(?P<m>{_NUM})\s*月(?P<part>底|末|初|中|上旬|中旬|下旬)?')
+_MONTH_DAY = re.compile(rf'(?P<m>{_NUM})\s*月\s*(?P<d>{_NUM})\s*[日号]')
+_SLASH_DATE = re.compile(r'(?<![\d/])(?P<m>\d{1,2})/(?P<d>\d{1,2})(?![\d/])')
+_MONTH = re.compile(rf'(?P<which>本|这|下)?(?:个)?(?P<m>{_NUM})?\s*月(?P<part>底|末|初|中|上旬|中旬|下旬)')
+_NEXT_MONTH = re.compile(r'(?P<which>本|这|下)(?:个)?月(?:内)?')
+_DAY = re.compile(rf'(?<![月\d])(?P<d>{_NUM})\s*[日号]')
+_RELATIVE = re.compile(r'(?P<after>大后|后)天|(?P<rel>今|明)(?:天|日|早|晚)')
+_WITHIN = re.compile(rf'(?P<n>{_NUM})\s*(?:个)?(?P<unit>工作日|天|日|周|星期|月)(?:内|之内|以内|后|之后)')
+_WEEKDAY = re.compile(r'(?P<which>下下|下|本|这|上)?(?:个)?(?:周|星期|礼拜)(?P<wd>[一二三四五六日天1-7])')
+_WEEK = re.compile(r'(?P<which>下|本|这)(?:个)?(?:周|星期|礼拜)(?P<part>末|内)?|(?P<weekend>周末)')
+_YEAR_END = re.compile(r'(?:本|今)?年(?:底|末)')
+
+# 时间部分
+_CLOCK = re.compile(r'(?<!\d)(?P<h>\d{1,2})[:：](?P<mi>\d{2})')
+_HOUR = re.compile(
+    rf'(?P<period>凌晨|上午|早上|早晨|中午|下午|傍晚|晚上|今晚|明晚)?\s*(?P<h>{_NUM})\s*[点时](?:(?P<mi>{_NUM})分?|(?P<frac>半|一刻|三刻))?')
+_PERIOD = re.compile(r'(?:今|明|后)?(?P<period>凌晨|上午|早上|早晨|中午|下午|傍晚|晚上|晚)')
+_PM_PERIODS = ('下午', '傍晚', '晚上', '今晚', '明晚', '晚')
+# “晚上12点”指当天结束，即次日零点
+_NIGHT_PERIODS = ('晚上', '今晚', '明晚')
+# 未给出时段的“三点”按工作时间理解为下午
+_WORK_HOURS_START = 7
+# 只给出时段时的截止时刻（时段结束的整点）
+_PERIOD_DEFAULTS = {'凌晨': 6, '上午': 12, '早上': 9, '早晨': 9, '中午': 13,
+                    '下午': 18, '傍晚': 19, '晚上': 24, '晚': 24}
+
+# 区间分隔符，“-”只在日期或时间之后作为分隔符，避免拆开“2025-08-22”
+_RANGE = re.compile(r'\s*(?:至|到|~|～|—|–)\s*|(?<=[日号点分半刻])\s*-\s*')
+
+END_OF_DAY = time(23, 59, 59)
+
+
+class DueDate(NamedTuple):
+    due: datetime
+    # 只给出日期时为 True，due 为当天结束时刻
+    all_day: bool
+
+
+def cn_to_int(text: str) -> int:
+    """中文或阿拉伯数字转整数，支持“十五”“二十三”“二〇二五”"""
+    if text.isdigit():
+        return int(text)
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return (_CN_DIGITS.get(tens, 1) if tens else 1) * 10 + (_CN_DIGITS.get(ones, 0) if ones else 0)
+    value = 0
+    for char in text:
+        if char not in _CN_DIGITS:
+            raise ValueError(f"无法识别的数字: {text}")
+        value = value * 10 + _CN_DIGITS[char]
+    return value
+
+
+def _month_end(year: int, month: int) -> int:
+    return calendar.monthrange(year, month)[1]
+
+
+def _add_months(day: date, months: int) -> Tuple[int, int]:
+    index = day.year * 12 + day.month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def _month_part(year: int, month: int, part: Optional[str]) -> date:
+    """月份中的时段：初、上旬、中、中旬、底，未指定时为月底"""
+    day = {'初': 5, '上旬': 10, '中': 15, '中旬': 20}.get(part or '', _month_end(year, month))
+    return date(year, month, day)
+
+
+def _closest_year(reference: date, month: int, day: int) -> date:
+    """未给出年份时，取离基准日期最近的年份"""
+    candidates = []
+    for year in (reference.year - 1, reference.year, reference.year + 1):
+        try:
+            candidates.append(date(year, month, day))
+        except ValueError:
+            continue
+    if not candidates:
+        raise ValueError(f"无效日期: {month}月{day}日")
+    return min(candidates, key=lambda candidate: abs((candidate - reference).days))
+
+
+def _add_workdays(day: date, count: int) -> date:
+    while count > 0:
+        day += timedelta(days=1)
+        if day.weekday() < 5:
+            count -= 1
+    return day
+
+
+def _parse_date(text: str, reference: date) -> Optional[date]:
+    m = _FULL_DATE.search(text)
+    if m:
+        return date(cn_to_int(m['y']), cn_to_int(m['m']), cn_to_int(m['d']))
+    m = _YEAR_MONTH.search(text)
+    if m:
+        return _month_part(int(m['y']), cn_to_int(m['m']), m['part'])
+    m = _MONTH_DAY.search(text) or _SLASH_DATE.search(text)
+    if m:
+        return _closest_year(reference, cn_to_int(m['m']), cn_to_int(m['d']))
+    m = _RELATIVE.search(text)
+    if m:
+        return reference + timedelta(days=_RELATIVE_DAYS[m['after'] or m['rel']])
+    m = _WITHIN.search(text)
+    if m:
+        n = cn_to_int(m['n'])
+        unit = m['unit']
+        if unit == '工作日':
+            return _add_workdays(reference, n)
+        if unit in ('周', '星期'):
+            return reference + timedelta(weeks=n)
+        if unit == '月':
+            year, month = _add_months(reference, n)
+            return date(year, month, min(reference.day, _month_end(year, month)))
+        return reference + timedelta(days=n)
+    m = _WEEKDAY.search(text)
+    if m:
+        weekday = _WEEKDAYS[m['wd']]
+        monday = reference - timedelta(days=reference.weekday())
+        offset = {'下下': 14, '下': 7, '上': -7}.get(m['which'] or '', 0)
+        day = monday + timedelta(days=weekday + offset)
+        if not m['which'] and day < reference:
+            # “周五”指基准日期之后最近的周五
+            day += timedelta(days=7)
+        return day
+    m = _WEEK.search(text)
+    if m:
+        monday = reference - timedelta(days=reference.weekday())
+        if m['weekend']:
+            return monday + timedelta(days=5)
+        offset = 7 if m['which'] == '下' else 0
+        return monday + timedelta(days=offset + (5 if m['part'] == '末' else 6))
+    m = _MONTH.search(text)
+    if m:
+        if m['m']:
+            month = cn_to_int(m['m'])
+            year = _closest_year(reference, month, 1).year
+        else:
+            year, month = _add_months(reference, 1 if m['which'] == '下' else 0)
+        return _month_part(year, month, m['part'])
+    m = _NEXT_MONTH.search(text)
+    if m:
+        year, month = _add_months(reference, 1 if m['which'] == '下' else 0)
+        return date(year, month, _month_end(year, month))
+    if _YEAR_END.search(text):
+        return date(reference.year, 12, 31)
+    m = _DAY.search(text)
+    if m:
+        day = cn_to_int(m['d'])
+        candidates = []
+        for months in (-1, 0, 1):
+            year, month = _add_months(reference, months)
+            if day <= _month_end(year, month):
+                candidates.append(date(year, month, day))
+        if candidates:
+            return min(candidates, key=lambda candidate: abs((candidate - reference).days))
+    return None
+
+
+def _clock(hour: int, minute: int) -> timedelta:
+    """时刻相对当天零点的偏移，24:00 为次日零点"""
+    if hour > 24 or minute > 59 or (hour == 24 and minute):
+        raise ValueError(f"无效时间: {hour}:{minute:02d}")
+    return timedelta(hours=hour, minutes=minute)
+
+
+def _parse_time(text: str) -> Optional[timedelta]:
+    """解析时间，返回相对当天零点的偏移"""
+    m = _CLOCK.search(text)
+    if m:
+        return _clock(int(m['h']), int(m['mi']))
+    m = _HOUR.search(text)
+    if m:
+        hour = cn_to_int(m['h'])
+        minute = {'半': 30, '一刻': 15, '三刻': 45}.get(m['frac'] or '', 0)
+        if m['mi']:
+            minute = cn_to_int(m['mi'])
+        if m['period'] in _NIGHT_PERIODS and hour == 12:
+            hour = 24
+        elif m['period'] in _PM_PERIODS and hour < 12:
+            hour += 12
+        elif m['period'] == '中午' and hour < 6:
+            hour += 12
+        elif not m['period'] and 0 < hour < _WORK_HOURS_START:
+            hour += 12
+        return _clock(hour, minute)
+    m = _PERIOD.search(text)
+    if m:
+        # 只有“上午”“下午”等时段时，以时段结束作为截止时间
+        return timedelta(hours=_PERIOD_DEFAULTS[m['period']], seconds=-1)
+    return None
+
+
+def parse_due_date(text: str, reference: datetime) -> Optional[DueDate]:
+    """解析截止时间
+    Args:
+        text: 日期表达式，如“2025年9月底”“下周三下午3点”
+        reference: 基准时间，通常为邮件日期（无时区的本地时间）
+    Return:
+        DueDate: 无法解析时返回 None
+    """
+    text = (text or "").strip()
+    if not text or text == "-":
+        return None
+    # 区间取结束部分，结束部分缺少日期时沿用整段文本中的日期（如“8月20日 9点至17点”）
+    end = _RANGE.split(text)[-1] or text
+    try:
+        day = _parse_date(end, reference.date())
+        at = _parse_time(end)
+        if day is None and at is None:
+            day, at = _parse_date(text, reference.date()), _parse_time(text)
+        elif day is None:
+            day = _parse_date(text, reference.date())
+    except ValueError:
+        return None
+    if day is None:
+        if at is None:
+            return None
+        day = reference.date()
+    if at is None:
+        return DueDate(datetime.combine(day, END_OF_DAY), True)
+    return DueDate(datetime.combine(day, time()) + at, False)
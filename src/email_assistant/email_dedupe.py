@@ -0,0 +1,147 @@
+"""
+邮件抽取结果去重模块
+
+群发邮件、抄送副本和转发链会产生大量内容几乎相同的邮件。这里对送入LLM的文档文本
+计算 simhash 指纹，近似重复的邮件直接复用已有的 EmailAttribute，不再调用LLM。
+"""
+
+import hashlib
+import re
+import sqlite3
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .metrics import CACHE_HITS_TOTAL, CACHE_MISSES_TOTAL
+from .type import EmailAttribute
+
+FINGERPRINT_BITS = 64
+# 指纹按16位切成4段，海明距离不超过3的两个指纹至少有一段完全相同
+BAND_BITS = 16
+BAND_COUNT = FINGERPRINT_BITS // BAND_BITS
+SHINGLE_SIZE = 3
+
+_WHITESPACE = re.compile(r'\s+')
+_DIGITS = re.compile(r'\d+')
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：小写、数字替换为占位符、合并空白"""
+    text = _DIGITS.sub('0', text.lower())
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def simhash(text: str) -> int:
+    """计算文本的64位 simhash 指纹（按字符3-gram分片，适用于中英文混排）"""
+    text = normalize_text(text)
+    if len(text) <= SHINGLE_SIZE:
+        shingles = Counter([text])
+    else:
+        shingles = Counter(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            if h >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def split_bands(fingerprint: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(BAND_COUNT)]
+
+
+def _to_signed(fingerprint: int) -> int:
+    """SQLite INTEGER 为有符号64位整数"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def _to_unsigned(fingerprint: int) -> int:
+    return fingerprint + (1 << 64) if fingerprint < 0 else fingerprint
+
+
+class ExtractionDeduplicator:
+    """基于 simhash 的抽取结果去重器
+
+    指纹持久化在 email_fingerprints 表中，查找时按分段索引取候选再比较海明距离，
+    命中后从 email_attributes 表复用已抽取的属性。同一批次内的近似重复邮件只保留
+    一封代表邮件送入LLM，其余邮件复用代表邮件的结果。
+    """
+
+    def __init__(self, conn: sqlite3.Connection, max_distance: int = 3):
+        self.conn = conn
+        self.max_distance = min(max_distance, BAND_COUNT - 1)
+        self.lookups = 0
+        self.hits = 0
+        # 当前批次待LLM抽取的指纹：band -> [(fingerprint, uid)]
+        self._pending: List[Dict[int, List[tuple]]] = [{} for _ in range(BAND_COUNT)]
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def fingerprint(self, text: str) -> int:
+        return simhash(text)
+
+    def lookup(self, fingerprint: int, uid: int) -> Optional[EmailAttribute]:
+        """查找已抽取过的近似重复邮件
+        Args:
+            fingerprint: 文本指纹
+            uid: 当前邮件UID
+        Return:
+            EmailAttribute: 命中时返回复用的属性（uid 已替换为当前邮件），否则返回 None
+        """
+        self.lookups += 1
+        bands = split_bands(fingerprint)
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT f.simhash, a.recipient, a.datetime, a.content
+            FROM email_fingerprints f
+            INNER JOIN email_attributes a ON a.uid = f.uid
+            WHERE f.band0 = ? OR f.band1 = ? OR f.band2 = ? OR f.band3 = ?
+        ''', bands)
+        for row in cursor.fetchall():
+            if hamming_distance(_to_unsigned(row[0]), fingerprint) <= self.max_distance:
+                self.hits += 1
+                CACHE_HITS_TOTAL.inc(cache="dedupe")
+                return EmailAttribute(
+                    uid=uid,
+                    recipient=row[1] or "",
+                    datetime=row[2] or "",
+                    content=row[3] or ""
+                )
+        CACHE_MISSES_TOTAL.inc(cache="dedupe")
+        return None
+
+    def find_pending(self, fingerprint: int) -> Optional[int]:
+        """查找当前批次中已等待抽取的近似重复邮件，返回代表邮件UID"""
+        for i, band in enumerate(split_bands(fingerprint)):
+            for other, uid in self._pending[i].get(band, []):
+                if hamming_distance(other, fingerprint) <= self.max_distance:
+                    self.hits += 1
+                    return uid
+        return None
+
+    def add_pending(self, fingerprint: int, uid: int):
+        for i, band in enumerate(split_bands(fingerprint)):
+            self._pending[i].setdefault(band, []).append((fingerprint, uid))
+
+    def remember(self, uid: int, fingerprint: int):
+        """记录邮件指纹"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO email_fingerprints (uid, simhash, band0, band1, band2, band3)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (uid, _to_signed(fingerprint), *split_bands(fingerprint)))
@@ -2,15 +2,19 @@ import os
 import re
 import sqlite3
 import textwrap
-from typing import Generator, List
+from typing import Dict, Generator, List, Optional
 
 from dotenv import load_dotenv
 from icalendar import Calendar
 import langextract as lx
 from langextract.data import AnnotatedDocument
 from langextract.inference import BaseLanguageModel
-from openai import OpenAI
 
+from .client_manager import client_manager
+from .email_dedupe import ExtractionDeduplicator
+from .email_rules import EmailPreClassifier
+from .email_threading import delta_content
+from .metrics import record_tokens, span
 from .type import Email, EmailAttribute
 
 examples = [
@@ -83,10 +87,8 @@ class QwenDashScopeModel(BaseLanguageModel):
         super().__init__()
         load_dotenv()
         self.model_id = model_id
-        self.client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY", ""),
-            base_url=os.getenv("OPENAI_BASE_URL", ""),
-        )
+        self.base_url = os.getenv("OPENAI_BASE_URL", "")
+        self.client = client_manager.openai(self.base_url, os.getenv("OPENAI_API_KEY", ""))
     
     def infer(self, batch_prompts, **kwargs):
         # Implement inference
@@ -95,15 +97,25 @@ class QwenDashScopeModel(BaseLanguageModel):
             yield [lx.inference.ScoredOutput(score=1.0, output=result)]
     
     def _call_api(self, prompt: str):
-        response = self.client.chat.completions.create(
-            model=self.model_id,
-            messages=[{"role": "user", "content": prompt}, ]
-        )
+        with span("llm"):
+            response = client_manager.call_sync(
+                self.base_url,
+                self.client.chat.completions.create,
+                model=self.model_id,
+                messages=[{"role": "user", "content": prompt}, ]
+            )
+        record_tokens(self.model_id, response.usage)
         return response.choices[0].message.content  # pyright: ignore[reportReturnType]
 
 
-def extract_email_info(emails: List[Email], model_id:str) -> Generator[EmailAttribute, None, None]:
-    """抽取读取邮件，邮件收件对象、关注的日期时间、主要内容"""
+def extract_email_info(emails: List[Email], model_id:str,
+                       pre_classifier: Optional[EmailPreClassifier] = None,
+                       deduplicator: Optional[ExtractionDeduplicator] = None) -> Generator[EmailAttribute, None, None]:
+    """抽取读取邮件，邮件收件对象、关注的日期时间、主要内容
+
+    pre_classifier 命中的模板化邮件（系统通知、自动回复等）在本地生成属性，不调用LLM。
+    deduplicator 命中的近似重复邮件复用已有的抽取结果，不调用LLM。
+    """
     # 过滤出包含icalendar的邮件
     cal_emails = []
     # 过滤出一般邮件
@@ -130,17 +142,45 @@ def extract_email_info(emails: List[Email], model_id:str) -> Generator[EmailAttr
                 )
                 yield row
 
-    docs = [
-        lx.data.Document(
-            text=f"""
+    # 规则预分类，命中的邮件不再交给LLM
+    if pre_classifier is not None:
+        llm_emails = []
+        for email, attr in zip(any_emails, pre_classifier.classify_many(any_emails)):
+            if attr is not None:
+                yield attr
+            else:
+                llm_emails.append(email)
+        any_emails = llm_emails
+
+    docs = []
+    # 近似重复去重：uid -> 指纹，代表邮件uid -> 复用其结果的邮件uid列表
+    fingerprints: Dict[int, int] = {}
+    duplicates: Dict[int, List[int]] = {}
+    for email in any_emails:
+        uid = int(email.uid)
+        text = f"""
                 subject:{email.subject}
                 sender:{email.sender}
-                content:{email.content}
-            """.strip()[:1000],
-            document_id=str(email.uid),
-        )
-        for email in any_emails
-    ]
+                content:{delta_content(email)}
+            """.strip()[:1000]
+        if deduplicator is not None:
+            fingerprint = deduplicator.fingerprint(text)
+            fingerprints[uid] = fingerprint
+            attr = deduplicator.lookup(fingerprint, uid)
+            if attr is not None:
+                deduplicator.remember(uid, fingerprint)
+                yield attr
+                continue
+            rep_uid = deduplicator.find_pending(fingerprint)
+            if rep_uid is not None:
+                duplicates.setdefault(rep_uid, []).append(uid)
+                continue
+            deduplicator.add_pending(fingerprint, uid)
+        docs.append(lx.data.Document(text=text, document_id=str(uid)))
+
+    if not docs:
+        return
+
     lx_prompt = "抽取邮件收件对象、日期时间、主要内容。主要内容要简短，概括到300字以内。"
  
     result = lx.extract(
@@ -167,3 +207,9 @@ def extract_email_info(emails: List[Email], model_id:str) -> Generator[EmailAttr
                     row.content = e.extraction_text
             yield row
 
+            if deduplicator is not None:
+                deduplicator.remember(row.uid, fingerprints[row.uid])
+                for dup_uid in duplicates.get(row.uid, []):
+                    deduplicator.remember(dup_uid, fingerprints[dup_uid])
+                    yield row.model_copy(update={"uid": dup_uid})
+
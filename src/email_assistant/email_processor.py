@@ -2,30 +2,95 @@
 邮件处理模块
 """
 
-from datetime import datetime, timedelta
-import email
-from email.header import decode_header
-from email.utils import parsedate_to_datetime
+import asyncio
+from datetime import datetime, timedelta, timezone, tzinfo
+from email.parser import BytesHeaderParser
+import hashlib
 import imaplib
+import logging
 import sqlite3
 import textwrap
-from typing import AsyncGenerator, Awaitable, Callable, List, Optional, Tuple
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
-from bs4 import BeautifulSoup
-from openai import AsyncOpenAI
 from sqlite_vec import serialize_float32
 import sqlite_vec
 
-from .type import Email, EmailAttribute, EmailVector
+from .accounts import make_uid, uid_range
+from .content_codec import SNIPPET_LENGTH, get_codec
+from .embedding_backend import EmbeddingBackend, OpenAIEmbeddingBackend
+from .email_stats import EmailFacts, EmailStats, StatsKey, is_todo, sender_key
+from .email_threading import add_thread_message, assign_thread, delta_content, update_delta_length
+from .metrics import BYTES_TOTAL, span
+from .mime_parse import MessageParsePool, _message_ids, decode_text, header_decode
+from .mime_text import clean_text, extract_body
+from .outbox import Outbox
+from .raw_archive import RawMessageArchive
+from .tasks import TaskStore
+from .type import Email, EmailAttribute
+from .work_queue import JOB_EMBEDDING, JOB_EXTRACTION, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+# 单次 IMAP FETCH 请求的邮件数
+FETCH_BATCH_SIZE = 200
+
+# 清理已删除邮件时比 IMAP SINCE 日期多留的时间，避免服务器与本地时区不同时误删边界上的邮件
+PRUNE_MARGIN = timedelta(days=1)
+
+# vec0 默认每个 chunk 的向量槽位数
+VECTOR_CHUNK_SIZE = 1024
+
+# 有效向量：所属邮件存在，且由分段表引用；旧版本写入、尚无分段记录的邮件保留全部向量
+LIVE_VECTOR_CONDITION = '''
+    uid IN (SELECT uid FROM emails)
+    AND (id IN (SELECT vector_id FROM email_segments)
+         OR uid NOT IN (SELECT uid FROM email_segments))
+'''
+
+
+def date_columns(date: datetime, tz: Optional[tzinfo] = None) -> Tuple[int, str]:
+    """邮件日期的 UTC 时间戳和本地日期（YYYY-MM-DD）
+
+    没有时区的日期按 UTC 处理（RFC 5322 的 -0000）。tz 为空时使用服务器时区，
+    与 /api/summary/daily 取当天日期的方式一致。
+    """
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp()), date.astimezone(tz).date().isoformat()
+
+
+def segment_content(email_obj: Email) -> List[str]:
+    """将邮件主题和新增正文每5行分为一段"""
+    content = f"{email_obj.subject}\n{delta_content(email_obj)}"
+    lines = content.splitlines()
+    return ['\n'.join(lines[i:i+5]) for i in range(0, len(lines), 5)]
+
+
+def segment_hash(segment: str, model_id: str) -> str:
+    """分段内容哈希，包含模型名称，切换嵌入模型后会重新向量化"""
+    return hashlib.sha1(f"{model_id}\0{segment}".encode("utf-8")).hexdigest()
+
+
+def needs_compaction(stats: Dict[str, int], storage_config: Dict) -> bool:
+    """无效槽位比例超过 storage.vectorCompactRatio（默认 0.3，设为 0 关闭自动压缩）时需要压缩向量表"""
+    ratio = storage_config.get("vectorCompactRatio", 0.3)
+    if ratio <= 0 or stats["capacity"] == 0:
+        return False
+    # 不足一个 chunk 的空闲槽位是正常的预分配
+    wasted = stats["capacity"] - stats["live"] + stats["orphans"]
+    return wasted > VECTOR_CHUNK_SIZE and wasted / stats["capacity"] >= ratio
+
 
 class EmailClient:
     """邮件客户端"""
     
-    def __init__(self, host: str, port: int, username: str, password: str):
+    def __init__(self, host: str, port: int, username: str, password: str, account_id: int = 0):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
+        # 返回的邮件 uid 带有账户 id，见 accounts 模块
+        self.account_id = account_id
         self.client = None
     
     def connect(self):
@@ -56,16 +121,7 @@ class EmailClient:
         self.disconnect()
     
     def header_decode(self, encoded_header:str):
-        if "=?" in encoded_header:
-            decoded_headers = decode_header(encoded_header)
-            decoded_texts = []
-            for decoded_header in decoded_headers:
-                decoded_text = decoded_header[0].decode(decoded_header[1] or 'utf-8')
-                decoded_texts.append(decoded_text)
-
-            return "".join(decoded_texts)
-        else:
-            return encoded_header
+        return header_decode(encoded_header)
     
     def decode_text(self, text) -> Tuple[str, str]:
         """
@@ -73,19 +129,7 @@ class EmailClient:
         :param text: 待解码的文本
         :return: 解码后的文本
         """
-        decoded_parts = decode_header(text)
-        decoded_text:str = ""
-        _encoding:str = ""
-        for part, encoding in decoded_parts:
-            if isinstance(part, bytes):
-                if encoding:
-                    _encoding = encoding
-                    decoded_text += part.decode(encoding, errors='ignore')
-                else:
-                    decoded_text += part.decode(errors='ignore')
-            else:
-                decoded_text += part
-        return decoded_text, _encoding
+        return decode_text(text)
     
     def get_email_content(self, msg):
         """
@@ -94,50 +138,22 @@ class EmailClient:
         :param msg: 邮件消息对象
         :return: 邮件内容的字节流，如果获取失败则返回 None
         """
-        # 获取邮件正文
-        content = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/plain":
-                    encoding = part.get_content_charset() or 'utf-8'
-                    content = \
-                        part.get_payload(decode=True).decode( # pyright:ignore 
-                            encoding=encoding, errors='ignore') 
-                    break
-                elif part.get_content_type() == "text/html":
-                    html = part.get_payload(decode=True).decode('utf-8') # pyright:ignore 
-                    soup = BeautifulSoup(html, 'html.parser')
-                    content = soup.get_text()
-                elif part.get_content_type() in ["multipart/mixed", "multipart/related", "multipart/alternative"]:
-                    continue
-        else:
-            encoding = msg.get_content_charset() or 'utf-8'
-            content = \
-                msg.get_payload(decode=True).decode( # pyright:ignore 
-                    encoding=encoding, errors='ignore')
-        if content.startswith("BEGIN:VCALENDAR"):
-            return content
-        else:
-            dedented_text = textwrap.dedent(content).strip()
-            # 移除 dedented_text 中的空白行
-            lines = [line for line in dedented_text.splitlines() \
-                        if line.strip() \
-                            and not line.startswith('发件人：')
-                            and not line.startswith('收件人：')
-                            and not line.startswith('抄送：')]
-            dedented_text = '\n'.join(lines)
-            wrapped_text = textwrap.fill(dedented_text, width=100)
-            wrapped_text = wrapped_text.replace(' _____ ', '\n_____\n')
-
-            return wrapped_text
+        return clean_text(extract_body(msg))
     
-    async def fetch_emails(self, folder: str = "INBOX", days: int = 3, last_uid:int = 0) -> AsyncGenerator[Email, None]:
-        """获取指定文件夹中的邮件"""
+    async def fetch_emails(self, folder: str = "INBOX", days: int = 3, last_uid:int = 0,
+                           parse_pool: Optional[MessageParsePool] = None,
+                           archive: Optional[RawMessageArchive] = None) -> AsyncGenerator[Email, None]:
+        """获取指定文件夹中的邮件
+
+        parse_pool 为空时在当前线程内逐封解析，大批量回填时传入进程池并行解析。
+        archive 不为空时同时将邮件原文写入本地归档。
+        last_uid 是账户内编号，IMAP 请求在线程中执行，多个账户可以在同一个事件循环中并发同步。
+        """
         if not self.client:
             raise Exception("未连接到邮件服务器")
         
         # 选择文件夹
-        self.client.select(folder)
+        await asyncio.to_thread(self.client.select, folder)
         
         # 计算日期范围
         # 注意：增量获取邮件是按照 最近3天（默认）的邮件进行查询，并获取的邮件UID > 最后已经存储的last_uid
@@ -145,7 +161,8 @@ class EmailClient:
         date = (datetime.now() - timedelta(days=days)).strftime('%d-%b-%Y')
 
         search_criteria = f'(SINCE {date})'
-        status, messages = self.client.search(None, search_criteria)
+        with span("imap_search"):
+            status, messages = await asyncio.to_thread(self.client.search, None, search_criteria)
         if status != 'OK':
             raise Exception("搜索邮件失败")
 
@@ -153,11 +170,51 @@ class EmailClient:
         if last_uid > 0:
             email_ids = [email_id for email_id in email_ids if int(email_id.decode('utf-8')) > last_uid]
 
-        # 获取邮件内容
+        # 下载与解析流水线：原文在线程中下载，解析交给进程池并行执行
+        pool = parse_pool or MessageParsePool(workers=1)
+        async for uid, parsed in pool.parse_many(self._fetch_raw_messages(email_ids, folder, archive)):
+            if parsed is None or len(parsed.content.strip()) == 0:
+                continue
+            if parsed.date is None:
+                logger.warning("解析邮件失败 (ID: %s): 缺少日期", uid)
+                continue
+
+            # 创建邮件对象
+            yield parsed.to_email(make_uid(self.account_id, uid), folder, self.account_id)
+
+    def list_message_ids(self, folder: str = "INBOX", days: int = 3) -> Set[str]:
+        """获取服务器上最近几天邮件的 Message-ID，用于发现已被删除的邮件"""
+        if not self.client:
+            raise Exception("未连接到邮件服务器")
+        self.client.select(folder)
+        date = (datetime.now() - timedelta(days=days)).strftime('%d-%b-%Y')
+        status, messages = self.client.search(None, f'(SINCE {date})')
+        if status != 'OK':
+            raise Exception("搜索邮件失败")
+        email_ids = messages[0].split()
+        parser = BytesHeaderParser()
+        message_ids = set()
+        for i in range(0, len(email_ids), FETCH_BATCH_SIZE):
+            status, msg_data = self.client.fetch(b','.join(email_ids[i:i + FETCH_BATCH_SIZE]),
+                                                 '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+            if status != 'OK':
+                raise Exception("获取邮件头失败")
+            for item in msg_data:
+                if isinstance(item, tuple):
+                    # 与解析入库时一致，只保留 <...> 部分，去掉折行、注释等内容
+                    message_id = next(iter(_message_ids(parser.parsebytes(item[1]).get("Message-ID"))), "")
+                    if message_id:
+                        message_ids.add(message_id)
+        return message_ids
+
+    async def _fetch_raw_messages(self, email_ids: List[bytes], folder: str,
+                                  archive: Optional[RawMessageArchive] = None) -> AsyncGenerator[Tuple[int, bytes], None]:
+        """逐封下载邮件原文"""
         for email_id in email_ids:
             try:
                 # 获取邮件数据
-                status, msg_data = self.client.fetch(email_id, '(RFC822)')
+                with span("imap_fetch"):
+                    status, msg_data = await asyncio.to_thread(self.client.fetch, email_id, '(RFC822)')  # pyright: ignore[reportOptionalMemberAccess]
                 if status != 'OK':
                     continue
                 
@@ -165,89 +222,70 @@ class EmailClient:
                 if not msg_data or not msg_data[0]:
                     continue
                 
-                # 解析邮件
-                msg = email.message_from_bytes(msg_data[0][1])  # pyright: ignore[reportArgumentType]
-                
-                # 解码主题
-                subject, encoding = self.decode_text(msg['subject'])
-                
-                # 获取发件人和收件人                
-                sender = self.header_decode(msg.get("From", ""))
-                recipient = self.header_decode(msg.get("To", ""))
-                
-                # 获取日期
-                date_str = msg.get("Date", "")
-                
-                # 获取邮件正文
-                content = self.get_email_content(msg)
-                if len(content.strip()) == 0:
-                    continue
-
-                # 创建邮件对象
-                email_obj = Email(
-                    uid=email_id,
-                    subject=subject,
-                    sender=sender,
-                    recipient=recipient,
-                    date=parsedate_to_datetime(date_str),
-                    content=content,
-                    folder=folder
-                )
-                
-                yield email_obj
+                raw: bytes = msg_data[0][1]  # pyright: ignore[reportAssignmentType, reportIndexIssue]
+                BYTES_TOTAL.inc(len(raw), kind="imap")
+                if archive is not None:
+                    archive.append(make_uid(self.account_id, int(email_id)), folder, raw)
+                yield int(email_id), raw
             except Exception as e:
-                print(f"解析邮件失败 (ID: {email_id.decode()}): {str(e)}")
+                logger.warning("获取邮件失败 (ID: %s): %s", email_id.decode(), e)
                 continue
 
 class EmailPresistence:
     def __init__(self, db_file: str, 
                 embedding_base_url:str, 
                 embedding_api_key:str="cannot be empty",
-                embedding_model: str = "bge-large-zh-v1.5") -> None:
+                embedding_model: str = "bge-large-zh-v1.5",
+                compress_content: Optional[bool] = None,
+                embedding_backend: Optional[EmbeddingBackend] = None) -> None:
         self.db_file = db_file
         self.conn = None
+        # compress_content 为 True 时 emails.content 使用 zstd 压缩存储，为 None 时沿用同一数据库已有的设置
+        self.codec = get_codec(db_file, enabled=compress_content)
         
-        self.embedding_model = AsyncOpenAI(
-                        api_key=embedding_api_key,
-                        base_url=embedding_base_url)
-        self.embedding_model_id = embedding_model
+        # 未指定嵌入后端时使用 OpenAI 兼容的嵌入服务
+        self.embedding_backend = embedding_backend or OpenAIEmbeddingBackend(
+            embedding_base_url, embedding_api_key, embedding_model)
     
-    def connect(self) -> None:
-        self.conn = sqlite3.connect(self.db_file)
+    def connect(self, check_same_thread: bool = True) -> None:
+        """连接数据库，check_same_thread=False 时允许在工作线程中依次使用同一连接"""
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=check_same_thread)
         self.conn.enable_load_extension(True)
         sqlite_vec.load(self.conn)
         self.conn.enable_load_extension(False)
+        self.codec.register(self.conn)
 
     def close(self) -> None:
         if self.conn:
             self.conn.close()
+            self.conn = None
 
     def __del__(self) -> None:
-        if self.conn:
-            self.conn.close()
+        self.close()
     
     def commit(self) -> None:
         if self.conn:
-            self.conn.commit()
+            with span("sqlite_commit"):
+                self.conn.commit()
 
-    def get_last_uid(self, folder: str = "INBOX") -> int:
+    def get_last_uid(self, folder: str = "INBOX", account_id: int = 0) -> int:
         """获取最后一个UID
         Args:
-            conn: 数据库连接
             folder: 文件夹名称
+            account_id: 账户 id
         Return:
-            int: 最后一个UID
+            int: 账户内最后一个编号
         """
         if not self.conn:
             raise Exception("未连接到数据库")
         try:
             cursor = self.conn.cursor()
             cursor.execute('''
-                SELECT max(uid) FROM emails WHERE folder = ?
-            ''', (folder,))
+                SELECT max(uid) FROM emails WHERE account_id = ? AND folder = ?
+            ''', (account_id, folder))
             result = cursor.fetchone()
-            if result:
-                return int(result[0])
+            if result and result[0] is not None:
+                return int(result[0]) - uid_range(account_id)[0]
             else:
                 return 0
         except Exception as e:
@@ -265,52 +303,307 @@ class EmailPresistence:
         """
         if not self.conn:
             raise Exception("未连接到数据库")
+        # 嵌入请求在写入前完成，等待嵌入服务期间不持有写事务
+        update_delta_length(email_obj)
+        vectors, error = None, None
+        try:
+            vectors = await self._embed_segments(email_obj)
+        except Exception as e:
+            error = e
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        # 会话、邮件和统计在同一个保存点中写入，失败时一起回滚
+        self.conn.execute("SAVEPOINT save_email")
         try:
             cursor = self.conn.cursor()
+            # 归并会话，回复邮件只对新增内容做向量化
+            _, new_in_thread = assign_thread(self.conn, email_obj)
         
+            stored_content, content_codec = self.codec.encode(email_obj.content, self.conn)
+            date_utc, local_day = date_columns(email_obj.date)
+            # 重复保存时先移除旧记录的统计，属性表中的记录保持不变
+            old_facts = self._email_facts(email_obj.uid)
             cursor.execute('''
-                INSERT OR REPLACE INTO emails (uid, subject, sender, recipient, date, content, folder)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT OR REPLACE INTO emails (uid, account_id, subject, sender, recipient, date, date_utc, local_day,
+                                               content, folder, content_codec, snippet,
+                                               message_id, in_reply_to, thread_id, delta_length)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 email_obj.uid,
+                email_obj.account_id,
                 email_obj.subject,
                 email_obj.sender,
                 email_obj.recipient,
                 email_obj.date,
-                email_obj.content,
-                email_obj.folder
+                date_utc,
+                local_day,
+                stored_content,
+                email_obj.folder,
+                content_codec,
+                email_obj.content[:SNIPPET_LENGTH],
+                email_obj.message_id,
+                email_obj.in_reply_to,
+                email_obj.thread_id,
+                email_obj.delta_length
             ))
-            # 将邮件内容按500字为一段进行分段
-            content = f"{email_obj.subject}\n{email_obj.content}"
-            lines = content.splitlines()
-            # 每5行文本为一组，生成内容分段
-            content_segments = []
-            for i in range(0, len(lines), 5):
-                segment = '\n'.join(lines[i:i+5])
-                content_segments.append(segment)
-            
-            for _, segment in enumerate(content_segments):
-                _embedding = await self.embedding_model.embeddings.create(
-                    model=self.embedding_model_id,
-                    input=segment
-                )
-                email_vector = EmailVector(
-                    uid=email_obj.uid,
-                    embedding=_embedding.data[0].embedding
-                )
+            if new_in_thread:
+                add_thread_message(self.conn, email_obj)
+            stats = EmailStats(self.conn)
+            if old_facts is not None:
+                stats.add(old_facts, -1)
+            key = StatsKey(local_day, email_obj.folder, sender_key(email_obj.sender), email_obj.account_id)
+            attributes, todos = (old_facts.attributes, old_facts.todos) if old_facts else (0, 0)
+            stats.add(EmailFacts(key, attributes, todos))
+        except Exception as e:
+            self.conn.execute("ROLLBACK TO save_email")
+            self.conn.execute("RELEASE save_email")
+            print(f"保存邮件到数据库失败: {str(e)}")
+            return False
+        self.conn.execute("RELEASE save_email")
+        # 邮件已入库，向量化失败时记录到重试队列，由后台任务补齐
+        return self._store_vectors(email_obj, vectors, error, WorkQueue(self.conn))
+
+    async def _embed_segments(self, email_obj: Email) -> Tuple[List[str], Dict[str, List[float]]]:
+        """向量化邮件中变化的分段，只读取数据库
+
+        嵌入请求期间不能持有写事务，否则同一事件循环上的其它连接写入时会阻塞在 busy timeout。
+        Return:
+            Tuple[List[str], Dict[str, List[float]]]: 各分段的哈希，以及变化分段按哈希索引的向量
+        """
+        segments = segment_content(email_obj)
+        hashes = [segment_hash(segment, self.embedding_backend.model_id) for segment in segments]
+        existing = {hash_ for chunk, hash_ in self.conn.execute('''
+            SELECT chunk, hash FROM email_segments WHERE uid = ?
+        ''', (int(email_obj.uid),)) if chunk < len(hashes) and hashes[chunk] == hash_}  # pyright: ignore[reportOptionalMemberAccess]
+        changed = {hash_: segment for hash_, segment in zip(hashes, segments) if hash_ not in existing}
+        # 只把变化的分段一次性提交给嵌入后端
+        embeddings = await self.embedding_backend.embed(list(changed.values()))
+        return hashes, dict(zip(changed, embeddings))
+
+    def _write_vectors(self, uid: int, hashes: List[str], embeddings: Dict[str, List[float]]):
+        """写入分段向量
+
+        向量按 (uid, 分段序号, 内容哈希) 增量更新：内容未变的分段沿用已有向量，
+        变化的分段替换向量，多余的分段删除。写入前重新读取分段记录，向量化期间其它连接写入的分段不会重复。
+        """
+        cursor = self.conn.cursor()  # pyright: ignore[reportOptionalMemberAccess]
+        existing: Dict[int, Tuple[str, int]] = {
+            chunk: (hash_, vector_id) for chunk, hash_, vector_id in cursor.execute('''
+                SELECT chunk, hash, vector_id FROM email_segments WHERE uid = ?
+            ''', (uid,)).fetchall()
+        }
+        if not existing:
+            # 旧版本写入的向量没有分段记录，整体重建
+            cursor.execute('''
+                DELETE FROM email_vectors WHERE uid = ?
+            ''', (uid,))
+        for chunk, hash_ in enumerate(hashes):
+            if existing.get(chunk, ("", 0))[0] == hash_:
+                continue
+            if hash_ not in embeddings:
+                raise ValueError(f"分段 {chunk} 在向量化期间发生变化")
+            if chunk in existing:
                 cursor.execute('''
-                        INSERT INTO email_vectors (uid, embedding)
-                        VALUES (?, ?)
-                    ''', (
-                        email_vector.uid,
-                        serialize_float32(email_vector.embedding)
-                    ))
-            
+                    DELETE FROM email_vectors WHERE id = ?
+                ''', (existing[chunk][1],))
+            cursor.execute('''
+                    INSERT INTO email_vectors (uid, embedding)
+                    VALUES (?, ?)
+                ''', (uid, serialize_float32(embeddings[hash_])))
+            cursor.execute('''
+                INSERT OR REPLACE INTO email_segments (uid, chunk, hash, vector_id)
+                VALUES (?, ?, ?, ?)
+            ''', (uid, chunk, hash_, cursor.lastrowid))
+
+        # 删除内容变短后多余的分段
+        for chunk in sorted(existing):
+            if chunk >= len(hashes):
+                cursor.execute('''
+                    DELETE FROM email_vectors WHERE id = ?
+                ''', (existing[chunk][1],))
+                cursor.execute('''
+                    DELETE FROM email_segments WHERE uid = ? AND chunk = ?
+                ''', (uid, chunk))
+
+    def _store_vectors(self, email_obj: Email, vectors: Optional[Tuple[List[str], Dict[str, List[float]]]],
+                       error: Optional[Exception], queue: WorkQueue) -> bool:
+        """写入向量化结果，失败时记录到重试队列"""
+        uid = int(email_obj.uid)
+        try:
+            if error is not None:
+                raise error
+            self._write_vectors(uid, *vectors)  # pyright: ignore[reportOptionalIterable]
+            queue.complete(uid, JOB_EMBEDDING)
             return True
         except Exception as e:
-            print(f"保存邮件到数据库失败: {str(e)}")
+            logger.warning("邮件向量化失败 (ID: %s): %s", email_obj.uid, e)
+            queue.fail(uid, JOB_EMBEDDING, str(e))
             return False
 
+    async def embed_email(self, email_obj: Email, queue: Optional[WorkQueue] = None) -> bool:
+        """对邮件分段向量化并写入向量表
+
+        先完成嵌入请求再写入，等待嵌入服务期间不持有写事务。重复处理同一封邮件不会产生重复向量。
+        Args:
+            email_obj: 邮件对象
+            queue: 重试队列，为空时使用当前连接创建
+        Return:
+            bool: 是否成功，失败时已记录到重试队列
+        """
+        if not self.conn:
+            raise Exception("未连接到数据库")
+        vectors, error = None, None
+        try:
+            vectors = await self._embed_segments(email_obj)
+        except Exception as e:
+            error = e
+        return self._store_vectors(email_obj, vectors, error, queue or WorkQueue(self.conn))
+
+    def delete_email_vectors(self, uid: int):
+        """删除邮件的向量及分段记录"""
+        if not self.conn:
+            raise Exception("未连接到数据库")
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            DELETE FROM email_vectors WHERE uid = ?
+        ''', (uid,))
+        cursor.execute('''
+            DELETE FROM email_segments WHERE uid = ?
+        ''', (uid,))
+
+    def _email_facts(self, uid: int) -> Optional[EmailFacts]:
+        """已入库邮件计入统计的内容，邮件不存在时返回 None"""
+        row = self.conn.execute('''
+            SELECT emails.local_day, emails.folder, emails.sender, emails.account_id,
+                   email_attributes.uid IS NOT NULL, email_attributes.datetime
+            FROM emails
+            LEFT JOIN email_attributes ON emails.uid = email_attributes.uid
+            WHERE emails.uid = ?
+        ''', (uid,)).fetchone()  # pyright: ignore[reportOptionalMemberAccess]
+        if row is None:
+            return None
+        day, folder, sender, account_id, has_attribute, attention_datetime = row
+        key = StatsKey(day or "", folder or "", sender_key(sender), account_id or 0)
+        return EmailFacts(key, int(has_attribute), int(bool(has_attribute) and is_todo(attention_datetime)))
+
+    def delete_email(self, uid: int):
+        """删除邮件及其向量、属性、指纹和重试任务"""
+        if not self.conn:
+            raise Exception("未连接到数据库")
+        cursor = self.conn.cursor()
+        facts = self._email_facts(uid)
+        if facts is not None:
+            EmailStats(self.conn).add(facts, -1)
+        self.delete_email_vectors(uid)
+        cursor.execute('''
+            UPDATE email_threads SET message_count = message_count - 1
+            WHERE id = (SELECT thread_id FROM emails WHERE uid = ?)
+        ''', (uid,))
+        for table in ("email_attributes", "email_tasks", "email_fingerprints", "email_jobs", "emails"):
+            cursor.execute(f'''
+                DELETE FROM {table} WHERE uid = ?
+            ''', (uid,))
+
+    def prune_expunged(self, folder: str, since: datetime, live_message_ids: Set[str],
+                       account_id: int = 0) -> int:
+        """删除服务器上已不存在的邮件
+        Args:
+            folder: 文件夹名称
+            since: list_message_ids 的查询起点
+            live_message_ids: 服务器上现存邮件的 Message-ID
+            account_id: 账户 id
+        Return:
+            int: 删除的邮件数量
+        """
+        if not self.conn:
+            raise Exception("未连接到数据库")
+        # IMAP SINCE 按服务器时区的日期比较，本地多留一天，只检查一定在服务器查询范围内的邮件
+        cutoff = since + PRUNE_MARGIN
+        rows = self.conn.execute('''
+            SELECT uid, message_id FROM emails
+            WHERE account_id = ? AND folder = ? AND date_utc >= ? AND message_id IS NOT NULL AND message_id != ''
+        ''', (account_id, folder, int(cutoff.timestamp()))).fetchall()
+        expunged = [uid for uid, message_id in rows if message_id not in live_message_ids]
+        for uid in expunged:
+            self.delete_email(uid)
+        return len(expunged)
+
+    def vector_stats(self, full: bool = True) -> Dict[str, int]:
+        """向量表的使用情况：live 有效向量数，capacity 已分配的槽位数，orphans 不属于任何邮件的向量数
+
+        full 为 False 时只读取 vec0 的 rowid 表和 chunk 表，不扫描向量表，orphans 记为 0。
+        """
+        if not self.conn:
+            raise Exception("未连接到数据库")
+        cursor = self.conn.cursor()
+        capacity = cursor.execute("SELECT coalesce(sum(size), 0) FROM email_vectors_chunks").fetchone()[0]
+        if not full:
+            live = cursor.execute("SELECT count(1) FROM email_vectors_rowids").fetchone()[0]
+            return {"live": live, "capacity": capacity, "orphans": 0}
+        live = cursor.execute("SELECT count(1) FROM email_vectors").fetchone()[0]
+        orphans = cursor.execute(f'''
+            SELECT count(1) FROM email_vectors WHERE NOT ({LIVE_VECTOR_CONDITION})
+        ''').fetchone()[0]
+        return {"live": live, "capacity": capacity, "orphans": orphans}
+
+    def should_compact(self, storage_config: Dict) -> bool:
+        """按已删除的槽位判断是否需要压缩，只做廉价统计；孤立向量由 /api/knowledge/compact 清理"""
+        return needs_compaction(self.vector_stats(full=False), storage_config)
+
+    def compact_vectors(self, batch_size: int = 5000) -> Dict[str, Dict[str, int]]:
+        """清理孤立向量并重建向量表
+
+        vec0 删除向量后只标记槽位无效，KNN 查询仍会扫描这些槽位。
+        这里将有效向量暂存到普通表，删除并重建向量表后按原 id 写回，最后 VACUUM 回收空间。
+        Return:
+            Dict[str, Dict[str, int]]: 压缩前后的 vector_stats
+        """
+        if not self.conn:
+            raise Exception("未连接到数据库")
+        before = self.vector_stats()
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            DELETE FROM email_segments WHERE uid NOT IN (SELECT uid FROM emails)
+        ''')
+        cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS email_vectors_live (id INTEGER PRIMARY KEY, uid INTEGER, embedding BLOB)
+        ''')
+        cursor.execute("DELETE FROM email_vectors_live")
+        cursor.execute(f'''
+            INSERT INTO email_vectors_live (id, uid, embedding)
+            SELECT id, uid, embedding FROM email_vectors WHERE {LIVE_VECTOR_CONDITION}
+        ''')
+        cursor.execute("DROP TABLE email_vectors")
+        self._create_vector_table(self.conn)
+        last_id = 0
+        while True:
+            rows = cursor.execute('''
+                SELECT id, uid, embedding FROM email_vectors_live WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            cursor.executemany('''
+                INSERT INTO email_vectors (id, uid, embedding) VALUES (?, ?, ?)
+            ''', rows)
+            last_id = rows[-1][0]
+        cursor.execute("DROP TABLE email_vectors_live")
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+        return {"before": before, "after": self.vector_stats()}
+
+    def compact_vectors_isolated(self, batch_size: int = 5000) -> Dict[str, Dict[str, int]]:
+        """在独立连接上压缩向量表
+
+        sqlite 连接只能在创建它的线程中使用，通过 asyncio.to_thread 调用时在工作线程内打开新连接。
+        """
+        worker = EmailPresistence(self.db_file, "", embedding_backend=self.embedding_backend)
+        worker.codec = self.codec
+        worker.connect()
+        try:
+            return worker.compact_vectors(batch_size)
+        finally:
+            worker.close()
+
     def save_email_attributes_to_db(self, email_attr: EmailAttribute) -> bool:
         """保存邮件属性到数据库
         Args:
@@ -323,6 +616,9 @@ class EmailPresistence:
             raise Exception("未连接到数据库")
         try:
             cursor = self.conn.cursor()
+            old = cursor.execute('''
+                SELECT datetime FROM email_attributes WHERE uid = ?
+            ''', (email_attr.uid,)).fetchone()
             cursor.execute('''
                 INSERT OR REPLACE INTO email_attributes (uid, recipient, datetime, content)
                 VALUES (?, ?, ?, ?)
@@ -332,6 +628,19 @@ class EmailPresistence:
                 email_attr.datetime,
                 email_attr.content
             ))
+            facts = self._email_facts(email_attr.uid)
+            if facts is not None:
+                EmailStats(self.conn).apply(
+                    facts.key,
+                    attributes=0 if old else 1,
+                    todos=int(is_todo(email_attr.datetime)) - int(bool(old) and is_todo(old[0])))
+            # 相对日期以邮件日期为基准解析
+            row = cursor.execute('''
+                SELECT date_utc FROM emails WHERE uid = ?
+            ''', (email_attr.uid,)).fetchone()
+            reference = datetime.fromtimestamp(row[0]) if row and row[0] is not None else datetime.now()
+            TaskStore(self.conn).save_from_attribute(email_attr, reference)
+            WorkQueue(self.conn).complete(int(email_attr.uid), JOB_EXTRACTION)
             return True
         except Exception as e:
             print(f"保存邮件属性到数据库失败: {str(e)}")
@@ -353,10 +662,14 @@ class EmailPresistence:
                     uid,
                     subject, 
                     sender, 
-                    content,
+                    email_content(content, content_codec),
                     recipient,
                     \"date\",
-                    folder
+                    folder,
+                    message_id,
+                    in_reply_to,
+                    thread_id,
+                    delta_length
                 FROM emails 
                 WHERE uid = ?
             """), (uid,))
@@ -369,7 +682,11 @@ class EmailPresistence:
                 content=row[3],
                 recipient=row[4],
                 date=row[5],
-                folder=row[6]
+                folder=row[6],
+                message_id=row[7] or "",
+                in_reply_to=row[8] or "",
+                thread_id=row[9],
+                delta_length=row[10]
             )
             return email
         else:
@@ -389,8 +706,10 @@ class EmailPresistence:
                     uid,
                     subject, 
                     sender, 
-                    content,
-                    \"date\"
+                    email_content(content, content_codec),
+                    \"date\",
+                    thread_id,
+                    delta_length
                 FROM emails 
                 WHERE not exists (
                     select 1 from email_attributes where email_attributes.uid = emails.uid
@@ -406,12 +725,89 @@ class EmailPresistence:
                 content=row[3],
                 recipient="",
                 date=row[4],
-                folder=""
+                folder="",
+                thread_id=row[5],
+                delta_length=row[6]
             )
             emails.append(email)
         return emails
 
 
+    def compress_contents(self, sample_size: int = 2000, dict_size: int = 112640) -> int:
+        """用已有邮件正文训练压缩字典，并将所有邮件正文用新字典重新压缩
+        Args:
+            sample_size: 训练样本数量
+            dict_size: 字典大小（字节）
+        Return:
+            int: 重新压缩的邮件数量
+        """
+        if not self.conn:
+            raise Exception("未连接到数据库")
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT email_content(content, content_codec) FROM emails
+            ORDER BY random() LIMIT ?
+        ''', (sample_size,))
+        samples = [row[0] for row in cursor.fetchall() if row[0]]
+        dict_id = self.codec.train(self.conn, samples, dict_size=dict_size)
+        self.codec.enabled = True
+
+        rows = cursor.execute('''
+            SELECT uid, email_content(content, content_codec) FROM emails
+            WHERE content_codec IS NULL OR content_codec != ?
+        ''', (dict_id,)).fetchall()
+        for uid, content in rows:
+            stored_content, content_codec = self.codec.encode(content, self.conn)
+            cursor.execute('''
+                UPDATE emails SET content = ?, content_codec = ? WHERE uid = ?
+            ''', (stored_content, content_codec, uid))
+        self.conn.commit()
+        return len(rows)
+
+    @staticmethod
+    def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+        return conn.execute('''
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?
+        ''', (table,)).fetchone() is not None
+
+    @staticmethod
+    def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+        """为已有的表补充新增的列"""
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @staticmethod
+    def _backfill_date_columns(conn: sqlite3.Connection, batch_size: int = 1000):
+        """为旧版本写入的邮件补齐 date_utc 和 local_day"""
+        while True:
+            rows = conn.execute('''
+                SELECT uid, date FROM emails WHERE date_utc IS NULL AND date IS NOT NULL LIMIT ?
+            ''', (batch_size,)).fetchall()
+            if not rows:
+                break
+            updates = []
+            for uid, date in rows:
+                try:
+                    updates.append((*date_columns(datetime.fromisoformat(str(date))), uid))
+                except ValueError:
+                    # 无法解析的日期记为 0，避免重复处理
+                    updates.append((0, "", uid))
+            conn.executemany('''
+                UPDATE emails SET date_utc = ?, local_day = ? WHERE uid = ?
+            ''', updates)
+
+    @staticmethod
+    def _create_vector_table(conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS email_vectors 
+            USING vec0(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                uid INTEGER,
+                embedding FLOAT[1024]  -- 使用bge-large-zh-v1.5模型的维度
+            )
+        ''')
+
     # 初始化数据库
     @classmethod
     def init_database(cls, db_file: str):
@@ -435,6 +831,77 @@ class EmailPresistence:
             )
         ''')
 
+        # 正文压缩编码和列表摘要，摘要始终明文存储
+        cls._add_column(conn, "emails", "content_codec", "INTEGER DEFAULT 0")
+        cls._add_column(conn, "emails", "snippet", "TEXT")
+        conn.execute(f'''
+            UPDATE emails SET snippet = substr(content, 1, {SNIPPET_LENGTH})
+            WHERE snippet IS NULL AND (content_codec IS NULL OR content_codec = 0)
+        ''')
+
+        # 账户 id，uid 的高 32 位与之相同
+        cls._add_column(conn, "emails", "account_id", "INTEGER DEFAULT 0")
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_account_folder ON emails (account_id, folder, uid)
+        ''')
+
+        # 会话线索相关的列
+        cls._add_column(conn, "emails", "message_id", "TEXT")
+        cls._add_column(conn, "emails", "in_reply_to", "TEXT")
+        cls._add_column(conn, "emails", "thread_id", "INTEGER")
+        cls._add_column(conn, "emails", "delta_length", "INTEGER")
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_message_id ON emails (message_id)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_thread_id ON emails (thread_id)
+        ''')
+
+        # 归一化的日期列：date 列是带时区的文本，无法按天走索引
+        cls._add_column(conn, "emails", "date_utc", "INTEGER")
+        cls._add_column(conn, "emails", "local_day", "TEXT")
+        cls._backfill_date_columns(conn)
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_date_utc ON emails (date_utc)
+        ''')
+        # 摘要按会话顺序读取一天的邮件，索引同时覆盖排序
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_local_day ON emails (local_day, thread_id, uid)
+        ''')
+
+        # 创建会话表
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS email_threads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                root_message_id TEXT,
+                subject TEXT,
+                first_date DATETIME,
+                last_date DATETIME,
+                message_count INTEGER DEFAULT 0
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_threads_root ON email_threads (root_message_id)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_threads_subject ON email_threads (subject, last_date)
+        ''')
+
+        # 创建压缩字典表
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS compression_dicts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data BLOB,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # 创建失败任务重试队列表
+        WorkQueue.create_table(conn)
+
+        # 创建发件箱表
+        Outbox.create_table(conn)
+
         # 创建邮件属性表
         conn.execute('''
             CREATE TABLE IF NOT EXISTS email_attributes (
@@ -446,13 +913,34 @@ class EmailPresistence:
             )
         ''')
         
+        # 创建邮件指纹表，用于抽取结果去重
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS email_fingerprints (
+                uid INTEGER PRIMARY KEY,
+                simhash INTEGER,
+                band0 INTEGER,
+                band1 INTEGER,
+                band2 INTEGER,
+                band3 INTEGER
+            )
+        ''')
+        for i in range(4):
+            conn.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_email_fingerprints_band{i}
+                ON email_fingerprints (band{i})
+            ''')
+
         # 创建向量表
+        cls._create_vector_table(conn)
+
+        # 创建向量分段表，记录 (uid, 分段序号) 对应的内容哈希和向量 id
         conn.execute('''
-            CREATE VIRTUAL TABLE IF NOT EXISTS email_vectors 
-            USING vec0(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS email_segments (
                 uid INTEGER,
-                embedding FLOAT[1024]  -- 使用bge-large-zh-v1.5模型的维度
+                chunk INTEGER,
+                hash TEXT,
+                vector_id INTEGER,
+                PRIMARY KEY (uid, chunk)
             )
         ''')
         
@@ -466,5 +954,15 @@ class EmailPresistence:
             )
         ''')
         
+        # 统计表和待办表，首次创建时按已有邮件生成
+        stats_exists = cls._table_exists(conn, "email_stats")
+        EmailStats.create_table(conn)
+        if not stats_exists:
+            EmailStats(conn).rebuild()
+        tasks_exists = cls._table_exists(conn, "email_tasks")
+        TaskStore.create_table(conn)
+        if not tasks_exists:
+            TaskStore(conn).rebuild()
+
         conn.commit()
         conn.close()
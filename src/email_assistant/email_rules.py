@@ -0,0 +1,161 @@
+"""
+邮件预分类模块
+
+在调用大模型抽取邮件属性之前，先用发件人规则、主题正则和本地任务识别逻辑
+处理系统通知、自动回复、退信等模板化邮件，只有无法判定的邮件才交给LLM。
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from .email_threading import delta_content
+from .task_extract import extract_tasks_batch
+from .type import Email, EmailAttribute
+
+# 从邮件正文中识别日期时间，用于填充 EmailAttribute.datetime
+DATETIME_PATTERN = re.compile(
+    r'\d{4}[-/年]\d{1,2}[-/月]\d{1,2}日?(?:\s*\d{1,2}:\d{2}(?::\d{2})?)?'
+)
+# 正文只扫描开头部分，与任务识别保持一致
+SCAN_LIMIT = 1000
+
+
+class EmailRule:
+    """邮件预分类规则
+
+    发件人或主题任一正则命中即视为匹配，命中的邮件由本地逻辑直接生成属性。
+    """
+
+    def __init__(self, name: str,
+                 sender_patterns: Optional[Iterable[str]] = None,
+                 subject_patterns: Optional[Iterable[str]] = None,
+                 label: str = "",
+                 with_tasks: bool = True):
+        self.name = name
+        self.label = label or name
+        self.with_tasks = with_tasks
+        self.sender_patterns = [re.compile(p, re.IGNORECASE) for p in sender_patterns or []]
+        self.subject_patterns = [re.compile(p, re.IGNORECASE) for p in subject_patterns or []]
+
+    def match(self, email: Email) -> bool:
+        """判断邮件是否命中规则"""
+        if any(p.search(email.sender) for p in self.sender_patterns):
+            return True
+        if any(p.search(email.subject) for p in self.subject_patterns):
+            return True
+        return False
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EmailRule":
+        """从配置项创建规则"""
+        return cls(
+            name=data["name"],
+            sender_patterns=data.get("senders", []),
+            subject_patterns=data.get("subjects", []),
+            label=data.get("label", ""),
+            with_tasks=data.get("extractTasks", True)
+        )
+
+
+DEFAULT_RULES = [
+    EmailRule(
+        name="退信",
+        sender_patterns=[r'mailer-daemon', r'postmaster'],
+        subject_patterns=[r'退信', r'Undeliver', r'Delivery Status Notification', r'Mail delivery failed'],
+        label="退信通知",
+        with_tasks=False
+    ),
+    EmailRule(
+        name="自动回复",
+        subject_patterns=[r'^\s*(?:自动回复|自动答复|Auto[- ]?Reply|Automatic reply|Out of Office)'],
+        label="自动回复",
+        with_tasks=False
+    ),
+    EmailRule(
+        name="系统通知",
+        subject_patterns=[r'【?系统通知】?', r'告警', r'报警', r'\[Alert\]'],
+        label="系统通知"
+    ),
+]
+
+# 按发件人地址识别系统通知，noreply 等地址也常用于需要处理的业务邮件，默认不启用，
+# 通过配置项 ai.preClassifier.systemSenders 开启
+SYSTEM_SENDER_RULE = EmailRule(
+    name="系统发件人",
+    sender_patterns=[r'(?:^|[<\s"])(?:no-?reply|do-?not-?reply|notifications?|alerts?|monitor(?:ing)?)@'],
+    label="系统通知"
+)
+
+
+class EmailPreClassifier:
+    """邮件预分类器
+
+    按顺序匹配规则，命中的邮件在本地生成 EmailAttribute，未命中的返回 None 交给LLM抽取。
+    """
+
+    def __init__(self, rules: Optional[List[EmailRule]] = None):
+        self.rules: List[EmailRule] = list(DEFAULT_RULES if rules is None else rules)
+
+    def add_rule(self, rule: EmailRule, first: bool = False):
+        """添加规则，first=True 时优先匹配"""
+        if first:
+            self.rules.insert(0, rule)
+        else:
+            self.rules.append(rule)
+
+    def classify(self, email: Email) -> Optional[EmailAttribute]:
+        """对邮件进行预分类
+        Args:
+            email: 邮件对象
+        Return:
+            EmailAttribute: 命中规则时返回本地生成的属性，否则返回 None
+        """
+        return self.classify_many([email])[0]
+
+    def classify_many(self, emails: List[Email]) -> List[Optional[EmailAttribute]]:
+        """批量预分类，命中规则的邮件一次性识别任务
+        Args:
+            emails: 邮件列表
+        Return:
+            List[Optional[EmailAttribute]]: 与 emails 一一对应，未命中规则的为 None
+        """
+        matched = [next((rule for rule in self.rules if rule.match(email)), None) for email in emails]
+        texts = {i: delta_content(email) for i, (rule, email) in enumerate(zip(matched, emails)) if rule is not None}
+        with_tasks = [i for i in texts if matched[i].with_tasks]  # pyright: ignore[reportOptionalMemberAccess]
+        columns = extract_tasks_batch([texts[i][:SCAN_LIMIT] for i in with_tasks])
+        tasks: Dict[int, List[str]] = {}
+        for doc, task in zip(columns.doc_index, columns.task):
+            tasks.setdefault(with_tasks[doc], []).append(task)
+        return [self._make_attribute(rule, email, texts[i], tasks.get(i, [])) if rule is not None else None
+                for i, (rule, email) in enumerate(zip(matched, emails))]
+
+    def _make_attribute(self, rule: EmailRule, email: Email, text: str, tasks: List[str]) -> EmailAttribute:
+        content = f"{rule.label}：{email.subject}"
+        if tasks:
+            content += "\n待办：" + "；".join(tasks[:5])
+
+        m = DATETIME_PATTERN.search(text[:SCAN_LIMIT])
+        return EmailAttribute(
+            uid=int(email.uid),
+            recipient=email.recipient,
+            datetime=m.group(0) if m else "-",
+            content=content[:300]
+        )
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "EmailPreClassifier":
+        """根据配置创建预分类器
+
+        配置项 ai.preClassifier.rules 中的自定义规则优先于内置规则匹配，
+        ai.preClassifier.enabled 为 false 时不启用任何规则，
+        ai.preClassifier.systemSenders 为 true 时按发件人地址识别系统通知。
+        """
+        options = config.get("ai", {}).get("preClassifier", {})
+        if not options.get("enabled", True):
+            return cls(rules=[])
+        classifier = cls()
+        if options.get("systemSenders", False):
+            classifier.add_rule(SYSTEM_SENDER_RULE)
+        for data in reversed(options.get("rules", [])):
+            classifier.add_rule(EmailRule.from_dict(data), first=True)
+        return classifier
@@ -2,62 +2,191 @@
 邮件发送模块
 """
 
+import asyncio
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import Header
-from typing import List
+from typing import Any, Callable, Dict, List, Optional
+
+from .client_manager import TokenBucket
+from .metrics import span
+
+# 连接断开、超时等可以通过重新建立连接恢复的错误
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class SmtpDeliveryUnknown(Exception):
+    """邮件交给服务器后连接中断，服务器可能已经接收了邮件"""
+
+
+def build_message(sender: str, recipients: List[str], subject: str, content: str,
+                  content_type: str = "plain") -> MIMEMultipart:
+    """构造邮件对象"""
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = ', '.join(recipients)
+    msg['Subject'] = Header(subject, 'utf-8')  # pyright: ignore[reportArgumentType]
+
+    # 添加邮件正文
+    msg.attach(MIMEText(content, content_type, 'utf-8'))
+    return msg
+
 
 class EmailSender:
     """邮件发送类"""
-    
-    def __init__(self, host: str, port: int, username: str, password: str, use_tls: bool = True):
+
+    def __init__(self, host: str, port: int, username: str, password: str, use_tls: bool = True,
+                 timeout: float = 30):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.use_tls = use_tls
+        self.timeout = timeout
         self.server = None
-    
+
+    def open(self):
+        """连接并登录SMTP服务器，失败时抛出异常"""
+        if self.use_tls:
+            self.server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            self.server.starttls()
+        else:
+            self.server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        self.server.login(self.username, self.password)
+
     def connect(self):
         """连接到SMTP服务器"""
         try:
-            if self.use_tls:
-                self.server = smtplib.SMTP(self.host, self.port)
-                self.server.starttls()
-            else:
-                self.server = smtplib.SMTP_SSL(self.host, self.port)
-            
-            self.server.login(self.username, self.password)
+            self.open()
             return True
         except Exception as e:
             print(f"连接SMTP服务器失败: {str(e)}")
             return False
-    
+
     def disconnect(self):
         """断开SMTP服务器连接"""
         if self.server:
-            self.server.quit()
-    
+            try:
+                self.server.quit()
+            except Exception:
+                # 连接已断开时 quit 会失败，直接丢弃
+                pass
+            self.server = None
+
+    def is_alive(self) -> bool:
+        """用 NOOP 检查连接是否可用"""
+        if not self.server:
+            return False
+        try:
+            return self.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def send_message(self, msg: MIMEMultipart):
+        """发送已构造的邮件，失败时抛出异常"""
+        if not self.server:
+            raise smtplib.SMTPServerDisconnected("未连接到SMTP服务器")
+        self.server.send_message(msg)
+
     def send_email(self, sender: str, recipients: List[str], subject: str, content: str, content_type: str = "plain") -> bool:
         """发送邮件"""
         try:
-            # 创建邮件对象
-            msg = MIMEMultipart()
-            msg['From'] = sender
-            msg['To'] = ', '.join(recipients)
-            msg['Subject'] = Header(subject, 'utf-8')  # pyright: ignore[reportArgumentType]
-            
-            # 添加邮件正文
-            msg.attach(MIMEText(content, content_type, 'utf-8'))
-            
-            # 发送邮件
-            self.server.send_message(msg)  # pyright: ignore[reportAttributeAccessIssue, reportOptionalMemberAccess]
+            self.send_message(build_message(sender, recipients, subject, content, content_type))
             return True
         except Exception as e:
             print(f"发送邮件失败: {str(e)}")
             return False
-    
+
     def send_html_email(self, sender: str, recipients: List[str], subject: str, html_content: str) -> bool:
         """发送HTML邮件"""
-        return self.send_email(sender, recipients, subject, html_content, "html")
\ No newline at end of file
+        return self.send_email(sender, recipients, subject, html_content, "html")
+
+
+class SmtpPool:
+    """SMTP 连接池
+
+    最多保持 size 个已登录的连接，发送完成后放回池中复用；空闲连接复用前用 NOOP 检查，已断开时重新建立连接。
+    邮件交给服务器之后不再重发，避免服务器已接收时重复投递。
+    smtplib 是阻塞的，发送在线程中执行，不阻塞事件循环。
+
+    Args:
+        size: 最大连接数，即同时发送的邮件数
+        rate: 每秒最多发送的邮件数，0 表示不限速
+        burst: 令牌桶容量
+        use_tls: 是否使用 STARTTLS，默认 465 端口使用 SSL，其它端口使用 STARTTLS
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str,
+                 use_tls: Optional[bool] = None, size: int = 3, rate: float = 0, burst: float = 5,
+                 timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = port != 465 if use_tls is None else use_tls
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self._idle: List[EmailSender] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_config(cls, mail_config: Dict[str, Any]) -> "SmtpPool":
+        """按 mail 配置节创建连接池，连接在第一次发送时建立"""
+        return cls(
+            host=mail_config.get("smtpServer", ""),
+            port=mail_config.get("smtpPort", 465),
+            username=mail_config["emailAddress"],
+            password=mail_config["emailPassword"],
+            use_tls=mail_config.get("smtpStartTls"),
+            size=mail_config.get("smtpPoolSize", 3),
+            rate=mail_config.get("smtpRate", 2),
+            burst=mail_config.get("smtpBurst", 5),
+        )
+
+    def _open(self) -> EmailSender:
+        sender = EmailSender(self.host, self.port, self.username, self.password,
+                             use_tls=self.use_tls, timeout=self.timeout)
+        sender.open()
+        return sender
+
+    async def send(self, msg: MIMEMultipart, on_dispatch: Optional[Callable[[], None]] = None):
+        """发送一封邮件，失败时抛出异常
+        Args:
+            msg: 邮件对象
+            on_dispatch: 邮件交给服务器之前调用，之后的连接错误以 SmtpDeliveryUnknown 抛出
+        """
+        await self.bucket.acquire()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            sender = self._idle.pop() if self._idle else None
+            try:
+                with span("smtp_send"):
+                    # 池中的空闲连接可能已被服务器断开，发送前检查，断开时重新建立连接
+                    if sender is not None and not await asyncio.to_thread(sender.is_alive):
+                        await asyncio.to_thread(sender.disconnect)
+                        sender = None
+                    if sender is None:
+                        sender = await asyncio.to_thread(self._open)
+                    if on_dispatch is not None:
+                        on_dispatch()
+                    try:
+                        await asyncio.to_thread(sender.send_message, msg)
+                    except CONNECTION_ERRORS as e:
+                        raise SmtpDeliveryUnknown(f"发送过程中连接中断: {str(e)}") from e
+            except (SmtpDeliveryUnknown, *CONNECTION_ERRORS):
+                if sender is not None:
+                    await asyncio.to_thread(sender.disconnect)
+                raise
+            except Exception:
+                # 收件人被拒绝等错误不影响连接，连接放回池中
+                if sender is not None and sender.server is not None:
+                    self._idle.append(sender)
+                raise
+            self._idle.append(sender)
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().disconnect()
@@ -0,0 +1,157 @@
+"""
+邮件统计模块
+
+email_stats 表按维度保存邮件数、属性数和待办数，由 EmailPresistence 在写入和删除邮件、
+属性的同一事务中增量更新。统计接口只读取需要的几行，耗时与邮箱大小无关。
+
+维度：total 全部邮件，day 本地日期，folder 文件夹，sender 发件人地址，account 账户 id。
+"""
+
+import sqlite3
+from collections import defaultdict
+from datetime import date, timedelta
+from email.utils import parseaddr
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DIMENSION_TOTAL = "total"
+DIMENSION_DAY = "day"
+DIMENSION_FOLDER = "folder"
+DIMENSION_SENDER = "sender"
+DIMENSION_ACCOUNT = "account"
+
+
+class StatsKey(NamedTuple):
+    """一封邮件在各维度上的取值"""
+    day: str
+    folder: str
+    sender: str
+    account_id: int
+
+
+class EmailFacts(NamedTuple):
+    """一封邮件计入统计的内容"""
+    key: StatsKey
+    attributes: int
+    todos: int
+
+
+def sender_key(sender: str) -> str:
+    """发件人按邮件地址归类，忽略显示名称和大小写"""
+    address = parseaddr(sender or "")[1]
+    return (address or sender or "").lower()
+
+
+def is_todo(attention_datetime: Optional[str]) -> bool:
+    """抽取到关注日期时间的属性视为待办"""
+    return (attention_datetime or "").strip() not in ("", "-")
+
+
+def _dimensions(key: StatsKey) -> List[Tuple[str, str]]:
+    return [
+        (DIMENSION_TOTAL, ""),
+        (DIMENSION_DAY, key.day or ""),
+        (DIMENSION_FOLDER, key.folder or ""),
+        (DIMENSION_SENDER, key.sender),
+        (DIMENSION_ACCOUNT, str(key.account_id or 0)),
+    ]
+
+
+class EmailStats:
+    """基于 email_stats 表的增量统计，不负责提交事务"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @staticmethod
+    def create_table(conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS email_stats (
+                dimension TEXT,
+                key TEXT,
+                emails INTEGER DEFAULT 0,
+                attributes INTEGER DEFAULT 0,
+                todos INTEGER DEFAULT 0,
+                PRIMARY KEY (dimension, key)
+            ) WITHOUT ROWID
+        ''')
+        # 按邮件数取前 N 个发件人、文件夹
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_stats_rank ON email_stats (dimension, emails)
+        ''')
+
+    def apply(self, key: StatsKey, emails: int = 0, attributes: int = 0, todos: int = 0):
+        """各维度的计数加上增量"""
+        if emails == 0 and attributes == 0 and todos == 0:
+            return
+        self.conn.executemany('''
+            INSERT INTO email_stats (dimension, key, emails, attributes, todos)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (dimension, key) DO UPDATE SET
+                emails = emails + excluded.emails,
+                attributes = attributes + excluded.attributes,
+                todos = todos + excluded.todos
+        ''', ((dimension, value, emails, attributes, todos) for dimension, value in _dimensions(key)))
+
+    def add(self, facts: EmailFacts, sign: int = 1):
+        """计入（sign=1）或移除（sign=-1）一封邮件"""
+        self.apply(facts.key, sign, sign * facts.attributes, sign * facts.todos)
+
+    def rebuild(self):
+        """按 emails 和 email_attributes 重新计算全部统计"""
+        totals: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0, 0])
+        rows = self.conn.execute('''
+            SELECT emails.local_day, emails.folder, emails.sender, emails.account_id, email_attributes.datetime,
+                   email_attributes.uid IS NOT NULL
+            FROM emails
+            LEFT JOIN email_attributes ON emails.uid = email_attributes.uid
+        ''')
+        for day, folder, sender, account_id, attention_datetime, has_attribute in rows:
+            key = StatsKey(day or "", folder or "", sender_key(sender), account_id or 0)
+            for dimension in _dimensions(key):
+                counts = totals[dimension]
+                counts[0] += 1
+                counts[1] += 1 if has_attribute else 0
+                counts[2] += 1 if has_attribute and is_todo(attention_datetime) else 0
+        self.conn.execute("DELETE FROM email_stats")
+        self.conn.executemany('''
+            INSERT INTO email_stats (dimension, key, emails, attributes, todos) VALUES (?, ?, ?, ?, ?)
+        ''', ((dimension, value, *counts) for (dimension, value), counts in totals.items()))
+
+    def _rows(self, sql: str, params: Iterable[Any]) -> List[Dict[str, Any]]:
+        return [{"key": key, "emails": emails, "attributes": attributes, "todos": todos}
+                for key, emails, attributes, todos in self.conn.execute(sql, tuple(params))]
+
+    def top(self, dimension: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """邮件数最多的前 limit 项"""
+        return self._rows('''
+            SELECT key, emails, attributes, todos FROM email_stats
+            WHERE dimension = ? AND emails > 0
+            ORDER BY emails DESC
+            LIMIT ?
+        ''', (dimension, limit))
+
+    def daily(self, end: date, days: int) -> List[Dict[str, Any]]:
+        """end 之前 days 天（含 end）每天的统计，没有邮件的日期计为 0"""
+        start = end - timedelta(days=days - 1)
+        found = {row["key"]: row for row in self._rows('''
+            SELECT key, emails, attributes, todos FROM email_stats
+            WHERE dimension = ? AND key BETWEEN ? AND ?
+        ''', (DIMENSION_DAY, start.isoformat(), end.isoformat()))}
+        result = []
+        for i in range(days):
+            day = (start + timedelta(days=i)).isoformat()
+            result.append(found.get(day, {"key": day, "emails": 0, "attributes": 0, "todos": 0}))
+        return result
+
+    def summary(self, end: date, days: int = 30, limit: int = 10) -> Dict[str, Any]:
+        """统计面板数据"""
+        total = self._rows('''
+            SELECT key, emails, attributes, todos FROM email_stats WHERE dimension = ?
+        ''', (DIMENSION_TOTAL,))
+        return {
+            "total": total[0] if total else {"key": "", "emails": 0, "attributes": 0, "todos": 0},
+            "daily": self.daily(end, days),
+            "folders": self.top(DIMENSION_FOLDER, limit),
+            "senders": self.top(DIMENSION_SENDER, limit),
+            "accounts": self.top(DIMENSION_ACCOUNT, limit),
+        }
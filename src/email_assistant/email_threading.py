@@ -0,0 +1,167 @@
+"""
+邮件会话线索模块
+
+入库时根据 Message-ID、In-Reply-To、References 把邮件归并到会话（email_threads 表），
+回复邮件只保留新增内容（delta）用于向量化、属性抽取和摘要，引用的历史内容通过 thread_id 关联。
+引用在 clean_text 重新排版之前识别，排版会把行首的 “>” 和跨行的 “On … wrote:” 打散。
+"""
+
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from .mime_text import clean_text
+from .type import Email
+
+# 回复/转发主题前缀
+_SUBJECT_PREFIX = re.compile(r'^\s*(?:(?:re|fw|fwd|答复|回复|转发)\s*[:：]\s*)+', re.IGNORECASE)
+
+# 引用历史内容的起始标记（排版前的正文），引用头可能被邮件客户端折行
+_QUOTE_MARKERS = re.compile(
+    r'^[ \t]*_{5,}[ \t\r]*$'
+    r'|-{2,}\s*(?:原始邮件|Original Message)\s*-{2,}'
+    r'|\bOn\s[\s\S]{1,200}?\swrote:'
+    r'|在\s*\d{4}[\s\S]{0,80}?写道\s*[：:]'
+    r'|^>',
+    re.IGNORECASE | re.MULTILINE
+)
+# 已经排版的正文（没有在解析时计算新增内容的邮件）只能使用不依赖行首的标记
+_CLEANED_QUOTE_MARKERS = re.compile(
+    r'\n_____\n'
+    r'|-{2,}\s*(?:原始邮件|Original Message)\s*-{2,}'
+    r'|\bOn\s[\s\S]{1,200}?\swrote:'
+    r'|在\s*\d{4}[\s\S]{0,80}?写道\s*[：:]',
+    re.IGNORECASE
+)
+
+# 只有 Re: 主题、没有邮件头关联时，按主题归并的时间窗口
+SUBJECT_THREAD_WINDOW = timedelta(days=14)
+
+
+def normalize_subject(subject: str) -> str:
+    """去除回复/转发前缀后的主题"""
+    return _SUBJECT_PREFIX.sub('', subject).strip()
+
+
+def is_reply_headers(subject: str, in_reply_to: str, references: List[str]) -> bool:
+    return bool(in_reply_to or references or _SUBJECT_PREFIX.match(subject))
+
+
+def is_reply(email: Email) -> bool:
+    return is_reply_headers(email.subject, email.in_reply_to, email.references)
+
+
+def quoted_offset(content: str, cleaned: bool = True) -> Optional[int]:
+    """返回引用历史内容的起始位置，没有引用时返回 None
+    Args:
+        content: 正文
+        cleaned: 正文是否已经过 clean_text 排版
+    """
+    m = (_CLEANED_QUOTE_MARKERS if cleaned else _QUOTE_MARKERS).search(content)
+    if m is None or m.start() == 0:
+        return None
+    return m.start()
+
+
+def clean_reply(body: str) -> Tuple[str, Optional[int]]:
+    """在排版前识别引用，新增内容和引用分别排版
+    Return:
+        (排版后的正文, 新增内容长度)，没有引用时新增内容长度为 None
+    """
+    offset = quoted_offset(body, cleaned=False)
+    if offset is None:
+        return clean_text(body), None
+    delta = clean_text(body[:offset])
+    if not delta:
+        return clean_text(body), None
+    return f"{delta}\n{clean_text(body[offset:])}", len(delta)
+
+
+def delta_content(email: Email) -> str:
+    """邮件的新增内容，非回复邮件返回完整正文"""
+    if email.delta_length is None:
+        return email.content
+    return email.content[:email.delta_length]
+
+
+def update_delta_length(email: Email):
+    """非回复邮件清除新增内容长度，解析时没有计算的回复邮件按排版后的正文计算"""
+    if not is_reply(email):
+        email.delta_length = None
+    elif email.delta_length is None:
+        email.delta_length = quoted_offset(email.content)
+
+
+def assign_thread(conn: sqlite3.Connection, email: Email) -> Tuple[int, bool]:
+    """为邮件分配会话，解析时没有计算新增内容长度的回复邮件按排版后的正文计算
+
+    会话的邮件数不在这里更新，邮件写入成功后调用 add_thread_message。
+    Args:
+        conn: 数据库连接
+        email: 邮件对象，会更新 thread_id 和 delta_length
+    Return:
+        Tuple[int, bool]: 会话ID，以及邮件是否为会话新增的邮件
+    """
+    cursor = conn.cursor()
+    update_delta_length(email)
+
+    # 重新处理已入库的邮件时沿用原会话
+    row = cursor.execute('''
+        SELECT thread_id FROM emails WHERE uid = ? AND thread_id IS NOT NULL
+    ''', (email.uid,)).fetchone()
+    if row:
+        email.thread_id = row[0]
+        return row[0], False
+
+    thread_id = None
+    # 按 In-Reply-To 和 References（从近到远）查找父邮件所在会话
+    parent_ids = ([email.in_reply_to] if email.in_reply_to else []) + list(reversed(email.references))
+    for message_id in parent_ids:
+        row = cursor.execute('''
+            SELECT thread_id FROM emails WHERE message_id = ? AND thread_id IS NOT NULL
+        ''', (message_id,)).fetchone()
+        if row:
+            thread_id = row[0]
+            break
+
+    subject = normalize_subject(email.subject)
+    if thread_id is None and parent_ids:
+        # 父邮件尚未入库（例如早于同步窗口），按根 Message-ID 归并
+        root_id = email.references[0] if email.references else email.in_reply_to
+        row = cursor.execute('''
+            SELECT id FROM email_threads WHERE root_message_id = ?
+        ''', (root_id,)).fetchone()
+        if row:
+            thread_id = row[0]
+    if thread_id is None and _SUBJECT_PREFIX.match(email.subject) and subject:
+        row = cursor.execute('''
+            SELECT id FROM email_threads WHERE subject = ? AND last_date >= ?
+            ORDER BY last_date DESC LIMIT 1
+        ''', (subject, email.date - SUBJECT_THREAD_WINDOW)).fetchone()
+        if row:
+            thread_id = row[0]
+
+    if thread_id is None:
+        if parent_ids:
+            root_id = email.references[0] if email.references else email.in_reply_to
+        else:
+            root_id = email.message_id
+        cursor.execute('''
+            INSERT INTO email_threads (root_message_id, subject, first_date, last_date, message_count)
+            VALUES (?, ?, ?, ?, 0)
+        ''', (root_id, subject, email.date, email.date))
+        thread_id = cursor.lastrowid
+
+    email.thread_id = thread_id
+    return thread_id, True  # pyright: ignore[reportReturnType]
+
+
+def add_thread_message(conn: sqlite3.Connection, email: Email):
+    """邮件写入成功后计入会话的邮件数和最后日期"""
+    conn.execute('''
+        UPDATE email_threads
+        SET message_count = message_count + 1,
+            last_date = max(last_date, ?)
+        WHERE id = ?
+    ''', (email.date, email.thread_id))
@@ -0,0 +1,209 @@
+"""
+文本嵌入后端模块
+
+- OpenAIEmbeddingBackend：调用 OpenAI 兼容的嵌入服务（默认），经 client_manager 限速和重试
+- LocalEmbeddingBackend：进程内 sentence-transformers 模型（可选 ONNX Runtime 量化模型），
+  不依赖嵌入服务。并发请求在短时间窗口内合并为一批，在线程池中推理，模型在第一次调用时加载。
+
+通过配置 ai.embeddingBackend 选择：openai | local。
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .client_manager import client_manager
+from .metrics import record_tokens, span
+
+
+class EmbeddingBackend:
+    """嵌入后端接口"""
+
+    model_id: str = ""
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """批量生成嵌入向量，返回顺序与输入一致"""
+        raise NotImplementedError
+
+    async def embed_one(self, text: str) -> List[float]:
+        return (await self.embed([text]))[0]
+
+    def close(self):
+        pass
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI 兼容的远程嵌入服务"""
+
+    def __init__(self, base_url: str, api_key: str = "cannot be empty", model_id: str = "bge-large-zh-v1.5"):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model_id = model_id
+
+    @property
+    def client(self):
+        # 第一次调用时才创建客户端，避免启动时加载 openai
+        return client_manager.async_openai(self.base_url, self.api_key)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        with span("embedding"):
+            response = await client_manager.call(self.base_url, self.client.embeddings.create,
+                                                 model=self.model_id, input=texts)
+        record_tokens(self.model_id, response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """进程内 sentence-transformers 嵌入
+
+    Args:
+        model_id: 模型名称或本地路径，例如 BAAI/bge-large-zh-v1.5
+        device: 推理设备，默认 cpu
+        batch_size: 单批最大文本数
+        max_wait: 凑批的最长等待时间（秒）
+        workers: 推理线程数，即同时推理的批数
+        backend: torch | onnx，onnx 需要安装 optimum[onnxruntime]
+        model_kwargs: 传给模型加载的参数，例如 ONNX 量化模型 {"file_name": "onnx/model_qint8_avx512_vnni.onnx"}
+    """
+
+    def __init__(self, model_id: str = "BAAI/bge-large-zh-v1.5", device: str = "cpu",
+                 batch_size: int = 32, max_wait: float = 0.005, workers: int = 1,
+                 backend: str = "torch", model_kwargs: Optional[Dict[str, Any]] = None):
+        self.model_id = model_id
+        self.device = device
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.workers = max(1, workers)
+        self.backend = backend
+        self.model_kwargs = model_kwargs or {}
+        self.model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embedding")
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # 推理中的批任务，保持引用避免被回收，关闭时统一取消
+        self._batches: Set[asyncio.Task] = set()
+
+    def _load(self):
+        with self._model_lock:
+            if self.model is None:
+                from sentence_transformers import SentenceTransformer
+
+                kwargs: Dict[str, Any] = {"device": self.device}
+                if self.backend != "torch":
+                    kwargs["backend"] = self.backend
+                if self.model_kwargs:
+                    kwargs["model_kwargs"] = self.model_kwargs
+                self.model = SentenceTransformer(self.model_id, **kwargs)
+        return self.model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        model = self._load()
+        with span("embedding_local"):
+            vectors = model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                   convert_to_numpy=True)
+        return vectors.tolist()
+
+    def warmup(self):
+        """加载模型并完成一次推理，可在启动后放到后台线程中调用"""
+        self._encode(["预热"])
+
+    def _ensure_batcher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._batcher is None or self._batcher.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._batcher = loop.create_task(self._run_batcher())
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        self._ensure_batcher()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))  # pyright: ignore[reportOptionalMemberAccess]
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _run_batcher(self):
+        """从队列中凑批：达到 batch_size 或等待超过 max_wait 后提交推理"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = self._queue  # pyright: ignore[reportAssignmentType]
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._slots.acquire()  # pyright: ignore[reportOptionalMemberAccess]
+            task = loop.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(self._executor, self._encode, [text for text, _ in batch])
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # 批任务被取消时等待方不再阻塞
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            self._slots.release()  # pyright: ignore[reportOptionalMemberAccess]
+
+    def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        for task in list(self._batches):
+            task.cancel()
+        self._batches.clear()
+        # 取消队列中尚未凑批的请求
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_embedding_backend(ai_config: Dict[str, Any]) -> EmbeddingBackend:
+    """按 ai 配置节创建嵌入后端"""
+    if ai_config.get("embeddingBackend", "openai") == "local":
+        options = ai_config.get("localEmbedding", {})
+        return LocalEmbeddingBackend(
+            model_id=options.get("model", "BAAI/bge-large-zh-v1.5"),
+            device=options.get("device", "cpu"),
+            batch_size=options.get("batchSize", 32),
+            max_wait=options.get("maxWaitMs", 5) / 1000,
+            workers=options.get("workers", 1),
+            backend=options.get("backend", "torch"),
+            model_kwargs=options.get("modelKwargs"),
+        )
+    return OpenAIEmbeddingBackend(
+        base_url=ai_config["embeddingBaseUrl"],
+        api_key=ai_config.get("embeddingApiKey", "cannot be empty"),
+        model_id=ai_config.get("embeddingModel", "bge-large-zh-v1.5"),
+    )
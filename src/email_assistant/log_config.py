@@ -1,20 +1,167 @@
 from datetime import datetime
+import atexit
+import copy
+import json
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import os
 from pathlib import Path
+from queue import SimpleQueue
+import random
+from typing import Any, Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# 单条日志消息的默认长度上限，超出部分截断
+DEFAULT_MAX_MESSAGE_LENGTH = 2000
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_file_handler: Optional[logging.Handler] = None
+_payload_filter: Optional["PayloadFilter"] = None
+
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON，extra 传入的字段作为顶层字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        # 经过队列的记录只保留格式化后的 exc_text
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """入队前只合并消息参数，异常格式化为 exc_text 单独保留
+
+    QueueHandler.prepare 会把异常堆栈拼进消息并清除 exc_info，JSON 格式下会丢失 exception 字段。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            # 与 QueueHandler 一致，不把 traceback 对象放入队列
+            record.exc_info = None
+        return record
+
+
+class PayloadFilter(logging.Filter):
+    """截断过长的日志消息，并按模块对 WARNING 以下的日志采样
+
+    在入队前执行，大段内容不会进入队列。
+    sample_rates: 日志名前缀 -> 保留比例（0-1），按最长前缀匹配
+    """
+
+    def __init__(self, max_length: int = DEFAULT_MAX_MESSAGE_LENGTH,
+                 sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.max_length = max_length
+        self.sample_rates = sample_rates or {}
+
+    def _sample_rate(self, name: str) -> float:
+        matched = ""
+        rate = 1.0
+        for prefix, value in self.sample_rates.items():
+            if (name == prefix or name.startswith(prefix + ".")) and len(prefix) >= len(matched):
+                matched, rate = prefix, value
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            rate = self._sample_rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        message = record.getMessage()
+        if len(message) > self.max_length:
+            record.msg = f"{message[:self.max_length]}...(已截断，共{len(message)}字符)"
+            record.args = None
+        return True
+
 
 # Configure logging
 def setup_logging(name:str):
-    LOCAL_DIR = Path(__file__).parent.parent
-    log_dir = os.path.join(LOCAL_DIR / "../", 'logs')
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-
-    log_file = os.path.join(log_dir, f'ad-agent_{datetime.now().strftime("%Y%m%d")}.log')
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        encoding='utf-8'
-    )
-    return logging.getLogger(name)
\ No newline at end of file
+    """初始化日志
+
+    日志记录通过 QueueHandler 入队，由后台 QueueListener 线程写入文件，请求处理中不产生磁盘 I/O。
+    """
+    global _listener, _queue_handler, _file_handler, _payload_filter
+    if _listener is None:
+        LOCAL_DIR = Path(__file__).parent.parent
+        log_dir = os.path.join(LOCAL_DIR / "../", 'logs')
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        log_file = os.path.join(log_dir, f'ad-agent_{datetime.now().strftime("%Y%m%d")}.log')
+        _file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        _file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        queue = SimpleQueue()
+        _payload_filter = PayloadFilter()
+        _queue_handler = StructuredQueueHandler(queue)
+        _queue_handler.addFilter(_payload_filter)
+
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(_queue_handler)
+        _listener = QueueListener(queue, _file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    return logging.getLogger(name)
+
+
+def configure_logging(options: Optional[Dict[str, Any]]):
+    """按配置调整日志
+
+    options 对应配置文件的 logging 节：
+        format: text | json
+        level: 根日志级别
+        levels: 日志名 -> 级别，例如 {"email_assistant.ai_processor": "WARNING"}
+        maxMessageLength: 单条消息长度上限
+        sampleRates: 日志名 -> 保留比例
+    """
+    options = options or {}
+    if _file_handler is not None:
+        if options.get("format") == "json":
+            _file_handler.setFormatter(JsonFormatter())
+        else:
+            _file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    if _payload_filter is not None:
+        _payload_filter.max_length = options.get("maxMessageLength", DEFAULT_MAX_MESSAGE_LENGTH)
+        _payload_filter.sample_rates = options.get("sampleRates", {})
+    if "level" in options:
+        logging.getLogger().setLevel(options["level"].upper())
+    for name, level in options.get("levels", {}).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+def shutdown_logging():
+    """停止后台写日志线程，写完队列中剩余的日志"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _file_handler is not None:
+        _file_handler.close()
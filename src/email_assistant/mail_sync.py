@@ -0,0 +1,75 @@
+"""
+多账户并发同步模块
+"""
+
+import asyncio
+from typing import AsyncGenerator, Dict, List, NamedTuple, Optional, Set
+
+from .email_processor import EmailClient
+from .mime_parse import MessageParsePool
+from .raw_archive import RawMessageArchive
+from .type import Email, MailAccount
+
+
+EVENT_CONNECTED = "connected"
+EVENT_EMAIL = "email"
+EVENT_ERROR = "error"
+EVENT_LIVE_IDS = "live_ids"
+
+
+class SyncEvent(NamedTuple):
+    """同步过程中的事件：已连接、新邮件、错误，或同步结束时服务器上现存的 Message-ID"""
+    kind: str
+    account: MailAccount
+    email: Optional[Email] = None
+    error: str = ""
+    live_message_ids: Optional[Set[str]] = None
+
+
+async def fetch_accounts(accounts: List[MailAccount], last_uids: Dict[int, int], days: int,
+                         parse_pool: Optional[MessageParsePool] = None,
+                         archive: Optional[RawMessageArchive] = None,
+                         list_message_ids: bool = False) -> AsyncGenerator[SyncEvent, None]:
+    """并发同步多个账户，按到达顺序返回事件
+
+    每个账户一个下载任务，共享一个容量等于账户数的队列。队列满时下载任务按先来先到的顺序等待，
+    各账户的邮件因此轮流交给调用方入库，单个大邮箱不会占满嵌入和 LLM 的调用额度。
+    Args:
+        last_uids: 各账户已同步的最大账户内编号
+        list_message_ids: 同步结束后是否获取服务器上现存邮件的 Message-ID
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, len(accounts)))
+
+    async def produce(account: MailAccount):
+        client = EmailClient(account.imap_server, account.imap_port,
+                             account.email_address, account.email_password, account_id=account.id)
+        try:
+            if not await asyncio.to_thread(client.connect):
+                await queue.put(SyncEvent(EVENT_ERROR, account, error="连接邮件服务器失败"))
+                return
+            await queue.put(SyncEvent(EVENT_CONNECTED, account))
+            async for email in client.fetch_emails(days=days, last_uid=last_uids.get(account.id, 0),
+                                                   parse_pool=parse_pool, archive=archive):
+                await queue.put(SyncEvent(EVENT_EMAIL, account, email=email))
+            if list_message_ids:
+                live_ids = await asyncio.to_thread(client.list_message_ids, days=days)
+                await queue.put(SyncEvent(EVENT_LIVE_IDS, account, live_message_ids=live_ids))
+        except Exception as e:
+            await queue.put(SyncEvent(EVENT_ERROR, account, error=str(e)))
+        finally:
+            await asyncio.to_thread(client.disconnect)
+            await queue.put(None)
+
+    tasks = [asyncio.ensure_future(produce(account)) for account in accounts]
+    try:
+        # 每个下载任务结束时放入一个 None
+        running = len(tasks)
+        while running:
+            event = await queue.get()
+            if event is None:
+                running -= 1
+            else:
+                yield event
+    finally:
+        for task in tasks:
+            task.cancel()
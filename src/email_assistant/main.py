@@ -1,31 +1,47 @@
 """
 邮件助手主应用模块
 """
-import os
+import asyncio
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import hmac
 import json
 import sqlite3
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Optional
 
 from fastapi import Depends, FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import sqlite_vec
 
-from .ai_processor import AIProcessor, AIProcessorException, AIProcessorNoDataException
-from .config import ConfigManager
-from .email_extract import extract_email_info
-from .email_processor import EmailClient, EmailPresistence
+from .accounts import load_accounts
+from .ai_processor import AIProcessor, AIProcessorException, AIProcessorNoDataException, SummaryBudget
+from .client_manager import client_manager
+from .config import CONFIG_FILE, DB_FILE, ConfigManager
+from .content_codec import get_codec
+from .embedding_backend import create_embedding_backend
+from .email_dedupe import ExtractionDeduplicator
+from .email_processor import EmailPresistence
+from .email_rules import EmailPreClassifier
+from .email_sender import SmtpPool, build_message
+from .email_stats import EmailStats
+from .metrics import REGISTRY, server_timing_header, start_request_timing
+from .mime_parse import MessageParsePool
+from .outbox import Outbox, send_batch
+from .profiling import MAX_PROFILE_SECONDS, MemoryTracker, ProfilerBusyException, SamplingProfiler
+from .raw_archive import RawMessageArchive, iter_archived_emails
+from .tasks import STATUS_DONE, TaskStore
+from .templates import CompiledTemplate, TemplateManager
 from .type import *
-from .log_config import setup_logging
+from .work_queue import JOB_EXTRACTION, RepairWorker, WorkQueue
+from .log_config import configure_logging, setup_logging
+from .mail_sync import EVENT_CONNECTED, EVENT_ERROR, EVENT_LIVE_IDS, fetch_accounts
 
 logger = setup_logging(__name__)
 
-# 配置文件路径
-CONFIG_FILE = os.environ.get("CONFIG_FILE", "data/config.json")
-
-# 数据库文件路径
-DB_FILE = os.environ.get("DB_FILE", "data/email_assistant.db")
+# 邮件属性抽取模型
+EXTRACT_MODEL_ID = "qwen3-coder-plus"
 
 # 应用生命周期管理
 @asynccontextmanager
@@ -33,6 +49,9 @@ async def lifespan(_app: FastAPI):
     # 应用启动时初始化
     config_manager = ConfigManager(CONFIG_FILE)
     config_manager.load_config()
+    configure_logging(config_manager.get("logging", {}))
+    # 嵌入和 LLM 调用共享的限速、重试配置
+    client_manager.configure(config_manager.get("http", {}))
     # 初始化数据库
     EmailPresistence.init_database(db_file=DB_FILE)
     # 初始化AI模型
@@ -40,17 +59,70 @@ async def lifespan(_app: FastAPI):
 
     base_url = config_manager.config["ai"]["embeddingBaseUrl"]
     model_id = config_manager.config["ai"]["embeddingModel"]
+    # 嵌入后端由 ai.embeddingBackend 选择，检索和入库共用同一个实例
+    embeddingBackend = create_embedding_backend(config_manager.config["ai"])
     aiProcessor = AIProcessor(embedding_base_url=base_url,
-                              embedding_model=model_id)
-    emailPresistence = EmailPresistence(db_file=DB_FILE, 
+                              embedding_model=model_id,
+                              embedding_backend=embeddingBackend,
+                              summary_budget=SummaryBudget.from_config(config_manager.config["ai"].get("summary", {})))
+    # 预加载分词器，第一次加载可能下载编码文件，放到线程中避免阻塞事件循环
+    await asyncio.to_thread(aiProcessor.load_token_counter)
+    def new_email_presistence() -> EmailPresistence:
+        return EmailPresistence(db_file=DB_FILE, 
                               embedding_base_url=base_url,
                               embedding_api_key=api_key,
-                              embedding_model=model_id)
+                              embedding_model=model_id,
+                              compress_content=config_manager.get("storage.compressContent", False),
+                              embedding_backend=embeddingBackend)
+    emailPresistence = new_email_presistence()
+    preClassifier = EmailPreClassifier.from_config(config_manager.config)
+    # 邮件解析进程池，默认按可用核数创建
+    parsePool = MessageParsePool(workers=config_manager.get("mail.parseWorkers"),
+                                 min_batch=config_manager.get("mail.parseMinBatch", 32))
+    # 邮件原文归档，配置 mail.rawArchiveDir 后启用
+    archive_dir = config_manager.get("mail.rawArchiveDir", "")
+    rawArchive = RawMessageArchive(archive_dir) if archive_dir else None
+    # 剖析接口默认关闭，配置 admin.profilingEnabled 后仅允许本机携带 admin.token 访问
+    profiler = None
+    memoryTracker = None
+    if config_manager.get("admin.profilingEnabled", False):
+        profiler = SamplingProfiler(interval=config_manager.get("admin.profileInterval", 0.005))
+        memoryTracker = MemoryTracker()
+    # 后台重试向量化/抽取失败的邮件，使用独立的数据库连接
+    repairWorker = None
+    if config_manager.get("queue.enabled", True):
+        repairWorker = RepairWorker(new_email_presistence, EXTRACT_MODEL_ID,
+                                    pre_classifier=preClassifier,
+                                    interval=config_manager.get("queue.retryInterval", 60),
+                                    max_attempts=config_manager.get("queue.maxAttempts", 8),
+                                    storage_config=config_manager.config.get("storage", {}))
+        repairWorker.start()
+    # 发送邮件共用的 SMTP 连接池
+    smtpPool = SmtpPool.from_config(config_manager.config["mail"])
+    # 邮件模板常驻内存，修改时写穿到数据库
+    templateManager = TemplateManager(DB_FILE)
     yield {
         "config": config_manager.config,
         "aiProcessor": aiProcessor,
         "emailPresistence": emailPresistence,
+        "preClassifier": preClassifier,
+        "parsePool": parsePool,
+        "rawArchive": rawArchive,
+        "profiler": profiler,
+        "memoryTracker": memoryTracker,
+        "smtpPool": smtpPool,
+        "templateManager": templateManager,
     }
+    if repairWorker is not None:
+        await repairWorker.stop()
+    parsePool.close()
+    smtpPool.close()
+    embeddingBackend.close()
+    await client_manager.aclose()
+    if memoryTracker is not None:
+        memoryTracker.stop()
+    if rawArchive is not None:
+        rawArchive.close()
 
 async def get_config_inject(request: Request) -> Dict[str, Any]:
     return request.state.config
@@ -61,11 +133,56 @@ async def get_ai_processor_inject(request: Request) -> AIProcessor:
 async def get_email_presistence_inject(request: Request) -> EmailPresistence:
     return request.state.emailPresistence
 
+async def get_pre_classifier_inject(request: Request) -> EmailPreClassifier:
+    return request.state.preClassifier
+
+async def get_parse_pool_inject(request: Request) -> MessageParsePool:
+    return request.state.parsePool
+
+async def get_raw_archive_inject(request: Request) -> Optional[RawMessageArchive]:
+    return request.state.rawArchive
+
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+# 管理接口的令牌请求头，浏览器中的其它页面无法跨域携带自定义请求头
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+async def require_admin_inject(request: Request) -> None:
+    """管理接口只在启用剖析、请求来自本机且携带 admin.token 令牌时可用
+
+    仅检查本机地址时，用户浏览器中打开的任意网页都能向本机接口发起请求（CSRF），
+    因此同时校验令牌请求头，并拒绝来自其它站点的 Origin。
+    """
+    if request.state.profiler is None:
+        raise HTTPException(status_code=404, detail="未启用剖析接口")
+    if request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="剖析接口仅允许本机访问")
+    origin = request.headers.get("origin")
+    if origin is not None and origin not in origins:
+        raise HTTPException(status_code=403, detail="剖析接口不允许跨站请求")
+    token = request.state.config.get("admin", {}).get("token", "")
+    if not token:
+        raise HTTPException(status_code=403, detail="未配置 admin.token，剖析接口不可用")
+    if not hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, "").encode(), token.encode()):
+        raise HTTPException(status_code=403, detail=f"缺少或错误的 {ADMIN_TOKEN_HEADER} 请求头")
+
+async def get_profiler_inject(request: Request, _: None = Depends(require_admin_inject)) -> SamplingProfiler:
+    return request.state.profiler
+
+async def get_memory_tracker_inject(request: Request, _: None = Depends(require_admin_inject)) -> MemoryTracker:
+    return request.state.memoryTracker
+
+async def get_smtp_pool_inject(request: Request) -> SmtpPool:
+    return request.state.smtpPool
+
+async def get_template_manager_inject(request: Request) -> TemplateManager:
+    return request.state.templateManager
+
 def get_conn():
     conn = sqlite3.connect(DB_FILE)
     conn.enable_load_extension(True)
     sqlite_vec.load(conn)
     conn.enable_load_extension(False)
+    get_codec(DB_FILE).register(conn)
     return conn
 
 # 创建FastAPI应用
@@ -85,14 +202,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """将请求内各热点路径的耗时写入 Server-Timing 响应头
+
+    流式响应在响应头发出后才执行主体，只包含发出响应头之前的耗时，完整数据见 /metrics。
+    """
+    start = time.perf_counter()
+    timings = start_request_timing()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - start)
+    return response
+
 # API路由
 @app.get("/")
 async def root():
     """根路径"""
     return {"message": "邮件助手API服务正在运行"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 格式的运行指标"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/config")
 async def get_config(config: Dict[str, Any] = Depends(get_config_inject)):
     """获取配置"""
@@ -101,49 +236,107 @@ async def get_config(config: Dict[str, Any] = Depends(get_config_inject)):
 
 
 @app.post("/api/emails/refresh")
-async def refresh_emails(days: int = 2, \
+async def refresh_emails(days: int = 2, account: Optional[int] = None, \
                          config: Dict[str, Any] = Depends(get_config_inject),
-                         emailPresistence: EmailPresistence = Depends(get_email_presistence_inject)):
-    """刷新邮件"""
-    host = config["mail"]["imapServer"]
-    port = config["mail"]["imapPort"]
-    username = config["mail"]["emailAddress"]
-    password = config["mail"]["emailPassword"]
+                         emailPresistence: EmailPresistence = Depends(get_email_presistence_inject),
+                         preClassifier: EmailPreClassifier = Depends(get_pre_classifier_inject),
+                         parsePool: MessageParsePool = Depends(get_parse_pool_inject),
+                         rawArchive: Optional[RawMessageArchive] = Depends(get_raw_archive_inject)):
+    """刷新邮件，未指定 account 时并发同步全部账户"""
+    accounts = load_accounts(config["mail"])
+    if account is not None:
+        accounts = [item for item in accounts if item.id == account]
+        if not accounts:
+            raise HTTPException(status_code=404, detail=f"邮箱账户不存在: {account}")
+    prune_expunged = config["mail"].get("pruneExpunged", True)
  
     async def generate_stream():
-        email_client = EmailClient(host, port, username, password)
-        if email_client.connect():
-            emailPresistence.connect()
-            last_uid = emailPresistence.get_last_uid()
-            print(f"最后一个UID: {last_uid}")
-            emails = email_client.fetch_emails(days=days, last_uid=last_uid)
-            n_cnt = 0
-            e_cnt = 0
-            async for email in emails:
+        # 属性抽取在工作线程中读写去重指纹，与事件循环交替使用同一连接
+        emailPresistence.connect(check_same_thread=False)
+        last_uids = {item.id: emailPresistence.get_last_uid("INBOX", item.id) for item in accounts}
+        logger.info("最后一个UID: %s", last_uids)
+        since = datetime.now() - timedelta(days=days)
+        connected = 0
+        n_cnt = 0
+        e_cnt = 0
+        # 各账户的邮件轮流到达，在这里由同一个数据库连接依次入库
+        async for event in fetch_accounts(accounts, last_uids, days, parse_pool=parsePool,
+                                          archive=rawArchive, list_message_ids=prune_expunged):
+            if event.kind == EVENT_CONNECTED:
+                connected += 1
+            elif event.kind == EVENT_ERROR:
+                logger.warning("同步邮箱失败: %s", event.error, extra={"account": event.account.id})
+                yield f'data: {json.dumps({"message": event.error, "account": event.account.name})}\n\n'
+            elif event.kind == EVENT_LIVE_IDS:
+                # 删除服务器上已不存在的邮件
+                pruned = emailPresistence.prune_expunged("INBOX", since, event.live_message_ids or set(),
+                                                         event.account.id)
+                emailPresistence.commit()
+                if pruned:
+                    logger.info("已删除服务器上不存在的邮件: %s", pruned, extra={"account": event.account.id})
+                    yield f'data: {json.dumps({"message": "已删除服务器上不存在的邮件", "count": pruned, "account": event.account.name})}\n\n'
+            elif event.email is not None:
+                email = event.email
                 result = await emailPresistence.save_emails_to_db(email)
                 if result:
                     n_cnt += 1
-                    yield f'data: {json.dumps({"message": "邮件处理中", "count": n_cnt, "title": email.subject})}\n\n'
+                    yield f'data: {json.dumps({"message": "邮件处理中", "count": n_cnt, "title": email.subject, "account": event.account.name})}\n\n'
                 else:
                     e_cnt += 1
-                    yield f'data: {json.dumps({"message": "邮件处理失败", "count": n_cnt, "title": email.subject})}\n\n'
-                print(f"处理完成，共 {n_cnt} 条邮件，{e_cnt} 条异常，当前UID: {email.uid}", end="\r")
+                    yield f'data: {json.dumps({"message": "邮件处理失败", "count": n_cnt, "title": email.subject, "account": event.account.name})}\n\n'
+                logger.debug("邮件处理进度", extra={"count": n_cnt, "errors": e_cnt, "uid": email.uid})
+                if rawArchive is not None:
+                    rawArchive.commit()
                 emailPresistence.commit()
-            
+        logger.info("邮件保存完成", extra={"count": n_cnt, "errors": e_cnt})
+
+        if connected:
             n_cnt = 0
             e_cnt = 0
-            attributes = extract_email_info(emailPresistence.get_noattribute_emails(), 'qwen3-coder-plus')
-            for attr in attributes:
-                if emailPresistence.save_email_attributes_to_db(attr):
-                    n_cnt += 1
-                    yield f'data: {json.dumps({"message": "邮件属性保存中", "count": n_cnt, "title": attr.content[:20]})}\n\n'
-                else:
-                    e_cnt += 1
-                    yield f'data: {json.dumps({"message": "邮件属性保存失败", "count": n_cnt, "title": attr.content[:20]})}\n\n'
-                print(f"邮件属性提取，共 {n_cnt} 条邮件，{e_cnt} 条异常，当前UID: {attr.uid}", end="\r")
+            deduplicator = None
+            dedupe_options = config["ai"].get("dedupe", {})
+            if dedupe_options.get("enabled", True):
+                deduplicator = ExtractionDeduplicator(
+                    emailPresistence.conn,  # pyright: ignore[reportArgumentType]
+                    max_distance=dedupe_options.get("maxDistance", 3))
+            noattribute_emails = emailPresistence.get_noattribute_emails()
+            # 抽取依赖 langextract，加载较慢，只在刷新时导入
+            from .email_extract import extract_email_info
+
+            attributes = extract_email_info(noattribute_emails, EXTRACT_MODEL_ID,
+                                            pre_classifier=preClassifier,
+                                            deduplicator=deduplicator)
+            try:
+                while True:
+                    # 抽取中的LLM调用会等待并发槽位和重试退避，在线程中逐条取结果，不阻塞事件循环
+                    attr = await asyncio.to_thread(next, attributes, None)
+                    if attr is None:
+                        break
+                    if emailPresistence.save_email_attributes_to_db(attr):
+                        n_cnt += 1
+                        yield f'data: {json.dumps({"message": "邮件属性保存中", "count": n_cnt, "title": attr.content[:20]})}\n\n'
+                    else:
+                        e_cnt += 1
+                        yield f'data: {json.dumps({"message": "邮件属性保存失败", "count": n_cnt, "title": attr.content[:20]})}\n\n'
+                    logger.debug("邮件属性提取进度", extra={"count": n_cnt, "errors": e_cnt, "uid": attr.uid})
+                    emailPresistence.commit()
+            except Exception as e:
+                # 抽取中断时，剩余邮件交给后台重试
+                logger.warning("邮件属性提取失败: %s", e)
+                queue = WorkQueue(emailPresistence.conn)  # pyright: ignore[reportArgumentType]
+                remaining = {int(email.uid) for email in emailPresistence.get_noattribute_emails()}
+                for email in noattribute_emails:
+                    if int(email.uid) in remaining:
+                        queue.fail(int(email.uid), JOB_EXTRACTION, str(e))
                 emailPresistence.commit()
+                yield f'data: {json.dumps({"message": "邮件属性提取失败，已加入重试队列", "count": len(remaining)})}\n\n'
             emailPresistence.close()
-            yield f'data: {json.dumps({"message": "邮件刷新成功", "count": n_cnt})}\n\n'
+            logger.info("邮件属性提取完成", extra={"count": n_cnt, "errors": e_cnt})
+            done = {"message": "邮件刷新成功", "count": n_cnt}
+            if deduplicator is not None:
+                done["dedupeHitRate"] = round(deduplicator.hit_rate, 4)
+                logger.info("抽取去重命中率: %s/%s", deduplicator.hits, deduplicator.lookups)
+            yield f'data: {json.dumps(done)}\n\n'
         else:
             yield f'data: {json.dumps({"message": "连接邮件服务器失败"})}\n\n'
             emailPresistence.close()
@@ -153,39 +346,50 @@ async def refresh_emails(days: int = 2, \
 
 
 @app.get("/api/emails")
-async def get_emails(folder: str = "", limit: int = 10, offset: int = 0):
-    """获取邮件列表"""
+async def get_emails(folder: str = "", limit: int = 10, offset: int = 0, full: bool = False,
+                     account: Optional[int] = None):
+    """获取邮件列表
+
+    默认只返回明文摘要 snippet，full=true 时才解压并返回完整正文 content。
+    account 指定时只返回该账户的邮件。
+    """
     try:
         conn = get_conn()
         cursor = conn.cursor()
-        
+        content_column = "email_content(content, content_codec)" if full else "NULL"
+        conditions = []
+        params: list = []
         if folder:
-            cursor.execute('''
-                SELECT id, subject, sender, recipient, date, content, folder
-                FROM emails
-                WHERE folder = ?
-                ORDER BY date DESC
-                LIMIT ? OFFSET ?
-            ''', (folder, limit, offset))
-        else:
-            cursor.execute('''
-                SELECT id, subject, sender, recipient, date, content, folder
-                FROM emails
-                ORDER BY date DESC
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
+            conditions.append("folder = ?")
+            params.append(folder)
+        if account is not None:
+            conditions.append("account_id = ?")
+            params.append(account)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor.execute(f'''
+            SELECT id, subject, sender, recipient, date, snippet, folder, {content_column}, account_id
+            FROM emails
+            {where}
+            ORDER BY date_utc DESC
+            LIMIT ? OFFSET ?
+        ''', (*params, limit, offset))
         
         emails = []
         for row in cursor.fetchall():
-            emails.append({
+            email = {
                 "id": row[0],
                 "subject": row[1],
                 "sender": row[2],
                 "recipient": row[3],
                 "date": row[4],
-                "content": row[5],
-                "folder": row[6]
-            })
+                "snippet": row[5],
+                "folder": row[6],
+                "account_id": row[8]
+            }
+            if full:
+                email["content"] = row[7]
+            emails.append(email)
         
         conn.close()
         return emails
@@ -193,12 +397,162 @@ async def get_emails(folder: str = "", limit: int = 10, offset: int = 0):
         raise HTTPException(status_code=500, detail=f"获取邮件失败: {str(e)}")
 
 
+@app.get("/api/stats")
+async def get_stats(days: int = 30, top: int = 10):
+    """统计面板：总数、最近 days 天每天的数量、邮件最多的文件夹、发件人和账户"""
+    if not 0 < days <= 366 or not 0 < top <= 100:
+        raise HTTPException(status_code=400, detail="days 取值 1-366，top 取值 1-100")
+    try:
+        conn = get_conn()
+        stats = EmailStats(conn).summary(datetime.today().date(), days, top)
+        conn.close()
+        return stats
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取统计失败: {str(e)}")
+
+
+@app.get("/api/tasks/due")
+async def get_due_tasks(days: int = 7, overdue: bool = False, limit: int = 100):
+    """未来 days 天内到期的待办，overdue=true 时同时返回已过期未完成的待办"""
+    if not 0 < days <= 366:
+        raise HTTPException(status_code=400, detail="days 取值 1-366")
+    try:
+        conn = get_conn()
+        now = datetime.now()
+        tasks = TaskStore(conn).due_between(None if overdue else now, now + timedelta(days=days), limit=limit)
+        conn.close()
+        return tasks
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取待办失败: {str(e)}")
+
+
+@app.post("/api/tasks/{task_id}/done")
+async def complete_task(task_id: int):
+    """标记待办已完成"""
+    conn = get_conn()
+    try:
+        found = TaskStore(conn).set_status(task_id, STATUS_DONE)
+        conn.commit()
+    finally:
+        conn.close()
+    if not found:
+        raise HTTPException(status_code=404, detail=f"待办不存在: {task_id}")
+    return {"message": "待办已完成"}
+
+
+@app.get("/api/accounts")
+async def get_accounts(config: Dict[str, Any] = Depends(get_config_inject)):
+    """邮箱账户列表，不返回密码"""
+    try:
+        accounts = load_accounts(config["mail"])
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"读取邮箱账户失败: {str(e)}")
+    return [{"id": account.id, "name": account.name, "emailAddress": account.email_address}
+            for account in accounts]
+
+
+@app.get("/api/queue")
+async def get_queue_depth(config: Dict[str, Any] = Depends(get_config_inject)):
+    """失败任务重试队列的深度"""
+    try:
+        conn = get_conn()
+        depth = WorkQueue(conn, config.get("queue", {}).get("maxAttempts", 8)).depth()
+        conn.close()
+        return depth
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取重试队列失败: {str(e)}")
+
+
+@app.get("/api/emails/{uid}/raw")
+async def get_email_raw(uid: int, folder: str = "INBOX",
+                        rawArchive: Optional[RawMessageArchive] = Depends(get_raw_archive_inject)):
+    """获取邮件原文"""
+    if rawArchive is None:
+        raise HTTPException(status_code=404, detail="未启用邮件原文归档")
+    raw = rawArchive.get(uid, folder)
+    if raw is None:
+        raise HTTPException(status_code=404, detail=f"邮件原文不存在: {uid}")
+    return Response(content=raw, media_type="message/rfc822")
+
+
+@app.post("/api/knowledge/reindex")
+async def reindex_emails(folder: str = "",
+                         emailPresistence: EmailPresistence = Depends(get_email_presistence_inject),
+                         parsePool: MessageParsePool = Depends(get_parse_pool_inject),
+                         rawArchive: Optional[RawMessageArchive] = Depends(get_raw_archive_inject)):
+    """从本地原文归档重新解析并重建邮件索引"""
+    if rawArchive is None:
+        raise HTTPException(status_code=404, detail="未启用邮件原文归档")
+
+    async def generate_stream():
+        emailPresistence.connect()
+        n_cnt = 0
+        e_cnt = 0
+        async for email in iter_archived_emails(rawArchive, folder or None, parsePool):
+            if await emailPresistence.save_emails_to_db(email):
+                n_cnt += 1
+                yield f'data: {json.dumps({"message": "邮件重建中", "count": n_cnt, "title": email.subject})}\n\n'
+            else:
+                e_cnt += 1
+                yield f'data: {json.dumps({"message": "邮件重建失败", "count": n_cnt, "title": email.subject})}\n\n'
+            emailPresistence.commit()
+        emailPresistence.close()
+        yield f'data: {json.dumps({"message": "邮件索引重建完成", "count": n_cnt, "errors": e_cnt})}\n\n'
+        yield 'data: [DONE]\n\n'
+
+    return StreamingResponse(generate_stream(), media_type="text/event-stream")
+
+
+@app.post("/api/knowledge/compact")
+async def compact_vectors(emailPresistence: EmailPresistence = Depends(get_email_presistence_inject)):
+    """清理孤立向量并重建向量表"""
+    try:
+        # 压缩包含 VACUUM，在工作线程中使用独立连接执行
+        return await asyncio.to_thread(emailPresistence.compact_vectors_isolated)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"压缩向量表失败: {str(e)}")
+
+
+@app.get("/api/admin/profile")
+async def profile(seconds: float = 10, profiler: SamplingProfiler = Depends(get_profiler_inject)):
+    """采样剖析运行中的进程，返回折叠栈文件（flamegraph.pl / speedscope 可读）"""
+    if seconds <= 0 or seconds > MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"采样时长需在 0-{MAX_PROFILE_SECONDS} 秒之间")
+    try:
+        # 在线程中采样，事件循环继续处理请求
+        stacks = await asyncio.to_thread(profiler.sample, seconds)
+    except ProfilerBusyException as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=SamplingProfiler.to_collapsed(stacks), media_type="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.folded"'})
+
+@app.post("/api/admin/memory/start")
+async def start_memory_tracking(memoryTracker: MemoryTracker = Depends(get_memory_tracker_inject)):
+    """开始 tracemalloc 跟踪并记录基线快照"""
+    memoryTracker.start()
+    return {"message": "内存跟踪已开始", **memoryTracker.usage()}
+
+@app.get("/api/admin/memory/diff")
+async def memory_diff(top: int = 20, memoryTracker: MemoryTracker = Depends(get_memory_tracker_inject)):
+    """与上一次快照对比内存增长，并以本次快照作为新基线"""
+    try:
+        stats = memoryTracker.diff(top)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"stats": stats, **memoryTracker.usage()}
+
+@app.post("/api/admin/memory/stop")
+async def stop_memory_tracking(memoryTracker: MemoryTracker = Depends(get_memory_tracker_inject)):
+    """停止 tracemalloc 跟踪"""
+    memoryTracker.stop()
+    return {"message": "内存跟踪已停止"}
+
 @app.post("/api/emails/search")
 async def search_emails(query: SearchQuery, aiProcessor: AIProcessor = Depends(get_ai_processor_inject)):
     """语义搜索邮件"""
     conn = get_conn()
     try:
-        results = await aiProcessor.search_similar_emails(query.query, conn=conn)
+        results = await aiProcessor.search_similar_emails(query.query, conn=conn, account_id=query.account_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索邮件失败: {str(e)}")
     finally:
@@ -230,57 +584,100 @@ async def get_daily_summary(
 
 
 @app.get("/api/templates")
-async def get_templates():
-    """获取邮件模板列表"""
+async def get_templates(request: Request,
+                        templateManager: TemplateManager = Depends(get_template_manager_inject)):
+    """获取邮件模板列表，客户端缓存未过期时返回 304"""
+    etag = templateManager.etag
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(templateManager.list_templates(), headers={"ETag": etag})
+
+@app.post("/api/templates")
+async def create_template(template: Template,
+                          templateManager: TemplateManager = Depends(get_template_manager_inject)):
+    """创建邮件模板"""
+    template.id = 0
+    if not templateManager.save_template(template):
+        raise HTTPException(status_code=500, detail=f"创建模板失败: {template.name}")
+    return {"id": template.id, "message": "模板创建成功"}
+
+@app.post("/api/emails/send")
+async def send_email(email: Email,
+                     config: Dict[str, Any] = Depends(get_config_inject),
+                     smtpPool: SmtpPool = Depends(get_smtp_pool_inject)):
+    """发送邮件，多个收件人用逗号分隔"""
+    recipients = [recipient.strip() for recipient in email.recipient.split(",") if recipient.strip()]
+    msg = build_message(config["mail"]["emailAddress"], recipients, email.subject, email.content)
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, subject, content
-            FROM templates
-        ''')
-        
-        templates = []
-        for row in cursor.fetchall():
-            templates.append({
-                "id": row[0],
-                "name": row[1],
-                "subject": row[2],
-                "content": row[3]
-            })
-        
+        await smtpPool.send(msg)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"发送邮件失败: {str(e)}")
+    return {"message": f"邮件 '{email.subject}' 发送成功"}
+
+
+def outbox_stream(batch_id: str, sender: str, smtpPool: SmtpPool, max_attempts: int):
+    """发送批次中未成功的邮件，以 SSE 返回每个收件人的发送状态"""
+    async def generate_stream():
+        conn = get_conn()
+        outbox = Outbox(conn)
+        yield f'data: {json.dumps({"message": "开始发送", "batchId": batch_id, **outbox.batch_status(batch_id)})}\n\n'
+        try:
+            async for result in send_batch(outbox, smtpPool, sender, batch_id, max_attempts):
+                yield f'data: {json.dumps(result)}\n\n'
+            status = outbox.batch_status(batch_id)
+            logger.info("批量发送完成", extra={"batch_id": batch_id, **status})
+            yield f'data: {json.dumps({"message": "发送完成", "batchId": batch_id, **status})}\n\n'
+        finally:
+            conn.close()
+        yield 'data: [DONE]\n\n'
+
+    return StreamingResponse(generate_stream(), media_type="text/event-stream")
+
+
+@app.post("/api/emails/send/bulk")
+async def send_bulk_email(request: BulkSendRequest,
+                          config: Dict[str, Any] = Depends(get_config_inject),
+                          smtpPool: SmtpPool = Depends(get_smtp_pool_inject)):
+    """批量发送邮件，主题和正文中的 {key} 按收件人的 variables 替换"""
+    batch_id = Outbox.new_batch_id()
+    subject = CompiledTemplate(request.subject)
+    content = CompiledTemplate(request.content)
+    try:
+        conn = get_conn()
+        Outbox(conn).enqueue(batch_id, ({
+            "recipient": recipient.email,
+            "subject": subject.render(recipient.variables),
+            "content": content.render(recipient.variables),
+            "content_type": request.content_type,
+        } for recipient in request.recipients))
         conn.close()
-        return templates
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取模板失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"写入发件箱失败: {str(e)}")
+    return outbox_stream(batch_id, config["mail"]["emailAddress"], smtpPool,
+                         config["mail"].get("smtpMaxAttempts", 3))
 
-@app.post("/api/templates")
-async def create_template(template: Template):
-    """创建邮件模板"""
+
+@app.get("/api/emails/outbox/{batch_id}")
+async def get_outbox_status(batch_id: str):
+    """批量发送批次的状态"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO templates (name, subject, content)
-            VALUES (?, ?, ?)
-        ''', (template.name, template.subject, template.content))
-        
-        template_id = cursor.lastrowid
-        conn.commit()
+        conn = get_conn()
+        status = Outbox(conn).batch_status(batch_id)
         conn.close()
-        
-        return {"id": template_id, "message": "模板创建成功"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"创建模板失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取发件箱状态失败: {str(e)}")
+    if not any(status.values()):
+        raise HTTPException(status_code=404, detail=f"批次不存在: {batch_id}")
+    return status
 
-@app.post("/api/emails/send")
-async def send_email(email: Email):
-    """发送邮件"""
-    # 这里需要实现实际的邮件发送逻辑
-    # 目前只是返回一个示例响应
-    return {"message": f"邮件 '{email.subject}' 发送成功"}
+
+@app.post("/api/emails/outbox/{batch_id}/resume")
+async def resume_outbox(batch_id: str,
+                        config: Dict[str, Any] = Depends(get_config_inject),
+                        smtpPool: SmtpPool = Depends(get_smtp_pool_inject)):
+    """继续发送批次中未成功的邮件"""
+    return outbox_stream(batch_id, config["mail"]["emailAddress"], smtpPool,
+                         config["mail"].get("smtpMaxAttempts", 3))
 
 def run():
     import uvicorn
@@ -0,0 +1,204 @@
+"""
+运行指标模块
+
+热点路径（IMAP 下载、MIME 解析、向量化、向量检索、LLM 调用、SQLite 提交）通过 span() 记录耗时，
+字节数、token 数、重试次数和缓存命中通过计数器记录。
+指标以 Prometheus 文本格式在 /metrics 暴露，同一请求内的耗时汇总到 Server-Timing 响应头。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 耗时直方图的桶（秒），覆盖单次 SQLite 提交到整批 LLM 调用
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """只增计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(Counter):
+    """直方图，记录分布、总和与次数"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数..., 总和, 次数]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def get(self, **labels) -> float:
+        """返回观测次数"""
+        series = self.series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self.series.get(self._key(labels))
+        return series[-2] if series else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(count)}")
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Counter] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))  # pyright: ignore[reportReturnType]
+
+    def _register(self, metric: Counter) -> Counter:
+        if metric.name in self.metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SPAN_SECONDS = REGISTRY.histogram(
+    "email_assistant_span_seconds", "热点路径耗时（秒）", ["span"])
+BYTES_TOTAL = REGISTRY.counter(
+    "email_assistant_bytes_total", "处理的字节数", ["kind"])
+TOKENS_TOTAL = REGISTRY.counter(
+    "email_assistant_tokens_total", "模型调用消耗的 token 数", ["model", "kind"])
+RETRIES_TOTAL = REGISTRY.counter(
+    "email_assistant_retries_total", "外部服务调用的重试次数", ["client"])
+CACHE_HITS_TOTAL = REGISTRY.counter(
+    "email_assistant_cache_hits_total", "缓存命中次数", ["cache"])
+CACHE_MISSES_TOTAL = REGISTRY.counter(
+    "email_assistant_cache_misses_total", "缓存未命中次数", ["cache"])
+
+# 当前请求内各 span 的累计耗时：名称 -> [总耗时(秒), 次数]
+_request_timings: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar("request_timings", default=None)
+
+
+def observe_span(name: str, seconds: float):
+    """记录一次耗时，用于在其它进程中测得的耗时"""
+    SPAN_SECONDS.observe(seconds, span=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timing = timings.setdefault(name, [0.0, 0])
+        timing[0] += seconds
+        timing[1] += 1
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """记录代码块耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_span(name, time.perf_counter() - start)
+
+
+def record_tokens(model: str, usage) -> None:
+    """从 openai / pydantic_ai 的 usage 对象中记录 token 数"""
+    if usage is None:
+        return
+    for kind, attrs in (("prompt", ("prompt_tokens", "request_tokens")),
+                        ("completion", ("completion_tokens", "response_tokens"))):
+        for attr in attrs:
+            value = getattr(usage, attr, None)
+            if value:
+                TOKENS_TOTAL.inc(value, model=model, kind=kind)
+                break
+
+
+def start_request_timing() -> Dict[str, List[float]]:
+    """开始收集当前请求的耗时"""
+    timings: Dict[str, List[float]] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, List[float]], total: Optional[float] = None) -> str:
+    """生成 Server-Timing 响应头，耗时单位为毫秒"""
+    entries = [f'{name};desc="x{int(count)}";dur={seconds * 1000:.1f}' for name, (seconds, count) in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
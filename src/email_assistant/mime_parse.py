@@ -0,0 +1,259 @@
+"""
+邮件解析模块
+
+将 RFC822 原文解析为紧凑的 ParsedMessage 记录（邮件头、正文、日历标记、附件元数据）。
+解析是纯 CPU 的 Python 代码，大批量回填时通过 MessageParsePool 分发到进程池，
+按可用核数并行解析，避免阻塞事件循环所在的单个核心。
+"""
+
+import asyncio
+import email
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from email.header import decode_header
+from email.message import Message
+from email.utils import parsedate_to_datetime
+from typing import AsyncGenerator, AsyncIterable, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from .email_threading import clean_reply, is_reply_headers
+from .metrics import observe_span, span
+from .mime_text import clean_text, extract_body
+from .type import Email
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_ID = re.compile(r'<[^<>\s]+>')
+
+
+class AttachmentInfo(NamedTuple):
+    filename: str
+    content_type: str
+    size: int
+
+
+class ParsedMessage(NamedTuple):
+    subject: str
+    sender: str
+    recipient: str
+    date: Optional[datetime]
+    content: str
+    is_calendar: bool
+    attachments: List[AttachmentInfo]
+    message_id: str = ""
+    in_reply_to: str = ""
+    references: List[str] = []
+    # 回复邮件中新增内容的长度，在排版前识别引用得到
+    delta_length: Optional[int] = None
+
+    def to_email(self, uid: int, folder: str, account_id: int = 0) -> Email:
+        return Email(
+            uid=uid,
+            account_id=account_id,
+            subject=self.subject,
+            sender=self.sender,
+            recipient=self.recipient,
+            date=self.date,  # pyright: ignore[reportArgumentType]
+            content=self.content,
+            folder=folder,
+            message_id=self.message_id,
+            in_reply_to=self.in_reply_to,
+            references=self.references,
+            delta_length=self.delta_length
+        )
+
+
+def header_decode(encoded_header: str) -> str:
+    if "=?" in encoded_header:
+        decoded_headers = decode_header(encoded_header)
+        decoded_texts = []
+        for decoded_header in decoded_headers:
+            decoded_text = decoded_header[0].decode(decoded_header[1] or 'utf-8')
+            decoded_texts.append(decoded_text)
+
+        return "".join(decoded_texts)
+    else:
+        return encoded_header
+
+
+def decode_text(text) -> Tuple[str, str]:
+    """
+    对邮件的主题或正文进行解码处理
+    :param text: 待解码的文本
+    :return: 解码后的文本
+    """
+    decoded_parts = decode_header(text)
+    decoded_text:str = ""
+    _encoding:str = ""
+    for part, encoding in decoded_parts:
+        if isinstance(part, bytes):
+            if encoding:
+                _encoding = encoding
+                decoded_text += part.decode(encoding, errors='ignore')
+            else:
+                decoded_text += part.decode(errors='ignore')
+        else:
+            decoded_text += part
+    return decoded_text, _encoding
+
+
+def _message_ids(value: Optional[str]) -> List[str]:
+    """提取邮件头中的 <Message-ID> 列表"""
+    return _MESSAGE_ID.findall(value or "")
+
+
+def _attachments(msg: Message) -> List[AttachmentInfo]:
+    attachments = []
+    for part in msg.walk():
+        if part.is_multipart():
+            continue
+        filename = part.get_filename()
+        if not filename and part.get_content_disposition() != "attachment":
+            continue
+        payload = part.get_payload(decode=True)
+        attachments.append(AttachmentInfo(
+            filename=decode_text(filename)[0] if filename else "",
+            content_type=part.get_content_type(),
+            size=len(payload) if isinstance(payload, bytes) else 0
+        ))
+    return attachments
+
+
+def parse_message(raw: bytes) -> ParsedMessage:
+    """解析邮件原文，可在子进程中执行"""
+    msg = email.message_from_bytes(raw)
+
+    subject, _ = decode_text(msg['subject'] or "")
+    date_str = msg.get("Date", "")
+    in_reply_to = next(iter(_message_ids(msg.get("In-Reply-To"))), "")
+    references = _message_ids(msg.get("References"))
+    body = extract_body(msg)
+    if is_reply_headers(subject, in_reply_to, references):
+        content, delta_length = clean_reply(body)
+    else:
+        content, delta_length = clean_text(body), None
+    is_calendar = content.startswith("BEGIN:VCALENDAR") or \
+        any(part.get_content_type() == "text/calendar" for part in msg.walk())
+
+    return ParsedMessage(
+        subject=subject,
+        sender=header_decode(msg.get("From", "")),
+        recipient=header_decode(msg.get("To", "")),
+        date=parsedate_to_datetime(date_str) if date_str else None,
+        content=content,
+        is_calendar=is_calendar,
+        attachments=_attachments(msg),
+        message_id=next(iter(_message_ids(msg.get("Message-ID"))), ""),
+        in_reply_to=in_reply_to,
+        references=references,
+        delta_length=delta_length
+    )
+
+
+def _timed_parse_message(raw: bytes) -> Tuple[ParsedMessage, float]:
+    """在子进程中解析并返回耗时，耗时由主进程汇总到指标"""
+    start = time.perf_counter()
+    parsed = parse_message(raw)
+    return parsed, time.perf_counter() - start
+
+
+async def _as_async_iterable(items: Union[Iterable, AsyncIterable]) -> AsyncGenerator:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+# 一批邮件少于这个数量时在当前线程内解析，进程间传输和启动子进程的开销大于并行的收益
+DEFAULT_MIN_BATCH = 32
+
+
+def _mp_context():
+    """子进程使用 forkserver（不支持时用 spawn）启动
+
+    服务运行时已有日志、嵌入、重试等线程，fork 会复制这些线程持有的锁，子进程可能死锁。
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class MessageParsePool:
+    """邮件解析进程池
+
+    workers 默认为可用核数；workers <= 1 时在当前线程内直接解析，不创建子进程。
+    一批邮件达到 min_batch 封后才交给进程池，进程池在第一次使用时创建。
+    """
+
+    def __init__(self, workers: Optional[int] = None, min_batch: int = DEFAULT_MIN_BATCH):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_batch = min_batch
+        # 在途任务上限，保证 IMAP 下载与解析重叠的同时控制内存占用
+        self.max_pending = self.workers * 4
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+        return self.executor
+
+    def submit(self, raw: bytes, in_process: bool = False) -> "asyncio.Future[ParsedMessage]":
+        """提交解析任务，返回可 await 的 Future
+        Args:
+            raw: 邮件原文
+            in_process: 在当前线程内解析，不使用进程池
+        """
+        loop = asyncio.get_running_loop()
+        if self.workers > 1 and not in_process:
+            return asyncio.ensure_future(
+                self._timed(loop.run_in_executor(self._get_executor(), _timed_parse_message, raw)))
+
+        future = loop.create_future()
+        try:
+            with span("mime_parse"):
+                parsed = parse_message(raw)
+            future.set_result(parsed)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    @staticmethod
+    async def _timed(future) -> ParsedMessage:
+        parsed, seconds = await future
+        observe_span("mime_parse", seconds)
+        return parsed
+
+    async def parse_many(self, raws: Union[Iterable[Tuple[int, bytes]], AsyncIterable[Tuple[int, bytes]]]
+                         ) -> AsyncGenerator[Tuple[int, Optional[ParsedMessage]], None]:
+        """按提交顺序解析一批邮件原文，解析失败的邮件返回 None
+        Args:
+            raws: (uid, 原文) 序列，可以是边下载边产出的生成器或异步生成器
+        """
+        pending = deque()
+        count = 0
+        async for uid, raw in _as_async_iterable(raws):
+            # 前 min_batch 封在当前线程解析，批次较大时其余的交给进程池
+            count += 1
+            pending.append((uid, self.submit(raw, in_process=count <= self.min_batch)))
+            if len(pending) >= self.max_pending:
+                yield await self._result(*pending.popleft())
+        while pending:
+            yield await self._result(*pending.popleft())
+
+    async def _result(self, uid: int, future) -> Tuple[int, Optional[ParsedMessage]]:
+        try:
+            return uid, await future
+        except Exception as e:
+            logger.warning("解析邮件失败 (ID: %s): %s", uid, e)
+            return uid, None
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
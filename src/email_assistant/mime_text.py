@@ -0,0 +1,173 @@
+"""
+邮件正文提取模块
+
+一次遍历 MIME 结构提取正文：优先使用 text/plain，没有时才解码第一个 text/html 部分，
+HTML 转文本优先使用 C 实现的 selectolax，其次 lxml，最后退回 BeautifulSoup；
+lxml 无法解析的文档用正则清理。
+超大的营销邮件在解析前按大小截断，避免 HTML 解析和文本排版占满 CPU。
+"""
+
+import codecs
+import re
+import textwrap
+from html import unescape
+from email.message import Message
+from typing import Callable, Optional
+
+# HTML 原文截断长度（字节），超出部分不参与解析
+MAX_HTML_BYTES = 512 * 1024
+# 正文文本截断长度（字符），超出部分不参与排版和入库
+MAX_TEXT_CHARS = 64 * 1024
+
+# 声明的字符集与实际使用的解码器映射，gb2312/gbk 邮件中常混有扩展字符
+CHARSET_ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "x-gbk": "gb18030",
+    "ks_c_5601-1987": "cp949",
+    "unicode-1-1-utf-7": "utf-7",
+}
+
+
+def normalize_charset(charset: Optional[str]) -> str:
+    """将邮件声明的字符集转换为可用的 Python 编码名称，无法识别时返回 utf-8"""
+    if not charset:
+        return "utf-8"
+    charset = charset.strip().strip('"').lower()
+    charset = CHARSET_ALIASES.get(charset, charset)
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        return "utf-8"
+    return charset
+
+
+def decode_payload(part: Message, max_bytes: Optional[int] = None) -> str:
+    """按声明的字符集解码 MIME 部分的内容"""
+    payload = part.get_payload(decode=True)
+    if not isinstance(payload, bytes):
+        return ""
+    if max_bytes is not None:
+        payload = payload[:max_bytes]
+    return payload.decode(normalize_charset(part.get_content_charset()), errors='ignore')
+
+
+# 块级元素结束后换行，与逐行排版的纯文本正文一致
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "footer", "form",
+              "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "ol", "p", "pre", "section",
+              "table", "tr", "ul"}
+
+_XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>', re.IGNORECASE)
+_SCRIPT_STYLE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_LINE_BREAK = re.compile(r'<br\b[^>]*>|</(?:%s)\s*>' % '|'.join(sorted(BLOCK_TAGS)), re.IGNORECASE)
+_TAG = re.compile(r'<[^>]*>')
+_LINE_BREAK_SELECTOR = ', '.join(['br', *sorted(BLOCK_TAGS)])
+
+
+def _regex_html_to_text(html: str) -> str:
+    """不依赖解析器的清理，用于解析器无法处理的文档"""
+    html = _SCRIPT_STYLE.sub('', html)
+    html = _LINE_BREAK.sub('\n', html)
+    return unescape(_TAG.sub('', html))
+
+
+def _selectolax_html_to_text(html: str) -> str:
+    from selectolax.parser import HTMLParser
+
+    tree = HTMLParser(html)
+    for node in tree.css('script, style'):
+        node.decompose()
+    if tree.root is None:
+        return ""
+    for node in tree.css(_LINE_BREAK_SELECTOR):
+        node.insert_after("\n")
+    return tree.root.text(separator='')
+
+
+def _lxml_html_to_text(html: str) -> str:
+    import lxml.html
+    from lxml.etree import ParserError
+
+    try:
+        # 带编码声明的 XHTML 不能以 str 解析，声明对已解码的文本也没有意义
+        doc = lxml.html.fromstring(_XML_DECLARATION.sub('', html, count=1))
+    except (ParserError, ValueError):
+        return _regex_html_to_text(html)
+    for node in doc.xpath('//script|//style'):
+        node.drop_tree()
+    for node in doc.iter():
+        if not isinstance(node.tag, str):
+            continue
+        tag = node.tag.lower()
+        if tag == "br" or tag in BLOCK_TAGS:
+            node.tail = "\n" + (node.tail or "")
+    return doc.text_content()
+
+
+def _bs4_html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, 'html.parser').get_text()
+
+
+def _select_html_engine() -> Callable[[str], str]:
+    try:
+        import selectolax.parser  # noqa: F401
+        return _selectolax_html_to_text
+    except ImportError:
+        pass
+    try:
+        import lxml.html  # noqa: F401
+        return _lxml_html_to_text
+    except ImportError:
+        return _bs4_html_to_text
+
+
+html_to_text = _select_html_engine()
+
+
+def extract_body(msg: Message, max_chars: int = MAX_TEXT_CHARS) -> str:
+    """一次遍历提取邮件正文
+
+    multipart 邮件中遇到第一个 text/plain 即返回；否则只转换第一个 text/html 部分。
+    """
+    if not msg.is_multipart():
+        if msg.get_content_type() == "text/html":
+            return html_to_text(decode_payload(msg, max_bytes=MAX_HTML_BYTES))[:max_chars]
+        content = decode_payload(msg)
+        # 日历内容需要完整保留以便 icalendar 解析
+        if content.startswith("BEGIN:VCALENDAR"):
+            return content
+        return content[:max_chars]
+
+    html_part = None
+    for part in msg.walk():
+        content_type = part.get_content_type()
+        if content_type == "text/plain":
+            return decode_payload(part)[:max_chars]
+        if content_type == "text/html" and html_part is None:
+            html_part = part
+
+    if html_part is None:
+        return ""
+    html = decode_payload(html_part, max_bytes=MAX_HTML_BYTES)
+    return html_to_text(html)[:max_chars]
+
+
+def clean_text(content: str) -> str:
+    """去除空白行和转发头后按100字符重新排版，日历内容原样返回"""
+    if content.startswith("BEGIN:VCALENDAR"):
+        return content
+
+    dedented_text = textwrap.dedent(content).strip()
+    # 移除 dedented_text 中的空白行
+    lines = [line for line in dedented_text.splitlines() \
+                if line.strip() \
+                    and not line.startswith('发件人：')
+                    and not line.startswith('收件人：')
+                    and not line.startswith('抄送：')]
+    dedented_text = '\n'.join(lines)
+    wrapped_text = textwrap.fill(dedented_text, width=100)
+    wrapped_text = wrapped_text.replace(' _____ ', '\n_____\n')
+
+    return wrapped_text
@@ -7,8 +7,12 @@ from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.settings import ModelSettings
 from typing_extensions import TypeAliasType
 
+from .client_manager import client_manager
+
 api_key = os.environ.get("BAILIAN_API_KEY", "")
 
+DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
 KnownModelName = TypeAliasType(
     'KnownModelName',
     Literal[
@@ -20,7 +24,6 @@ KnownModelName = TypeAliasType(
 
 def qwen(model_name: KnownModelName| str, settings: Optional[ModelSettings] = None) -> OpenAIModel:
     return OpenAIModel(str(model_name), provider=OpenAIProvider(
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-        api_key=api_key,        
+        openai_client=client_manager.async_openai(DASHSCOPE_BASE_URL, api_key or "cannot be empty"),
     ), settings=settings)
 
@@ -0,0 +1,161 @@
+"""
+发件箱模块
+
+批量发送的每封邮件先写入 email_outbox 表，再通过 SmtpPool 并发发送并逐封更新状态。
+邮件交给服务器前标记为 sending，发送结果未知的邮件保持 sending，不会被自动重发。
+服务重启或发送中断后，可以按批次继续发送未发出和发送失败的邮件。
+"""
+
+import asyncio
+import sqlite3
+import uuid
+from datetime import datetime
+from typing import AsyncGenerator, Dict, Iterable, List, NamedTuple, Set
+
+from .email_sender import SmtpDeliveryUnknown, SmtpPool, build_message
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+class OutboxMessage(NamedTuple):
+    id: int
+    recipient: str
+    subject: str
+    content: str
+    content_type: str
+    attempts: int
+
+
+class Outbox:
+    """基于 email_outbox 表的发件箱"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @staticmethod
+    def create_table(conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch_id TEXT,
+                recipient TEXT,
+                subject TEXT,
+                content TEXT,
+                content_type TEXT DEFAULT 'plain',
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                created_at DATETIME,
+                sent_at DATETIME
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_outbox_batch ON email_outbox (batch_id, status)
+        ''')
+
+    @staticmethod
+    def new_batch_id() -> str:
+        return uuid.uuid4().hex
+
+    def enqueue(self, batch_id: str, messages: Iterable[Dict[str, str]]) -> int:
+        """写入一批待发送邮件，messages 的每一项包含 recipient、subject、content、content_type"""
+        now = datetime.now()
+        cursor = self.conn.executemany('''
+            INSERT INTO email_outbox (batch_id, recipient, subject, content, content_type, status, created_at)
+            VALUES (?, ?, ?, ?, ?, 'pending', ?)
+        ''', ((batch_id, message["recipient"], message["subject"], message["content"],
+               message.get("content_type", "plain"), now) for message in messages))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def unsent(self, batch_id: str, max_attempts: int = 3) -> List[OutboxMessage]:
+        """批次中待发送和可重试的邮件，sending 状态的邮件可能已经送达，不在其中"""
+        rows = self.conn.execute('''
+            SELECT id, recipient, subject, content, content_type, attempts FROM email_outbox
+            WHERE batch_id = ? AND (status = 'pending' OR (status = 'failed' AND attempts < ?))
+            ORDER BY id
+        ''', (batch_id, max_attempts)).fetchall()
+        return [OutboxMessage(*row) for row in rows]
+
+    def mark_sending(self, message_id: int):
+        self.conn.execute('''
+            UPDATE email_outbox SET status = 'sending' WHERE id = ?
+        ''', (message_id,))
+        self.conn.commit()
+
+    def mark_unknown(self, message_id: int, error: str):
+        """发送结果未知，保持 sending 状态并记录错误"""
+        self.conn.execute('''
+            UPDATE email_outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?
+        ''', (error[:1000], message_id))
+        self.conn.commit()
+
+    def mark_sent(self, message_id: int):
+        self.conn.execute('''
+            UPDATE email_outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, sent_at = ?
+            WHERE id = ?
+        ''', (datetime.now(), message_id))
+        self.conn.commit()
+
+    def mark_failed(self, message_id: int, error: str):
+        self.conn.execute('''
+            UPDATE email_outbox SET status = 'failed', attempts = attempts + 1, last_error = ?
+            WHERE id = ?
+        ''', (error[:1000], message_id))
+        self.conn.commit()
+
+    def batch_status(self, batch_id: str) -> Dict[str, int]:
+        """批次中各状态的邮件数"""
+        result = {STATUS_PENDING: 0, STATUS_SENDING: 0, STATUS_SENT: 0, STATUS_FAILED: 0}
+        for status, count in self.conn.execute('''
+            SELECT status, count(1) FROM email_outbox WHERE batch_id = ? GROUP BY status
+        ''', (batch_id,)):
+            result[status] = count
+        return result
+
+
+async def send_batch(outbox: Outbox, pool: SmtpPool, sender: str, batch_id: str,
+                     max_attempts: int = 3) -> AsyncGenerator[Dict[str, str], None]:
+    """并发发送批次中未成功的邮件，按完成顺序返回每个收件人的发送结果"""
+    # 已交给服务器的邮件 id
+    dispatched: Set[int] = set()
+
+    async def send_one(message: OutboxMessage) -> Dict[str, str]:
+        msg = build_message(sender, [message.recipient], message.subject, message.content, message.content_type)
+
+        def dispatch():
+            dispatched.add(message.id)
+            outbox.mark_sending(message.id)
+
+        try:
+            await pool.send(msg, on_dispatch=dispatch)
+        except SmtpDeliveryUnknown as e:
+            outbox.mark_unknown(message.id, str(e))
+            return {"recipient": message.recipient, "status": STATUS_SENDING, "error": str(e)}
+        except Exception as e:
+            outbox.mark_failed(message.id, str(e))
+            return {"recipient": message.recipient, "status": STATUS_FAILED, "error": str(e)}
+        outbox.mark_sent(message.id)
+        return {"recipient": message.recipient, "status": STATUS_SENT}
+
+    # 连接池限制实际的并发数，这里一次性提交整个批次
+    tasks = {asyncio.ensure_future(send_one(message)): message.id
+             for message in outbox.unsent(batch_id, max_attempts)}
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        # 客户端断开时取消尚未发出的邮件（保持 pending），已交给服务器的邮件等待结果写入发件箱
+        in_flight = []
+        for task, message_id in tasks.items():
+            if task.done():
+                continue
+            if message_id in dispatched:
+                in_flight.append(task)
+            else:
+                task.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
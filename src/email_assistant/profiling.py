@@ -0,0 +1,125 @@
+"""
+运行时剖析模块
+
+SamplingProfiler 在后台线程中定期采样所有线程的调用栈，输出 flamegraph.pl / speedscope
+可直接读取的折叠栈（collapsed stacks）格式；MemoryTracker 基于 tracemalloc 对比两次快照，
+定位长时间刷新邮件过程中的内存增长。两者只在管理接口显式调用时才运行。
+"""
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+# 单次采样时长上限（秒）
+MAX_PROFILE_SECONDS = 60
+
+
+class ProfilerBusyException(Exception):
+    """已有剖析任务在运行"""
+
+
+class SamplingProfiler:
+    """采样剖析器
+
+    interval 为采样间隔（秒），采样线程自身不计入结果。
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", code.co_filename)
+        return f"{module}:{code.co_name}"
+
+    def _collapse(self, frame) -> str:
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def sample(self, seconds: float) -> Dict[str, int]:
+        """阻塞采样 seconds 秒，返回 折叠栈 -> 样本数"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyException("已有剖析任务在运行")
+        try:
+            seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+            me = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stacks[f"{names.get(ident, ident)};{self._collapse(frame)}"] += 1
+                time.sleep(self.interval)
+            return dict(stacks)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def to_collapsed(stacks: Dict[str, int]) -> str:
+        """折叠栈文本，每行 `栈 样本数`"""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+class MemoryTracker:
+    """tracemalloc 快照对比
+
+    start() 开始跟踪并记录基线，diff() 返回与上一次快照相比增长最多的代码位置。
+    """
+
+    def __init__(self, frames: int = 10):
+        self.frames = frames
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_here = False
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_here = True
+        self.snapshot = self._take()
+
+    def stop(self):
+        if self._started_here and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_here = False
+        self.snapshot = None
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def diff(self, top: int = 20) -> List[dict]:
+        """与上一次快照对比，并将本次快照作为新的基线"""
+        if self.snapshot is None:
+            raise RuntimeError("未开始内存跟踪")
+        snapshot = self._take()
+        stats = snapshot.compare_to(self.snapshot, "lineno")
+        self.snapshot = snapshot
+        return [{
+            "location": str(stat.traceback[0]) if stat.traceback else "",
+            "sizeDiff": stat.size_diff,
+            "size": stat.size,
+            "countDiff": stat.count_diff,
+            "count": stat.count,
+        } for stat in stats[:top]]
+
+    @staticmethod
+    def usage() -> Dict[str, int]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"current": current, "peak": peak}
@@ -0,0 +1,154 @@
+"""
+邮件原文归档模块
+
+将下载的 RFC822 原文追加写入分段文件，并在 SQLite 中记录 (folder, uid) -> (分段, 偏移, 长度) 索引，
+读取时通过 mmap 直接切片。修改解析或清洗逻辑后可以从本地归档重新解析，无需重新通过 IMAP 下载。
+"""
+
+import mmap
+import os
+import sqlite3
+from collections import deque
+from typing import AsyncGenerator, Dict, Iterator, Optional, Tuple
+
+from .accounts import split_uid
+from .metrics import BYTES_TOTAL, span
+from .mime_parse import MessageParsePool
+from .type import Email
+
+# 单个分段文件的大小上限，超过后切换到新分段
+DEFAULT_SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+class RawMessageArchive:
+    """邮件原文归档
+
+    分段文件只追加不修改，同一封邮件重复归档时索引指向最新写入的位置。
+    """
+
+    def __init__(self, archive_dir: str, segment_size: int = DEFAULT_SEGMENT_SIZE):
+        self.archive_dir = archive_dir
+        self.segment_size = segment_size
+        os.makedirs(archive_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(archive_dir, "index.db"), check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS raw_messages (
+                folder TEXT,
+                uid INTEGER,
+                segment INTEGER,
+                offset INTEGER,
+                length INTEGER,
+                PRIMARY KEY (folder, uid)
+            )
+        ''')
+        self.conn.commit()
+
+        row = self.conn.execute("SELECT max(segment) FROM raw_messages").fetchone()
+        self.segment = row[0] if row and row[0] is not None else 0
+        self._writer = None
+        self._maps: Dict[int, Tuple[mmap.mmap, object]] = {}
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.archive_dir, f"segment-{segment:05d}.eml.bin")
+
+    def _open_writer(self):
+        if self._writer is None:
+            self._writer = open(self._segment_path(self.segment), "ab")
+        if self._writer.tell() >= self.segment_size:
+            self._writer.close()
+            self.segment += 1
+            self._writer = open(self._segment_path(self.segment), "ab")
+        return self._writer
+
+    def append(self, uid: int, folder: str, raw: bytes):
+        """追加一封邮件原文"""
+        writer = self._open_writer()
+        offset = writer.tell()
+        writer.write(raw)
+        BYTES_TOTAL.inc(len(raw), kind="archive")
+        self.conn.execute('''
+            INSERT OR REPLACE INTO raw_messages (folder, uid, segment, offset, length)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (folder, uid, self.segment, offset, len(raw)))
+
+    def commit(self):
+        """先落盘分段文件再提交索引，保证索引不会指向未写入的数据"""
+        with span("archive_commit"):
+            if self._writer is not None:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+            self.conn.commit()
+
+    def _read(self, segment: int, offset: int, length: int) -> bytes:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped[0]) < offset + length:
+            if mapped is not None:
+                mapped[0].close()
+                mapped[1].close()  # pyright: ignore[reportAttributeAccessIssue]
+            if segment == self.segment and self._writer is not None:
+                self._writer.flush()
+            f = open(self._segment_path(segment), "rb")
+            mapped = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), f)
+            self._maps[segment] = mapped
+        return mapped[0][offset:offset + length]
+
+    def get(self, uid: int, folder: str = "INBOX") -> Optional[bytes]:
+        """读取邮件原文，未归档时返回 None"""
+        row = self.conn.execute('''
+            SELECT segment, offset, length FROM raw_messages WHERE folder = ? AND uid = ?
+        ''', (folder, uid)).fetchone()
+        if row is None:
+            return None
+        return self._read(*row)
+
+    def iter_messages(self, folder: Optional[str] = None) -> Iterator[Tuple[int, str, bytes]]:
+        """按写入顺序遍历归档邮件，顺序读取分段文件"""
+        if folder:
+            rows = self.conn.execute('''
+                SELECT uid, folder, segment, offset, length FROM raw_messages
+                WHERE folder = ? ORDER BY segment, offset
+            ''', (folder,)).fetchall()
+        else:
+            rows = self.conn.execute('''
+                SELECT uid, folder, segment, offset, length FROM raw_messages
+                ORDER BY segment, offset
+            ''').fetchall()
+        for uid, _folder, segment, offset, length in rows:
+            yield uid, _folder, self._read(segment, offset, length)
+
+    def count(self) -> int:
+        row = self.conn.execute("SELECT count(1) FROM raw_messages").fetchone()
+        return row[0] if row else 0
+
+    def close(self):
+        self.commit()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for mapped, f in self._maps.values():
+            mapped.close()
+            f.close()  # pyright: ignore[reportAttributeAccessIssue]
+        self._maps.clear()
+        self.conn.close()
+
+
+async def iter_archived_emails(archive: RawMessageArchive,
+                               folder: Optional[str] = None,
+                               parse_pool: Optional[MessageParsePool] = None) -> AsyncGenerator[Email, None]:
+    """从归档重新解析邮件，用于修改解析逻辑后的重建索引"""
+    # parse_many 按提交顺序返回结果，文件夹按同样的顺序取出
+    folders = deque()
+
+    def raws():
+        for uid, _folder, raw in archive.iter_messages(folder):
+            folders.append(_folder)
+            yield uid, raw
+
+    pool = parse_pool or MessageParsePool(workers=1)
+    async for uid, parsed in pool.parse_many(raws()):
+        _folder = folders.popleft()
+        if parsed is None or parsed.date is None or len(parsed.content.strip()) == 0:
+            continue
+        # 归档中的 uid 是全局编号，账户 id 取自高位
+        yield parsed.to_email(uid, _folder, split_uid(uid)[0])
@@ -0,0 +1,98 @@
+"""
+本地任务识别模块
+
+用关键词正则和 jieba 分词从文本中识别任务，不调用LLM。批量接口一次处理多段文本：
+四类任务正则合并为一个表达式，每段文本只扫描一次；只有包含任务指示词的文本才分词，
+分词可以交给进程池并行执行。结果按列返回，便于对整个归档批量处理。
+"""
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Sequence
+
+TASK_PATTERN = re.compile('|'.join([
+    r'(?:(?:需要|请|要|应该|必须|务必|得).*?)(?:完成|做|处理|执行|实施|开展|进行|推进|落实)',
+    r'(?:任务|工作|事项).*?(?:：|:)',
+    r'(?:待办|TODO|To-do).*?(?:：|:)',
+    r'- \[ \] .*',  # Markdown未完成任务项
+]), re.IGNORECASE)
+
+TASK_INDICATORS = ('任务', '工作', '待办', '计划', '安排')
+# 分词前的预筛选：不含任何指示词的文本分词后也不会命中
+INDICATOR_PATTERN = re.compile('|'.join(TASK_INDICATORS))
+# 与 jieba 默认模式相同的分块规则：jieba 对每个块独立分词，块以外的字符逐个成词
+HAN_BLOCK = re.compile(r'[\u4E00-\u9FD5a-zA-Z0-9+#&\._%\-]+')
+
+
+class TaskColumns(NamedTuple):
+    """批量识别结果，第 i 个任务属于 texts[doc_index[i]]"""
+    doc_index: List[int]
+    task: List[str]
+
+    def for_doc(self, index: int) -> List[str]:
+        return [task for doc, task in zip(self.doc_index, self.task) if doc == index]
+
+
+def _indicator_tasks(text: str) -> List[str]:
+    """分词后取指示词及其后一个词
+
+    只对包含指示词的块分词，结果与对整段文本分词相同。
+    """
+    # jieba 加载较慢，第一次使用时再导入
+    import jieba
+
+    tasks = []
+    for block in HAN_BLOCK.finditer(text):
+        if not INDICATOR_PATTERN.search(block.group(0)):
+            continue
+        words = jieba.lcut(block.group(0))
+        for i, word in enumerate(words):
+            if word not in TASK_INDICATORS:
+                continue
+            if i + 1 < len(words):
+                tasks.append(word + words[i + 1])
+            else:
+                # 块末尾的指示词，后一个词是块后的字符（\r\n 为一个词）
+                end = block.end()
+                following = "\r\n" if text.startswith("\r\n", end) else text[end:end + 1]
+                if following:
+                    tasks.append(word + following)
+    return tasks
+
+
+def _clean(tasks: List[str]) -> List[str]:
+    """去重并清理，保持首次出现的顺序"""
+    return [task.strip(' -[]') for task in dict.fromkeys(tasks) if len(task.strip()) > 2]
+
+
+def extract_tasks_batch(texts: Sequence[str], workers: int = 1, chunksize: int = 64) -> TaskColumns:
+    """批量识别任务
+    Args:
+        texts: 文本列表
+        workers: 分词进程数，大于 1 且需要分词的文本较多时使用进程池
+        chunksize: 每个进程单次处理的文本数
+    Return:
+        TaskColumns: 按文本顺序排列的任务列
+    """
+    matched = [[m.group(0) for m in TASK_PATTERN.finditer(text)] for text in texts]
+
+    segment = [i for i, text in enumerate(texts) if INDICATOR_PATTERN.search(text)]
+    if workers > 1 and len(segment) > chunksize:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            indicated = list(executor.map(_indicator_tasks, [texts[i] for i in segment], chunksize=chunksize))
+    else:
+        indicated = [_indicator_tasks(texts[i]) for i in segment]
+    for i, tasks in zip(segment, indicated):
+        matched[i].extend(tasks)
+
+    columns = TaskColumns([], [])
+    for i, tasks in enumerate(matched):
+        for task in _clean(tasks):
+            columns.doc_index.append(i)
+            columns.task.append(task)
+    return columns
+
+
+def extract_tasks(text: str) -> List[str]:
+    """从文本中提取任务"""
+    return extract_tasks_batch([text]).task
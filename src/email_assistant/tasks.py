@@ -0,0 +1,121 @@
+"""
+待办模块
+
+抽取到关注日期时间的邮件属性写入 email_tasks 表，日期文本解析为截止时间戳后建立索引，
+“最近 N 天到期”按 (status, due_at) 范围查询，不需要调用 LLM。
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .date_parse import parse_due_date
+from .email_stats import is_todo
+from .type import EmailAttribute
+
+STATUS_OPEN = "open"
+STATUS_DONE = "done"
+
+
+class TaskStore:
+    """基于 email_tasks 表的待办，每封邮件最多一条，不负责提交事务"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @staticmethod
+    def create_table(conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS email_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                uid INTEGER UNIQUE,
+                content TEXT,
+                due_text TEXT,
+                due_at INTEGER,
+                all_day INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'open',
+                created_at DATETIME,
+                updated_at DATETIME
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_tasks_due ON email_tasks (status, due_at)
+        ''')
+
+    def save_from_attribute(self, attr: EmailAttribute, reference: datetime) -> bool:
+        """按邮件属性写入待办，没有关注日期时间的属性删除已有待办
+        Args:
+            attr: 邮件属性
+            reference: 解析相对日期的基准时间，通常为邮件日期
+        Return:
+            bool: 是否写入了待办
+        """
+        if not is_todo(attr.datetime):
+            self.delete(attr.uid)
+            return False
+        parsed = parse_due_date(attr.datetime, reference)
+        now = datetime.now()
+        # 重新抽取时更新内容和截止时间，保留完成状态
+        self.conn.execute('''
+            INSERT INTO email_tasks (uid, content, due_text, due_at, all_day, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, 'open', ?, ?)
+            ON CONFLICT (uid) DO UPDATE SET
+                content = excluded.content,
+                due_text = excluded.due_text,
+                due_at = excluded.due_at,
+                all_day = excluded.all_day,
+                updated_at = excluded.updated_at
+        ''', (attr.uid, attr.content, attr.datetime,
+              int(parsed.due.timestamp()) if parsed else None,
+              int(parsed.all_day) if parsed else 0, now, now))
+        return True
+
+    def delete(self, uid: int):
+        self.conn.execute('''
+            DELETE FROM email_tasks WHERE uid = ?
+        ''', (uid,))
+
+    def set_status(self, task_id: int, status: str) -> bool:
+        cursor = self.conn.execute('''
+            UPDATE email_tasks SET status = ?, updated_at = ? WHERE id = ?
+        ''', (status, datetime.now(), task_id))
+        return cursor.rowcount > 0
+
+    def due_between(self, start: Optional[datetime], end: datetime, status: str = STATUS_OPEN,
+                    limit: int = 100) -> List[Dict[str, Any]]:
+        """截止时间在 [start, end) 内的待办，start 为空时包含已过期的待办"""
+        rows = self.conn.execute('''
+            SELECT email_tasks.id, email_tasks.uid, email_tasks.content, email_tasks.due_text,
+                   email_tasks.due_at, email_tasks.all_day, email_tasks.status,
+                   emails.subject, emails.sender, emails.account_id
+            FROM email_tasks
+            LEFT JOIN emails ON emails.uid = email_tasks.uid
+            WHERE email_tasks.status = ? AND email_tasks.due_at >= ? AND email_tasks.due_at < ?
+            ORDER BY email_tasks.due_at
+            LIMIT ?
+        ''', (status, int(start.timestamp()) if start else 0, int(end.timestamp()), limit)).fetchall()
+        return [{
+            "id": task_id,
+            "uid": uid,
+            "content": content,
+            "due_text": due_text,
+            "due_at": datetime.fromtimestamp(due_at).isoformat(),
+            "all_day": bool(all_day),
+            "status": task_status,
+            "subject": subject,
+            "sender": sender,
+            "account_id": account_id,
+        } for task_id, uid, content, due_text, due_at, all_day, task_status, subject, sender, account_id in rows]
+
+    def rebuild(self):
+        """按已有的邮件属性生成待办"""
+        rows = self.conn.execute('''
+            SELECT email_attributes.uid, email_attributes.recipient, email_attributes.datetime,
+                   email_attributes.content, emails.date_utc
+            FROM email_attributes
+            INNER JOIN emails ON emails.uid = email_attributes.uid
+        ''').fetchall()
+        for uid, recipient, attention_datetime, content, date_utc in rows:
+            attr = EmailAttribute(uid=uid, recipient=recipient or "", datetime=attention_datetime or "",
+                                  content=content or "")
+            self.save_from_attribute(attr, datetime.fromtimestamp(date_utc or 0))
@@ -1,20 +1,95 @@
 """邮件模板管理模块
 """
 
-from typing import List, Dict, Optional
-from .main import Template, DB_FILE
+import re
+import uuid
+from typing import Any, Dict, IO, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+from .config import DB_FILE
+from .type import Template
 import sqlite3
 
+# 占位符格式为 {key}，key 中不能包含花括号
+PLACEHOLDER_PATTERN = re.compile(r"\{([^{}]+)\}")
+
+
+class CompiledTemplate:
+    """预编译的模板文本
+
+    编译时将文本拆分为交替的常量片段和占位符名称，渲染时只需一次拼接。
+    没有提供值的占位符原样保留。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        # parts[0::2] 为常量片段，parts[1::2] 为占位符名称
+        self.parts = PLACEHOLDER_PATTERN.split(text)
+        self.keys = frozenset(self.parts[1::2])
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        if not self.keys:
+            return self.text
+        parts = self.parts.copy()
+        for i in range(1, len(parts), 2):
+            key = parts[i]
+            parts[i] = str(values[key]) if key in values else f"{{{key}}}"
+        return "".join(parts)
+
+
+def iter_csv_rows(source: Union[str, IO], chunksize: int = 1000, **kwargs) -> Iterator[Dict[str, str]]:
+    """分块读取 CSV，逐行返回字典，所有值按字符串读取，空单元格为空字符串"""
+    import pandas as pd
+
+    with pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize, **kwargs) as reader:
+        for chunk in reader:
+            yield from chunk.to_dict(orient="records")  # pyright: ignore[reportReturnType]
+
+
 class TemplateManager:
-    """模板管理类"""
+    """模板管理类
+
+    模板在启动时从数据库加载一次，之后以内存中的 名称→模板 字典为准：
+    保存和删除先写数据库，成功后同步更新字典（写穿），不再重新读取整张表。
+    每次修改递增 version，用于生成 ETag 和使缓存失效。
+    """
     
-    def __init__(self):
-        self.templates = self.load_templates()
+    def __init__(self, db_file: str = DB_FILE, templates: Optional[List[Template]] = None):
+        self.db_file = db_file
+        self.version = 0
+        # 启动标识，避免重启后版本号重复导致客户端误用旧缓存
+        self._epoch = uuid.uuid4().hex[:8]
+        self._by_name: Dict[str, Template] = {}
+        self._compiled: Dict[str, Tuple[CompiledTemplate, CompiledTemplate]] = {}
+        self._listing: Optional[List[Dict[str, Any]]] = None
+        self.templates = self.load_templates() if templates is None else templates
     
+    @property
+    def templates(self) -> List[Template]:
+        return sorted(self._by_name.values(), key=lambda template: template.id)
+
+    @templates.setter
+    def templates(self, templates: List[Template]):
+        """替换全部模板"""
+        self._by_name = {template.name: template for template in reversed(templates)}
+        self._invalidate()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self._epoch}-{self.version}"'
+
+    def _invalidate(self, *names: str):
+        """模板变化后递增版本号，清除列表缓存和相关模板的编译结果，不指定名称时全部清除"""
+        self.version += 1
+        self._listing = None
+        if names:
+            for name in names:
+                self._compiled.pop(name, None)
+        else:
+            self._compiled = {}
+
     def load_templates(self) -> List[Template]:
         """从数据库加载模板"""
         try:
-            conn = sqlite3.connect(DB_FILE)
+            conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -31,21 +106,27 @@ class TemplateManager:
                     content=row[3]
                 ))
             
-            conn.close()
-            
-            # 如果没有模板，创建默认模板
+            # 如果没有模板，在同一个连接中写入默认模板
             if not templates:
-                self.create_default_templates()
-                return self.load_templates()
+                for template in self.default_templates():
+                    cursor.execute('''
+                        INSERT INTO templates (name, subject, content)
+                        VALUES (?, ?, ?)
+                    ''', (template.name, template.subject, template.content))
+                    template.id = cursor.lastrowid  # pyright: ignore[reportAttributeAccessIssue]
+                    templates.append(template)
+                conn.commit()
             
+            conn.close()
             return templates
         except Exception as e:
             print(f"加载模板失败: {str(e)}")
             return []
     
-    def create_default_templates(self):
-        """创建默认模板"""
-        default_templates = [
+    @staticmethod
+    def default_templates() -> List[Template]:
+        """默认模板"""
+        return [
             Template(
                 name="工作汇报",
                 subject="【工作汇报】{date}工作情况",
@@ -57,34 +138,45 @@ class TemplateManager:
                 content="各位同事：\n\n您好！\n\n我们计划于{time}召开{topic}讨论会，诚邀您参加。\n\n会议议题：\n1. {topic1}\n2. {topic2}\n\n会议地点：{location}\n\n请提前安排好工作，准时参加。\n\n谢谢！"
             )
         ]
-        
-        for template in default_templates:
-            self.save_template(template)
     
     def get_template_by_name(self, name: str) -> Optional[Template]:
         """根据名称获取模板"""
-        for template in self.templates:
-            if template.name == name:
-                return template
-        return None
+        return self._by_name.get(name)
+
+    def get_compiled_template(self, name: str) -> Tuple[CompiledTemplate, CompiledTemplate]:
+        """获取编译后的主题和正文，按名称缓存"""
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            template = self.get_template_by_name(name)
+            if not template:
+                raise ValueError(f"模板 '{name}' 不存在")
+            compiled = (CompiledTemplate(template.subject), CompiledTemplate(template.content))
+            self._compiled[name] = compiled
+        return compiled
     
     def get_all_templates(self) -> List[Template]:
         """获取所有模板"""
         return self.templates
+
+    def list_templates(self) -> List[Dict[str, Any]]:
+        """模板列表接口的返回数据，在下次修改前复用"""
+        if self._listing is None:
+            self._listing = [template.model_dump() for template in self.templates]
+        return self._listing
     
     def save_template(self, template: Template) -> bool:
-        """保存模板"""
+        """保存模板，id 为空时新建"""
         try:
-            conn = sqlite3.connect(DB_FILE)
+            conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
             
-            if template.id is None:
+            if not template.id:
                 # 新建模板
                 cursor.execute('''
                     INSERT INTO templates (name, subject, content)
                     VALUES (?, ?, ?)
                 ''', (template.name, template.subject, template.content))
-                template.id = cursor.lastrowid
+                template.id = cursor.lastrowid  # pyright: ignore[reportAttributeAccessIssue]
             else:
                 # 更新模板
                 cursor.execute('''
@@ -95,19 +187,22 @@ class TemplateManager:
             
             conn.commit()
             conn.close()
-            
-            # 更新内存中的模板列表
-            self.templates = self.load_templates()
-            
-            return True
         except Exception as e:
             print(f"保存模板失败: {str(e)}")
             return False
+        
+        # 写入成功后更新内存中的模板，改名时移除旧名称
+        old_names = [name for name, cached in self._by_name.items() if cached.id == template.id]
+        for name in old_names:
+            del self._by_name[name]
+        self._by_name[template.name] = template.model_copy()
+        self._invalidate(template.name, *old_names)
+        return True
     
     def delete_template(self, template_id: int) -> bool:
         """删除模板"""
         try:
-            conn = sqlite3.connect(DB_FILE)
+            conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -117,31 +212,39 @@ class TemplateManager:
             
             conn.commit()
             conn.close()
-            
-            # 更新内存中的模板列表
-            self.templates = self.load_templates()
-            
-            return True
         except Exception as e:
             print(f"删除模板失败: {str(e)}")
             return False
+        
+        names = [name for name, template in self._by_name.items() if template.id == template_id]
+        for name in names:
+            del self._by_name[name]
+        self._invalidate(*names)
+        return True
     
     def render_template(self, template_name: str, **kwargs) -> Dict[str, str]:
         """渲染模板"""
-        template = self.get_template_by_name(template_name)
-        if not template:
-            raise ValueError(f"模板 '{template_name}' 不存在")
-        
-        # 替换占位符
-        subject = template.subject
-        content = template.content
-        
-        for key, value in kwargs.items():
-            placeholder = f"{{{key}}}"
-            subject = subject.replace(placeholder, str(value))
-            content = content.replace(placeholder, str(value))
-        
+        subject, content = self.get_compiled_template(template_name)
         return {
-            "subject": subject,
-            "content": content
+            "subject": subject.render(kwargs),
+            "content": content.render(kwargs)
         }
+
+    def render_many(self, template_name: str, rows: Iterable[Mapping[str, Any]],
+                    recipient_field: str = "email") -> Iterator[Dict[str, str]]:
+        """批量渲染模板，逐行返回结果，适合邮件合并
+
+        Args:
+            template_name: 模板名称
+            rows: 占位符取值，例如 iter_csv_rows 读取的 CSV 行
+            recipient_field: 收件人所在的列，存在时结果中包含 recipient
+        """
+        subject, content = self.get_compiled_template(template_name)
+        for row in rows:
+            rendered = {
+                "subject": subject.render(row),
+                "content": content.render(row)
+            }
+            if recipient_field in row:
+                rendered["recipient"] = str(row[recipient_field])
+            yield rendered
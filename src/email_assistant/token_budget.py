@@ -0,0 +1,80 @@
+"""
+提示词 token 计数模块
+
+按模型的分词器计算 token 数，用于按上下文窗口打包摘要请求。tiktoken 为可选依赖：
+模型不在 tiktoken 中时使用 cl100k_base（通义千问的词表在其基础上扩展，中文计数偏保守）；
+未安装 tiktoken 或无法加载编码时按字符估算，中日韩字符每字计 1 个 token，其余每 4 个字符计 1 个。
+"""
+
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+HEURISTIC = "heuristic"
+DEFAULT_ENCODING = "cl100k_base"
+
+# 中日韩文字和全角标点
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+class TokenCounter:
+    """token 计数器，encoding 为空时按字符估算"""
+
+    def __init__(self, encoding: Optional[Any] = None):
+        self.encoding = encoding
+
+    @property
+    def name(self) -> str:
+        return self.encoding.name if self.encoding is not None else HEURISTIC
+
+    def count(self, text: Optional[str]) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        cjk = len(_CJK.findall(text))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断到不超过 max_tokens 个 token"""
+        if max_tokens <= 0 or self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+        # 估算模式：中日韩字符计 1，其它字符计 1/4
+        used = 0.0
+        for i, char in enumerate(text):
+            used += 1 if _CJK.match(char) else 0.25
+            if used > max_tokens:
+                return text[:i]
+        return text
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model_name: str = "", encoding_name: str = "") -> TokenCounter:
+    """按模型名称或编码名称创建计数器，同一参数只加载一次
+    Args:
+        model_name: 模型名称，用于查找 tiktoken 编码
+        encoding_name: tiktoken 编码名称，"heuristic" 表示按字符估算
+    """
+    if encoding_name == HEURISTIC:
+        return TokenCounter()
+    try:
+        import tiktoken
+    except ImportError:
+        return TokenCounter()
+    try:
+        if encoding_name:
+            return TokenCounter(tiktoken.get_encoding(encoding_name))
+        try:
+            return TokenCounter(tiktoken.encoding_for_model(model_name))
+        except KeyError:
+            return TokenCounter(tiktoken.get_encoding(DEFAULT_ENCODING))
+    except Exception as e:
+        # 编码文件需要联网下载，离线时按字符估算
+        logger.warning("加载分词器失败: %s，按字符估算 token 数", e)
+        return TokenCounter()
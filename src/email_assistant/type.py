@@ -1,7 +1,7 @@
 # 定义数据模型
 from datetime import datetime
 
-from typing import List, Optional, Sequence
+from typing import Dict, List, Optional, Sequence
 from pydantic import BaseModel
 from pydantic_xml import BaseXmlModel, element, wrapped
 
@@ -16,6 +16,13 @@ class Email(BaseModel):
     date: datetime
     content: str
     folder: str
+    account_id: int = 0
+    message_id: str = ""
+    in_reply_to: str = ""
+    references: List[str] = []
+    thread_id: Optional[int] = None
+    # 回复邮件中新增内容的长度，content[:delta_length] 之后为引用的历史内容
+    delta_length: Optional[int] = None
 
 class EmailVector(BaseModel):
     id: int = 0
@@ -35,14 +42,35 @@ class Template(BaseModel):
     subject: str
     content: str
 
+class MailAccount(BaseModel):
+    id: int = 0
+    name: str = ""
+    email_address: str
+    email_password: str
+    imap_server: str
+    imap_port: int = 993
+
+class BulkRecipient(BaseModel):
+    email: str
+    variables: Dict[str, str] = {}
+
+class BulkSendRequest(BaseModel):
+    subject: str
+    content: str
+    content_type: str = "plain"
+    recipients: List[BulkRecipient]
+
 class SearchQuery(BaseModel):
     query: str
     folder: str = ""
+    account_id: Optional[int] = None
 
 class MailInfo(BaseXmlModel):
     recipient: str = element(tag="Recipient")
     attention_datetime: str = element(tag="AttentionDatetime")
     content: str = element(tag="Content")
+    # 所属会话，同一会话的多封邮件只包含各自的新增内容
+    thread: Optional[str] = element(tag="Thread", default=None)
 
 class MailSummaryPrompt(BaseXmlModel):
     user: str = element(tag="User")
@@ -0,0 +1,215 @@
+"""
+失败任务重试队列模块
+
+向量化或属性抽取失败的邮件写入 email_jobs 表（与邮件数据在同一事务中提交），
+后台 RepairWorker 按指数退避重试，超过最大次数的任务保留在表中供排查。
+"""
+
+import asyncio
+import logging
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from .email_rules import EmailPreClassifier
+from .type import Email
+
+logger = logging.getLogger(__name__)
+
+JOB_EMBEDDING = "embedding"
+JOB_EXTRACTION = "extraction"
+
+DEFAULT_MAX_ATTEMPTS = 8
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=6)
+
+
+class Job(NamedTuple):
+    uid: int
+    kind: str
+    attempts: int
+    last_error: str
+
+
+def next_retry_delay(attempts: int) -> timedelta:
+    """第 attempts 次失败后的等待时间，带 ±20% 抖动"""
+    # 限制指数，避免 timedelta 溢出
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** min(max(attempts - 1, 0), 20)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class WorkQueue:
+    """基于 email_jobs 表的持久化任务队列"""
+
+    def __init__(self, conn: sqlite3.Connection, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.conn = conn
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def create_table(conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS email_jobs (
+                uid INTEGER,
+                kind TEXT,
+                attempts INTEGER DEFAULT 0,
+                next_retry_at DATETIME,
+                last_error TEXT,
+                created_at DATETIME,
+                updated_at DATETIME,
+                PRIMARY KEY (uid, kind)
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_jobs_next_retry ON email_jobs (kind, next_retry_at)
+        ''')
+
+    def fail(self, uid: int, kind: str, error: str):
+        """记录一次失败，已存在的任务增加重试次数"""
+        now = datetime.now()
+        row = self.conn.execute('''
+            SELECT attempts FROM email_jobs WHERE uid = ? AND kind = ?
+        ''', (uid, kind)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        self.conn.execute('''
+            INSERT INTO email_jobs (uid, kind, attempts, next_retry_at, last_error, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (uid, kind) DO UPDATE SET
+                attempts = excluded.attempts,
+                next_retry_at = excluded.next_retry_at,
+                last_error = excluded.last_error,
+                updated_at = excluded.updated_at
+        ''', (uid, kind, attempts, now + next_retry_delay(attempts), error[:1000], now, now))
+
+    def complete(self, uid: int, kind: str):
+        self.conn.execute('''
+            DELETE FROM email_jobs WHERE uid = ? AND kind = ?
+        ''', (uid, kind))
+
+    def due(self, kind: str, limit: int = 50) -> List[Job]:
+        """到期且未超过最大重试次数的任务"""
+        rows = self.conn.execute('''
+            SELECT uid, kind, attempts, last_error FROM email_jobs
+            WHERE kind = ? AND next_retry_at <= ? AND attempts < ?
+            ORDER BY next_retry_at
+            LIMIT ?
+        ''', (kind, datetime.now(), self.max_attempts, limit)).fetchall()
+        return [Job(*row) for row in rows]
+
+    def depth(self) -> Dict[str, Dict[str, int]]:
+        """各类任务的数量：pending 等待重试，due 已到期，failed 超过最大重试次数"""
+        result = {kind: {"pending": 0, "due": 0, "failed": 0} for kind in (JOB_EMBEDDING, JOB_EXTRACTION)}
+        rows = self.conn.execute('''
+            SELECT kind,
+                   sum(attempts < ?),
+                   sum(attempts < ? AND next_retry_at <= ?),
+                   sum(attempts >= ?)
+            FROM email_jobs
+            GROUP BY kind
+        ''', (self.max_attempts, self.max_attempts, datetime.now(), self.max_attempts)).fetchall()
+        for kind, pending, due, failed in rows:
+            result[kind] = {"pending": pending or 0, "due": due or 0, "failed": failed or 0}
+        return result
+
+
+class RepairWorker:
+    """后台重试失败任务
+
+    Args:
+        persistence_factory: 创建独立 EmailPresistence 的函数，避免与刷新流程共用连接
+        model_id: 属性抽取使用的模型
+        interval: 两次检查的间隔（秒）
+        storage_config: storage 配置节，不为空时检查向量表并在无效槽位过多时自动压缩
+    """
+
+    def __init__(self, persistence_factory: Callable[[], Any], model_id: str,
+                 pre_classifier: Optional[EmailPreClassifier] = None,
+                 interval: float = 60, batch_size: int = 50,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 storage_config: Optional[Dict[str, Any]] = None):
+        self.persistence_factory = persistence_factory
+        self.model_id = model_id
+        self.pre_classifier = pre_classifier
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.storage_config = storage_config
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception("重试失败任务失败: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Dict[str, int]:
+        """处理一轮到期任务，返回各类任务的成功数"""
+        persistence = self.persistence_factory()
+        persistence.connect()
+        done = {JOB_EMBEDDING: 0, JOB_EXTRACTION: 0}
+        compact = False
+        try:
+            # 与刷新流程在同一个事件循环上写入，每次 await 之前提交，等待期间不持有写事务
+            queue = WorkQueue(persistence.conn, self.max_attempts)
+            for job in queue.due(JOB_EMBEDDING, self.batch_size):
+                email = persistence.get_email_by_uid(job.uid)
+                if email is None:
+                    queue.complete(job.uid, JOB_EMBEDDING)
+                    persistence.commit()
+                    continue
+                # 向量按分段增量写入，已成功的分段不会重复向量化
+                if await persistence.embed_email(email, queue):
+                    done[JOB_EMBEDDING] += 1
+                persistence.commit()
+
+            emails: List[Email] = []
+            for job in queue.due(JOB_EXTRACTION, self.batch_size):
+                email = persistence.get_email_by_uid(job.uid)
+                if email is None:
+                    queue.complete(job.uid, JOB_EXTRACTION)
+                else:
+                    emails.append(email)
+            persistence.commit()
+            if emails:
+                from .email_extract import extract_email_info
+
+                try:
+                    # 抽取是同步的LLM调用，放到线程中执行
+                    attributes = await asyncio.to_thread(
+                        lambda: list(extract_email_info(emails, self.model_id, pre_classifier=self.pre_classifier)))
+                except Exception as e:
+                    for email in emails:
+                        queue.fail(int(email.uid), JOB_EXTRACTION, str(e))
+                else:
+                    extracted = set()
+                    for attr in attributes:
+                        if persistence.save_email_attributes_to_db(attr):
+                            extracted.add(attr.uid)
+                            done[JOB_EXTRACTION] += 1
+                    for email in emails:
+                        if int(email.uid) not in extracted:
+                            queue.fail(int(email.uid), JOB_EXTRACTION, "未抽取到邮件属性")
+                persistence.commit()
+            compact = self.storage_config is not None and persistence.should_compact(self.storage_config)
+        finally:
+            persistence.close()
+        if compact:
+            # 压缩包含 VACUUM，在工作线程中使用独立连接执行，不阻塞事件循环
+            result = await asyncio.to_thread(persistence.compact_vectors_isolated)
+            logger.info("向量表压缩完成", extra=result)
+        return done
@@ -0,0 +1,142 @@
+import asyncio
+import unittest
+from email.mime.text import MIMEText
+from typing import List
+from unittest import mock
+
+from email_assistant import mail_sync
+from email_assistant.accounts import load_accounts, make_uid, split_uid, uid_range
+from email_assistant.email_processor import EmailClient
+from email_assistant.mail_sync import EVENT_CONNECTED, EVENT_EMAIL, EVENT_ERROR, fetch_accounts
+
+
+def make_raw(subject: str) -> bytes:
+    msg = MIMEText(f"{subject} 正文", 'plain', 'utf-8')
+    msg['Subject'] = subject
+    msg['From'] = 'li.si@example.com'
+    msg['To'] = 'chenxin.ma@example.com'
+    msg['Date'] = 'Mon, 18 Aug 2025 10:00:00 +0800'
+    return msg.as_bytes()
+
+
+class FakeIMAP:
+    def __init__(self, messages: List[bytes]):
+        self.messages = messages
+
+    def select(self, folder="INBOX"):
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def search(self, charset, *criteria):
+        return 'OK', [b" ".join(str(i + 1).encode() for i in range(len(self.messages)))]
+
+    def fetch(self, message_id, parts):
+        raw = self.messages[int(message_id) - 1]
+        return 'OK', [(f"{int(message_id)} (RFC822 {{{len(raw)}}}".encode(), raw), b')']
+
+    def close(self):
+        return 'OK', []
+
+    def logout(self):
+        return 'BYE', []
+
+
+# 按登录用户名返回各账户的邮件，不存在的用户名连接失败
+MAILBOXES = {
+    "a@example.com": [make_raw(f"a{i}") for i in range(4)],
+    "b@example.com": [make_raw(f"b{i}") for i in range(4)],
+}
+
+
+class FakeEmailClient(EmailClient):
+    def connect(self):
+        if self.username not in MAILBOXES:
+            return False
+        self.client = FakeIMAP(MAILBOXES[self.username])  # pyright: ignore[reportAttributeAccessIssue]
+        return True
+
+
+MAIL_CONFIG = {
+    "emailAddress": "a@example.com",
+    "emailPassword": "secret",
+    "imapServer": "imap.example.com",
+    "imapPort": 993,
+    "accounts": [
+        {"name": "个人邮箱", "emailAddress": "b@example.com", "emailPassword": "secret2"},
+        {"id": 7, "emailAddress": "missing@example.com", "imapServer": "imap.other.com"},
+    ],
+}
+
+
+class TestUid(unittest.TestCase):
+    def test_roundtrip(self):
+        uid = make_uid(3, 12345)
+        self.assertEqual(split_uid(uid), (3, 12345))
+        self.assertEqual(make_uid(0, 42), 42)
+
+    def test_range(self):
+        start, end = uid_range(2)
+        self.assertTrue(start <= make_uid(2, 1) < end)
+        self.assertEqual(make_uid(3, 0), end)
+
+
+class TestLoadAccounts(unittest.TestCase):
+    def test_accounts(self):
+        accounts = load_accounts(MAIL_CONFIG)
+        self.assertEqual([account.id for account in accounts], [0, 1, 7])
+        self.assertEqual(accounts[0].name, "a@example.com")
+        self.assertEqual(accounts[1].name, "个人邮箱")
+        # 未填写的服务器配置沿用 mail 配置节
+        self.assertEqual(accounts[1].imap_server, "imap.example.com")
+        self.assertEqual(accounts[2].imap_server, "imap.other.com")
+
+    def test_duplicate_id(self):
+        config = {**MAIL_CONFIG, "accounts": [{"id": 1, "emailAddress": "b@example.com"},
+                                               {"id": 1, "emailAddress": "c@example.com"}]}
+        with self.assertRaises(ValueError):
+            load_accounts(config)
+
+    def test_invalid_id(self):
+        with self.assertRaises(ValueError):
+            load_accounts({**MAIL_CONFIG, "accounts": [{"id": 0, "emailAddress": "b@example.com"}]})
+
+
+class TestFetchAccounts(unittest.TestCase):
+    def fetch(self, last_uids, delay: float = 0):
+        async def run():
+            events = []
+            async for event in fetch_accounts(load_accounts(MAIL_CONFIG), last_uids, days=3):
+                events.append(event)
+                # 模拟入库耗时，使队列被填满
+                await asyncio.sleep(delay)
+            return events
+
+        with mock.patch.object(mail_sync, "EmailClient", FakeEmailClient):
+            return asyncio.run(run())
+
+    def test_all_accounts(self):
+        events = self.fetch({})
+        connected = {event.account.id for event in events if event.kind == EVENT_CONNECTED}
+        self.assertEqual(connected, {0, 1})
+        errors = [event for event in events if event.kind == EVENT_ERROR]
+        self.assertEqual([event.account.id for event in errors], [7])
+
+        emails = [event.email for event in events if event.kind == EVENT_EMAIL]
+        self.assertEqual(len(emails), 8)
+        for email in emails:
+            self.assertEqual(split_uid(email.uid)[0], email.account_id)
+            self.assertEqual(email.subject[0], "a" if email.account_id == 0 else "b")
+
+    def test_interleaved(self):
+        # 入库慢于下载时，共享的有界队列使两个账户的邮件轮流到达
+        events = self.fetch({}, delay=0.02)
+        order = [event.account.id for event in events if event.kind == EVENT_EMAIL]
+        self.assertNotEqual(order, sorted(order))
+
+    def test_last_uid(self):
+        events = self.fetch({0: 3, 1: 1})
+        uids = sorted(event.email.uid for event in events if event.kind == EVENT_EMAIL)
+        self.assertEqual(uids, [make_uid(0, 4), make_uid(1, 2), make_uid(1, 3), make_uid(1, 4)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import asyncio
+import unittest
+
+from email_assistant.client_manager import (AdaptiveLimiter, CircuitBreaker, CircuitOpenException,
+                                            ClientManager, TokenBucket)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+FAST = {"backoffBase": 0.001, "backoffMax": 0.01, "rate": 1000, "burst": 1000}
+
+
+class TestClientManager(unittest.TestCase):
+    def test_retry_on_429(self):
+        manager = ClientManager({**FAST, "initialConcurrency": 4})
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise StatusError(429)
+            return "ok"
+
+        self.assertEqual(asyncio.run(manager.call("http://embedding", flaky)), "ok")
+        self.assertEqual(len(calls), 3)
+        # 每次 429 并发上限减半
+        self.assertLess(manager.endpoint("http://embedding").limiter.limit, 4)
+
+    def test_no_retry_on_client_error(self):
+        manager = ClientManager(FAST)
+        calls = []
+
+        def bad_request():
+            calls.append(1)
+            raise StatusError(400)
+
+        with self.assertRaises(StatusError):
+            manager.call_sync("http://llm", bad_request)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(manager.endpoint("http://llm").breaker.state, "closed")
+
+    def test_circuit_opens(self):
+        manager = ClientManager({**FAST, "maxRetries": 10, "failureThreshold": 3, "resetTimeout": 60})
+        calls = []
+
+        def unavailable():
+            calls.append(1)
+            raise StatusError(503)
+
+        with self.assertRaises(StatusError):
+            manager.call_sync("http://llm", unavailable)
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(CircuitOpenException):
+            manager.call_sync("http://llm", unavailable)
+
+    def test_cancel_releases_slot(self):
+        manager = ClientManager({**FAST, "initialConcurrency": 2, "maxConcurrency": 2})
+        endpoint = manager.endpoint("http://llm")
+
+        async def run():
+            started = asyncio.Event()
+
+            async def hang():
+                started.set()
+                await asyncio.sleep(3600)
+
+            async def quick():
+                return "ok"
+
+            for _ in range(2):
+                started.clear()
+                task = asyncio.create_task(manager.call("http://llm", hang))
+                await started.wait()
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            self.assertEqual(endpoint.limiter.in_flight, 0)
+            return await asyncio.wait_for(manager.call("http://llm", quick), 1)
+
+        self.assertEqual(asyncio.run(run()), "ok")
+
+    def test_cancel_probe(self):
+        manager = ClientManager({**FAST, "failureThreshold": 1, "resetTimeout": 0})
+        breaker = manager.endpoint("http://llm").breaker
+        breaker.record_failure()
+
+        async def run():
+            started = asyncio.Event()
+
+            async def hang():
+                started.set()
+                await asyncio.sleep(3600)
+
+            task = asyncio.create_task(manager.call("http://llm", hang))
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        # 被取消的试探请求不占用试探机会
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_sync_call_waits_for_async_holder(self):
+        # 同步调用在工作线程中等待槽位，事件循环上的异步调用可以继续执行并释放槽位
+        manager = ClientManager({**FAST, "initialConcurrency": 1, "minConcurrency": 1, "maxConcurrency": 1})
+        order = []
+
+        async def run():
+            release = asyncio.Event()
+
+            async def holder():
+                order.append("async start")
+                await release.wait()
+                order.append("async done")
+                return "async"
+
+            def waiter():
+                order.append("sync")
+                return "sync"
+
+            held = asyncio.create_task(manager.call("http://llm", holder))
+            await asyncio.sleep(0.01)
+            waiting = asyncio.create_task(asyncio.to_thread(manager.call_sync, "http://llm", waiter))
+            await asyncio.sleep(0.05)
+            self.assertEqual(order, ["async start"])
+            release.set()
+            return await asyncio.wait_for(asyncio.gather(held, waiting), 5)
+
+        self.assertEqual(asyncio.run(run()), ["async", "sync"])
+        self.assertEqual(order, ["async start", "async done", "sync"])
+        self.assertEqual(manager.endpoint("http://llm").limiter.in_flight, 0)
+
+    def test_endpoint_options(self):
+        manager = ClientManager({"rate": 5, "endpoints": {"http://embedding": {"rate": 50}}})
+        self.assertEqual(manager.endpoint("http://embedding/").bucket.rate, 50)
+        self.assertEqual(manager.endpoint("http://llm").bucket.rate, 5)
+
+
+class TestPrimitives(unittest.TestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket._reserve(), 0)
+        self.assertEqual(bucket._reserve(), 0)
+        self.assertGreater(bucket._reserve(), 0)
+
+    def test_aimd(self):
+        limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=8, target_latency=1.0)
+        limiter.acquire_sync()
+        limiter.release(0.1)
+        self.assertAlmostEqual(limiter.limit, 4.25)
+        limiter.acquire_sync()
+        limiter.release(2.0)
+        self.assertAlmostEqual(limiter.limit, 2.125)
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "half-open")
+        breaker.allow()
+        with self.assertRaises(CircuitOpenException):
+            breaker.allow()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
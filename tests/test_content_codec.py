@@ -0,0 +1,70 @@
+import importlib
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from email_assistant.content_codec import CODEC_PLAIN, CODEC_ZSTD, ContentCodec, _codecs, get_codec, zstandard
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+SAMPLES = [f"各位同事：\n请于2025年9月{i}日前提交第{i}周的IT采购计划进度，谢谢。\n信息管理部" for i in range(1, 200)]
+
+
+class TestContentCodec(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_file = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.conn = sqlite3.connect(self.db_file)
+        self.conn.execute('''
+            CREATE TABLE compression_dicts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, data BLOB,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP)
+        ''')
+
+    def tearDown(self):
+        self.conn.close()
+        _codecs.pop(self.db_file, None)
+        os.remove(self.db_file)
+
+    def test_plain(self):
+        codec = ContentCodec(self.db_file)
+        value, codec_id = codec.encode(SAMPLES[0], self.conn)
+        self.assertEqual((value, codec_id), (SAMPLES[0], CODEC_PLAIN))
+        self.assertEqual(codec.decode(value, codec_id), SAMPLES[0])
+
+    @unittest.skipIf(zstandard is None, "未安装 zstandard")
+    def test_zstd_with_dictionary(self):
+        codec = ContentCodec(self.db_file, enabled=True)
+        value, codec_id = codec.encode(SAMPLES[0], self.conn)
+        self.assertEqual(codec_id, CODEC_ZSTD)
+        self.assertEqual(codec.decode(value, codec_id), SAMPLES[0])
+
+        dict_id = codec.train(self.conn, SAMPLES, dict_size=4096)
+        value, codec_id = codec.encode(SAMPLES[5], self.conn)
+        self.assertEqual(codec_id, dict_id)
+        self.assertLess(len(value), len(SAMPLES[5].encode('utf-8')))
+
+        # 新的编解码器实例从数据库懒加载字典
+        self.assertEqual(ContentCodec(self.db_file).decode(value, codec_id), SAMPLES[5])
+
+    def test_sql_function(self):
+        codec = ContentCodec(self.db_file)
+        codec.register(self.conn)
+        row = self.conn.execute("SELECT email_content(?, ?)", ("正文", 0)).fetchone()
+        self.assertEqual(row[0], "正文")
+
+    @unittest.skipIf(zstandard is None, "未安装 zstandard")
+    @unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+    def test_reader_keeps_compression(self):
+        main = importlib.import_module("email_assistant.main")
+
+        codec = get_codec(self.db_file, enabled=True)
+        # 接口请求的连接只注册 SQL 函数，不能关闭共享编解码器的压缩
+        with mock.patch.object(main, "DB_FILE", self.db_file):
+            main.get_conn().close()
+        self.assertIs(get_codec(self.db_file), codec)
+        self.assertTrue(codec.enabled)
+        _, codec_id = get_codec(self.db_file).encode(SAMPLES[0], self.conn)
+        self.assertNotEqual(codec_id, CODEC_PLAIN)
@@ -0,0 +1,71 @@
+import asyncio
+import datetime
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from email_assistant.ai_processor import AIProcessor, AIProcessorNoDataException
+from email_assistant.email_processor import EmailPresistence, date_columns
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+CST = datetime.timezone(datetime.timedelta(hours=8))
+
+
+class TestDateColumns(unittest.TestCase):
+    def test_timezone_offsets(self):
+        # 同一时刻，不同时区的写法得到相同的时间戳和本地日期
+        a = datetime.datetime(2025, 8, 18, 7, 30, tzinfo=CST)
+        b = datetime.datetime(2025, 8, 17, 23, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(date_columns(a, CST), date_columns(b, CST))
+        self.assertEqual(date_columns(b, CST)[1], "2025-08-18")
+        self.assertEqual(date_columns(b, datetime.timezone.utc)[1], "2025-08-17")
+
+    def test_naive_is_utc(self):
+        naive = datetime.datetime(2025, 8, 18, 0, 0)
+        self.assertEqual(date_columns(naive, CST),
+                         date_columns(naive.replace(tzinfo=datetime.timezone.utc), CST))
+
+
+@unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+class TestDateIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        EmailPresistence.init_database(self.db_file)
+        self.conn = sqlite3.connect(self.db_file)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_backfill(self):
+        date = datetime.datetime(2025, 8, 18, 10, 0, tzinfo=CST)
+        self.conn.execute('''
+            INSERT INTO emails (uid, subject, date, content, folder) VALUES (1, '周报', ?, '正文', 'INBOX')
+        ''', (str(date),))
+        self.conn.commit()
+        EmailPresistence.init_database(self.db_file)
+        row = self.conn.execute("SELECT date_utc, local_day FROM emails WHERE uid = 1").fetchone()
+        self.assertEqual(row, date_columns(date))
+
+    def test_summary_query_uses_index(self):
+        plan = " ".join(str(row[3]) for row in self.conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT emails.uid FROM emails
+            INNER JOIN email_attributes ON emails.uid = email_attributes.uid
+            WHERE emails.local_day = ?
+            ORDER BY emails.thread_id, emails.uid
+        ''', ("2025-08-18",)))
+        self.assertIn("idx_emails_local_day", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_summary_without_emails(self):
+        processor = AIProcessor(embedding_base_url="https://example.com")
+        with self.assertRaises(AIProcessorNoDataException):
+            asyncio.run(processor.generate_summary(datetime.date(2025, 8, 18), "我", self.conn))
+
+
+if __name__ == "__main__":
+    unittest.main()
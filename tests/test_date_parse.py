@@ -0,0 +1,76 @@
+import unittest
+from datetime import datetime
+
+from email_assistant.date_parse import DueDate, cn_to_int, parse_due_date
+
+# 2025-08-20 是周三
+REFERENCE = datetime(2025, 8, 20, 10, 0)
+
+
+class TestCnToInt(unittest.TestCase):
+    def test_numbers(self):
+        self.assertEqual(cn_to_int("15"), 15)
+        self.assertEqual(cn_to_int("十"), 10)
+        self.assertEqual(cn_to_int("十五"), 15)
+        self.assertEqual(cn_to_int("二十三"), 23)
+        self.assertEqual(cn_to_int("二〇二五"), 2025)
+
+
+class TestParseDueDate(unittest.TestCase):
+    def check(self, text: str, expected: datetime, all_day: bool = True):
+        self.assertEqual(parse_due_date(text, REFERENCE), DueDate(expected, all_day), text)
+
+    def test_absolute(self):
+        self.check("2025-08-22 14:30:00", datetime(2025, 8, 22, 14, 30), all_day=False)
+        self.check("2025年9月底", datetime(2025, 9, 30, 23, 59, 59))
+        self.check("二〇二五年九月三十日", datetime(2025, 9, 30, 23, 59, 59))
+        self.check("9月15日", datetime(2025, 9, 15, 23, 59, 59))
+        self.check("十月一日前", datetime(2025, 10, 1, 23, 59, 59))
+
+    def test_closest_year(self):
+        self.check("1月5日", datetime(2026, 1, 5, 23, 59, 59))
+
+    def test_relative(self):
+        self.check("明天", datetime(2025, 8, 21, 23, 59, 59))
+        self.check("后天上午", datetime(2025, 8, 22, 11, 59, 59), all_day=False)
+        self.check("三天内", datetime(2025, 8, 23, 23, 59, 59))
+        self.check("3个工作日内", datetime(2025, 8, 25, 23, 59, 59))
+        self.check("两周内", datetime(2025, 9, 3, 23, 59, 59))
+
+    def test_week_and_month(self):
+        self.check("周五前", datetime(2025, 8, 22, 23, 59, 59))
+        self.check("周一", datetime(2025, 8, 25, 23, 59, 59))
+        self.check("下周三下午3点", datetime(2025, 8, 27, 15, 0), all_day=False)
+        self.check("本周内", datetime(2025, 8, 24, 23, 59, 59))
+        self.check("月底", datetime(2025, 8, 31, 23, 59, 59))
+        self.check("下个月底", datetime(2025, 9, 30, 23, 59, 59))
+        self.check("年底", datetime(2025, 12, 31, 23, 59, 59))
+
+    def test_midnight(self):
+        self.check("晚上12点", datetime(2025, 8, 21, 0, 0), all_day=False)
+        self.check("明晚12点", datetime(2025, 8, 22, 0, 0), all_day=False)
+        self.check("2025年9月1日 24:00", datetime(2025, 9, 2, 0, 0), all_day=False)
+        self.check("中午12点", datetime(2025, 8, 20, 12, 0), all_day=False)
+
+    def test_bare_hour(self):
+        # 未给出时段的小时数按工作时间理解
+        self.check("三点", datetime(2025, 8, 20, 15, 0), all_day=False)
+        self.check("明天9点", datetime(2025, 8, 21, 9, 0), all_day=False)
+
+    def test_range_end(self):
+        self.check("上午9点至下午5点", datetime(2025, 8, 20, 17, 0), all_day=False)
+        self.check("8月20日-8月22日", datetime(2025, 8, 22, 23, 59, 59))
+        self.check("8月20日 9点至17点", datetime(2025, 8, 20, 17, 0), all_day=False)
+        self.check("2025-08-20 ~ 2025-08-25", datetime(2025, 8, 25, 23, 59, 59))
+
+    def test_invalid_time(self):
+        self.assertIsNone(parse_due_date("9月1日 25:00", REFERENCE))
+        self.assertIsNone(parse_due_date("9月1日 24:30", REFERENCE))
+
+    def test_unparsed(self):
+        for text in ("", "-", "待定", "最后日期待定"):
+            self.assertIsNone(parse_due_date(text, REFERENCE), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import sqlite3
+import unittest
+
+from email_assistant.email_dedupe import ExtractionDeduplicator, hamming_distance, simhash
+
+NOTICE = "各位同事：请提供附件中截止2025年9月底，合同即将到期的IT采购计划进度，谢谢。" \
+         "另外，如有以下情况的，也请同步更新支付计划清单，并标黄，谢谢。" * 2
+
+
+class TestSimhash(unittest.TestCase):
+    def test_near_duplicate(self):
+        self.assertLessEqual(hamming_distance(simhash(NOTICE), simhash(NOTICE.replace("谢谢。另", "谢谢！另"))), 3)
+
+    def test_numbers_normalized(self):
+        self.assertEqual(simhash(NOTICE), simhash(NOTICE.replace("2025", "2026")))
+
+    def test_different_text(self):
+        other = "HI 马老师：附件为上海外服（集团）有限公司飞致云堡垒机的报价，敬请查收，谢谢！"
+        self.assertGreater(hamming_distance(simhash(NOTICE), simhash(other)), 3)
+
+
+class TestExtractionDeduplicator(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute('''
+            CREATE TABLE email_attributes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                uid INTEGER UNIQUE, recipient TEXT, datetime DATETIME, content TEXT)
+        ''')
+        self.conn.execute('''
+            CREATE TABLE email_fingerprints (
+                uid INTEGER PRIMARY KEY, simhash INTEGER,
+                band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER)
+        ''')
+        self.dedup = ExtractionDeduplicator(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_lookup_reuses_attribute(self):
+        fingerprint = self.dedup.fingerprint(NOTICE)
+        self.dedup.remember(1, fingerprint)
+        self.conn.execute("INSERT INTO email_attributes (uid, recipient, datetime, content) VALUES (1, '各位同事', '2025年9月底', '提供合同到期进度')")
+
+        attr = self.dedup.lookup(self.dedup.fingerprint(NOTICE + " "), 2)
+        self.assertIsNotNone(attr)
+        if attr is not None:
+            self.assertEqual(attr.uid, 2)
+            self.assertEqual(attr.content, '提供合同到期进度')
+        self.assertEqual(self.dedup.hit_rate, 1.0)
+
+    def test_lookup_miss_without_attribute(self):
+        self.dedup.remember(1, self.dedup.fingerprint(NOTICE))
+        self.assertIsNone(self.dedup.lookup(self.dedup.fingerprint(NOTICE), 2))
+        self.assertEqual(self.dedup.hit_rate, 0.0)
+
+    def test_pending_in_batch(self):
+        fingerprint = self.dedup.fingerprint(NOTICE)
+        self.assertIsNone(self.dedup.find_pending(fingerprint))
+        self.dedup.add_pending(fingerprint, 1)
+        self.assertEqual(self.dedup.find_pending(fingerprint), 1)
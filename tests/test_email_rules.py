@@ -0,0 +1,99 @@
+import datetime
+import unittest
+
+from email_assistant.email_rules import EmailPreClassifier, EmailRule
+from email_assistant.type import Email
+
+
+def make_email(subject: str, sender: str = "张三 <zhang.san@example.com>", content: str = "") -> Email:
+    return Email(
+        uid=1,
+        subject=subject,
+        sender=sender,
+        recipient="李四 <li.si@example.com>",
+        date=datetime.datetime(2025, 8, 18, 10, 0, 0),
+        content=content or subject,
+        folder="INBOX"
+    )
+
+
+class TestEmailPreClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = EmailPreClassifier()
+
+    def test_auto_reply(self):
+        attr = self.classifier.classify(make_email("自动回复：关于项目进度"))
+        self.assertIsNotNone(attr)
+        if attr is not None:
+            self.assertTrue(attr.content.startswith("自动回复"))
+            self.assertEqual(attr.datetime, "-")
+
+    def test_bounce_by_sender(self):
+        attr = self.classifier.classify(make_email("Returned mail", sender="MAILER-DAEMON@example.com"))
+        self.assertIsNotNone(attr)
+        if attr is not None:
+            self.assertTrue(attr.content.startswith("退信通知"))
+
+    def test_system_notice_datetime(self):
+        attr = self.classifier.classify(make_email(
+            "【系统通知】数据库备份完成",
+            sender="noreply@example.com",
+            content="备份于2025-08-18 02:00:00完成"))
+        self.assertIsNotNone(attr)
+        if attr is not None:
+            self.assertEqual(attr.datetime, "2025-08-18 02:00:00")
+
+    def test_classify_many(self):
+        emails = [
+            make_email("【系统通知】巡检任务", sender="noreply@example.com", content="请务必完成巡检，待办事项：重启服务"),
+            make_email("请提供合同到期进度"),
+            make_email("自动回复：休假", content="休假期间的工作安排：请联系王五"),
+        ]
+        attrs = self.classifier.classify_many(emails)
+        self.assertEqual(attrs, [self.classifier.classify(email) for email in emails])
+        self.assertIsNone(attrs[1])
+        self.assertIn("待办：", attrs[0].content)  # pyright: ignore[reportOptionalMemberAccess]
+        # 自动回复规则不识别任务
+        self.assertNotIn("待办：", attrs[2].content)  # pyright: ignore[reportOptionalMemberAccess]
+
+    def test_ambiguous_email_goes_to_llm(self):
+        self.assertIsNone(self.classifier.classify(make_email("请提供合同到期进度")))
+
+    def test_config_rules_take_precedence(self):
+        classifier = EmailPreClassifier.from_config({
+            "ai": {"preClassifier": {"rules": [
+                {"name": "周报", "subjects": ["周报"], "label": "周报汇总", "extractTasks": False}
+            ]}}
+        })
+        attr = classifier.classify(make_email("自动回复：本周周报"))
+        self.assertIsNotNone(attr)
+        if attr is not None:
+            self.assertTrue(attr.content.startswith("周报汇总"))
+
+    def test_system_sender_opt_in(self):
+        email = make_email("您的订单已发货", sender="京东 <noreply@jd.com>")
+        self.assertIsNone(self.classifier.classify(email))
+        classifier = EmailPreClassifier.from_config({"ai": {"preClassifier": {"systemSenders": True}}})
+        attr = classifier.classify(email)
+        self.assertIsNotNone(attr)
+        if attr is not None:
+            self.assertTrue(attr.content.startswith("系统通知"))
+        # 只匹配地址的用户名部分
+        self.assertIsNone(classifier.classify(make_email("项目周会", sender="valerta.monitor-team@example.com")))
+
+    def test_datetime_scan_limit(self):
+        content = "【系统通知】" + "正文" * 600 + "2025-08-18 02:00:00"
+        attr = self.classifier.classify(make_email("【系统通知】巡检", content=content))
+        self.assertIsNotNone(attr)
+        if attr is not None:
+            self.assertEqual(attr.datetime, "-")
+
+    def test_disabled(self):
+        classifier = EmailPreClassifier.from_config({"ai": {"preClassifier": {"enabled": False}}})
+        self.assertIsNone(classifier.classify(make_email("自动回复：关于项目进度")))
+
+    def test_custom_rule(self):
+        classifier = EmailPreClassifier(rules=[])
+        classifier.add_rule(EmailRule(name="日报", sender_patterns=[r"report@"], with_tasks=False))
+        attr = classifier.classify(make_email("日报", sender="report@example.com"))
+        self.assertIsNotNone(attr)
@@ -0,0 +1,130 @@
+import asyncio
+import smtplib
+import sqlite3
+import threading
+import unittest
+
+from email_assistant.email_sender import SmtpPool
+from email_assistant.outbox import Outbox, send_batch
+
+
+class FakeSender:
+    def __init__(self, pool: "FakePool"):
+        self.pool = pool
+        self.server = object()
+
+    def is_alive(self):
+        return self.server is not None and not self.pool.stale
+
+    def send_message(self, msg):
+        recipient = msg["To"]
+        if self.pool.gate is not None:
+            self.pool.entered.set()
+            self.pool.gate.wait(5)
+        if self.pool.drop_next:
+            self.pool.drop_next = False
+            raise smtplib.SMTPServerDisconnected("连接已断开")
+        if recipient in self.pool.refused:
+            raise smtplib.SMTPRecipientsRefused({recipient: (550, b"no such user")})
+        self.pool.sent.append(recipient)
+
+    def disconnect(self):
+        self.server = None
+
+
+class FakePool(SmtpPool):
+    def __init__(self, size: int = 2):
+        super().__init__("smtp.example.com", 465, "bench", "bench", size=size)
+        self.opened = 0
+        self.sent = []
+        self.refused = set()
+        self.drop_next = False
+        self.stale = False
+        self.gate = None
+        self.entered = threading.Event()
+
+    def _open(self):
+        self.opened += 1
+        self.stale = False
+        return FakeSender(self)
+
+
+class TestSmtpPool(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        Outbox.create_table(self.conn)
+        self.outbox = Outbox(self.conn)
+        self.pool = FakePool(size=2)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def enqueue(self, recipients):
+        batch_id = Outbox.new_batch_id()
+        self.outbox.enqueue(batch_id, ({"recipient": recipient, "subject": "通知", "content": "您好"}
+                                       for recipient in recipients))
+        return batch_id
+
+    def run_batch(self, batch_id):
+        async def run():
+            return [result async for result in send_batch(self.outbox, self.pool, "me@example.com", batch_id)]
+        return asyncio.run(run())
+
+    def test_connections_are_reused(self):
+        recipients = [f"user{i}@example.com" for i in range(20)]
+        results = self.run_batch(self.enqueue(recipients))
+        self.assertEqual(len(results), 20)
+        self.assertEqual(sorted(self.pool.sent), sorted(recipients))
+        self.assertLessEqual(self.pool.opened, 2)
+
+    def test_reconnect_stale_connection(self):
+        self.run_batch(self.enqueue(["a@example.com"]))
+        # 空闲连接被服务器断开，发送前检查到后重新建立连接
+        self.pool.stale = True
+        results = self.run_batch(self.enqueue(["b@example.com"]))
+        self.assertEqual(results[0]["status"], "sent")
+        self.assertEqual(self.pool.opened, 2)
+
+    def test_disconnect_during_send_not_resent(self):
+        self.pool.drop_next = True
+        batch_id = self.enqueue(["a@example.com"])
+        results = self.run_batch(batch_id)
+        # 服务器可能已经接收，不自动重发，继续发送时也跳过
+        self.assertEqual(results[0]["status"], "sending")
+        self.assertEqual(self.pool.opened, 1)
+        self.assertEqual(self.outbox.batch_status(batch_id)["sending"], 1)
+        self.assertEqual(self.run_batch(batch_id), [])
+        self.assertEqual(self.pool.sent, [])
+
+    def test_cancel_keeps_dispatched_result(self):
+        self.pool = FakePool(size=1)
+        self.pool.gate = threading.Event()
+        batch_id = self.enqueue(["a@example.com", "b@example.com"])
+
+        async def run():
+            async def consume():
+                async for _ in send_batch(self.outbox, self.pool, "me@example.com", batch_id):
+                    pass
+
+            consumer = asyncio.create_task(consume())
+            await asyncio.to_thread(self.pool.entered.wait, 5)
+            # 客户端断开：第一封已交给服务器，第二封还在等待连接
+            consumer.cancel()
+            asyncio.get_running_loop().call_later(0.05, self.pool.gate.set)
+            with self.assertRaises(asyncio.CancelledError):
+                await consumer
+
+        asyncio.run(run())
+        self.assertEqual(self.pool.sent, ["a@example.com"])
+        self.assertEqual(self.outbox.batch_status(batch_id), {"pending": 1, "sending": 0, "sent": 1, "failed": 0})
+
+    def test_failed_recipient_and_resume(self):
+        self.pool.refused.add("bad@example.com")
+        batch_id = self.enqueue(["a@example.com", "bad@example.com"])
+        self.run_batch(batch_id)
+        self.assertEqual(self.outbox.batch_status(batch_id), {"pending": 0, "sending": 0, "sent": 1, "failed": 1})
+
+        self.pool.refused.clear()
+        results = self.run_batch(batch_id)
+        self.assertEqual(results, [{"recipient": "bad@example.com", "status": "sent"}])
+        self.assertEqual(self.outbox.batch_status(batch_id)["sent"], 2)
@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from email_assistant.email_processor import EmailPresistence
+from email_assistant.email_stats import EmailStats, StatsKey, is_todo, sender_key
+from email_assistant.embedding_backend import EmbeddingBackend
+from email_assistant.type import Email, EmailAttribute
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+CST = datetime.timezone(datetime.timedelta(hours=8))
+
+
+class FakeBackend(EmbeddingBackend):
+    model_id = "fake"
+
+    async def embed(self, texts):
+        return [[0.1] * 1024 for _ in texts]
+
+
+def make_email(uid: int, day: int, sender: str = "张三 <Zhang.San@example.com>", folder: str = "INBOX") -> Email:
+    return Email(uid=uid, subject="周报", sender=sender, recipient="li.si@example.com",
+                 date=datetime.datetime(2025, 8, day, 10, 0, tzinfo=CST), content=f"正文 {uid}", folder=folder)
+
+
+class TestHelpers(unittest.TestCase):
+    def test_sender_key(self):
+        self.assertEqual(sender_key("张三 <Zhang.San@example.com>"), "zhang.san@example.com")
+        self.assertEqual(sender_key("zhang.san@example.com"), "zhang.san@example.com")
+        self.assertEqual(sender_key(""), "")
+
+    def test_is_todo(self):
+        self.assertTrue(is_todo("2025-08-20 10:00:00"))
+        self.assertFalse(is_todo("-"))
+        self.assertFalse(is_todo(""))
+        self.assertFalse(is_todo(None))
+
+
+class TestEmailStats(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        EmailStats.create_table(self.conn)
+        self.stats = EmailStats(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_apply_and_summary(self):
+        self.stats.apply(StatsKey("2025-08-18", "INBOX", "a@example.com", 0), emails=1)
+        self.stats.apply(StatsKey("2025-08-18", "INBOX", "b@example.com", 0), emails=1, attributes=1, todos=1)
+        self.stats.apply(StatsKey("2025-08-20", "INBOX", "b@example.com", 1), emails=1)
+        summary = self.stats.summary(datetime.date(2025, 8, 20), days=3, limit=1)
+        self.assertEqual(summary["total"]["emails"], 3)
+        self.assertEqual(summary["total"]["todos"], 1)
+        self.assertEqual([day["emails"] for day in summary["daily"]], [2, 0, 1])
+        self.assertEqual(summary["senders"], [{"key": "b@example.com", "emails": 2, "attributes": 1, "todos": 1}])
+
+    def test_top_uses_index(self):
+        plan = " ".join(str(row[3]) for row in self.conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT key FROM email_stats WHERE dimension = 'sender' AND emails > 0 ORDER BY emails DESC LIMIT 10
+        '''))
+        self.assertIn("idx_email_stats_rank", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+@unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+class TestIncrementalStats(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        EmailPresistence.init_database(self.db_file)
+        self.persistence = EmailPresistence(self.db_file, "", embedding_backend=FakeBackend())
+        self.persistence.connect()
+
+    def tearDown(self):
+        self.persistence.close()
+        self.tmp.cleanup()
+
+    def stats(self):
+        return EmailStats(self.persistence.conn).summary(datetime.date(2025, 8, 19), days=2)  # pyright: ignore[reportArgumentType]
+
+    def rebuilt(self):
+        conn = self.persistence.conn
+        before = conn.execute("SELECT * FROM email_stats WHERE emails != 0 ORDER BY dimension, key").fetchall()  # pyright: ignore[reportOptionalMemberAccess]
+        EmailStats(conn).rebuild()  # pyright: ignore[reportArgumentType]
+        after = conn.execute("SELECT * FROM email_stats ORDER BY dimension, key").fetchall()  # pyright: ignore[reportOptionalMemberAccess]
+        return before, after
+
+    def test_matches_rebuild(self):
+        for uid, day in ((1, 18), (2, 18), (3, 19)):
+            self.assertTrue(asyncio.run(self.persistence.save_emails_to_db(make_email(uid, day))))
+        # 重复保存、改变文件夹
+        asyncio.run(self.persistence.save_emails_to_db(make_email(2, 18, folder="Archive")))
+        self.persistence.save_email_attributes_to_db(EmailAttribute(uid=1, datetime="-", content="通知"))
+        self.persistence.save_email_attributes_to_db(EmailAttribute(uid=1, datetime="2025-08-20 10:00", content="会议"))
+        self.persistence.save_email_attributes_to_db(EmailAttribute(uid=3, datetime="2025-08-21", content="报价"))
+        self.persistence.delete_email(3)
+        self.persistence.commit()
+
+        stats = self.stats()
+        self.assertEqual(stats["total"], {"key": "", "emails": 2, "attributes": 1, "todos": 1})
+        self.assertEqual([day["emails"] for day in stats["daily"]], [2, 0])
+        self.assertEqual({row["key"]: row["emails"] for row in stats["folders"]}, {"INBOX": 1, "Archive": 1})
+        self.assertEqual(stats["senders"][0]["key"], "zhang.san@example.com")
+        before, after = self.rebuilt()
+        self.assertEqual(before, after)
+
+    def test_init_builds_stats_for_existing_emails(self):
+        asyncio.run(self.persistence.save_emails_to_db(make_email(1, 18)))
+        self.persistence.conn.execute("DROP TABLE email_stats")  # pyright: ignore[reportOptionalMemberAccess]
+        self.persistence.commit()
+        EmailPresistence.init_database(self.db_file)
+        self.assertEqual(self.stats()["total"]["emails"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
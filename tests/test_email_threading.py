@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from email_assistant.email_processor import EmailPresistence
+from email_assistant.email_threading import (add_thread_message, assign_thread, clean_reply, delta_content,
+                                             normalize_subject, quoted_offset)
+from email_assistant.embedding_backend import EmbeddingBackend
+from email_assistant.type import Email
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+
+class FakeBackend(EmbeddingBackend):
+    model_id = "fake"
+
+    async def embed(self, texts):
+        return [[0.1] * 1024 for _ in texts]
+
+
+def make_email(uid: int, subject: str, content: str, message_id: str,
+               in_reply_to: str = "", references=None) -> Email:
+    return Email(
+        uid=uid,
+        subject=subject,
+        sender="张三 <zhang.san@example.com>",
+        recipient="李四 <li.si@example.com>",
+        date=datetime.datetime(2025, 8, 18, 10, uid),
+        content=content,
+        folder="INBOX",
+        message_id=message_id,
+        in_reply_to=in_reply_to,
+        references=references or []
+    )
+
+
+class TestEmailThreading(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute('''
+            CREATE TABLE emails (uid INTEGER UNIQUE, message_id TEXT, thread_id INTEGER)
+        ''')
+        self.conn.execute('''
+            CREATE TABLE email_threads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, root_message_id TEXT, subject TEXT,
+                first_date DATETIME, last_date DATETIME, message_count INTEGER DEFAULT 0)
+        ''')
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _save(self, email: Email) -> int:
+        thread_id, new_in_thread = assign_thread(self.conn, email)
+        self.conn.execute("INSERT OR REPLACE INTO emails (uid, message_id, thread_id) VALUES (?, ?, ?)",
+                          (email.uid, email.message_id, thread_id))
+        if new_in_thread:
+            add_thread_message(self.conn, email)
+        return thread_id
+
+    def test_normalize_subject(self):
+        self.assertEqual(normalize_subject("Re: 回复：IT采购计划"), "IT采购计划")
+        self.assertEqual(normalize_subject("FW: Fwd: report"), "report")
+
+    def test_quoted_offset(self):
+        content = "收到，谢谢。\n_____\n马老师：附件为报价"
+        self.assertEqual(content[:quoted_offset(content)], "收到，谢谢。")
+        self.assertIsNone(quoted_offset("没有引用内容"))
+
+    def test_wrapped_line_is_not_quote(self):
+        # 排版后 “>” 可能出现在折行的行首，不能当作引用
+        body = "甲" * 99 + " >5台服务器需要更换"
+        content, delta_length = clean_reply(body)
+        self.assertIsNone(delta_length)
+        self.assertIn("\n>5台", content)
+        self.assertIsNone(quoted_offset(content))
+
+    def test_quote_header_split_across_lines(self):
+        body = ("收到，本周五前提交。\n\nOn Mon, 18 Aug 2025 at 10:00, Zhang San <zhang.san@example.com>\n"
+                "wrote:\n> 请提供进度\n")
+        content, delta_length = clean_reply(body)
+        self.assertEqual(content[:delta_length], "收到，本周五前提交。")
+
+        body = "好的。\n\n在 2025年8月18日 10:00，张三\n<zhang.san@example.com> 写道：\n请提供进度"
+        content, delta_length = clean_reply(body)
+        self.assertEqual(content[:delta_length], "好的。")
+
+    def test_quoted_lines(self):
+        content, delta_length = clean_reply("已提交。\n> 请提供进度\n> 谢谢")
+        self.assertEqual(content[:delta_length], "已提交。")
+        self.assertIsNone(clean_reply("> 只有引用")[1])
+
+    def test_reply_joins_thread(self):
+        root = make_email(1, "IT采购计划", "请提供进度", "<a@example.com>")
+        reply = make_email(2, "回复：IT采购计划", "已提交。\n_____\n请提供进度", "<b@example.com>",
+                           in_reply_to="<a@example.com>", references=["<a@example.com>"])
+        other = make_email(3, "堡垒机报价", "附件为报价", "<c@example.com>")
+
+        root_thread = self._save(root)
+        self.assertEqual(self._save(reply), root_thread)
+        self.assertNotEqual(self._save(other), root_thread)
+        self.assertIsNone(root.delta_length)
+        self.assertEqual(delta_content(reply), "已提交。")
+
+        count = self.conn.execute("SELECT message_count FROM email_threads WHERE id = ?", (root_thread,)).fetchone()[0]
+        self.assertEqual(count, 2)
+
+        # 重新处理同一封邮件不会重复计数
+        self._save(reply)
+        count = self.conn.execute("SELECT message_count FROM email_threads WHERE id = ?", (root_thread,)).fetchone()[0]
+        self.assertEqual(count, 2)
+
+    def test_subject_fallback(self):
+        root_thread = self._save(make_email(1, "周会安排", "周三下午开会", "<a@example.com>"))
+        self.assertEqual(self._save(make_email(2, "Re: 周会安排", "收到", "<b@example.com>")), root_thread)
+
+
+@unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+class TestThreadCount(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        EmailPresistence.init_database(self.db_file)
+        self.persistence = EmailPresistence(self.db_file, "", embedding_backend=FakeBackend())
+        self.persistence.connect()
+
+    def tearDown(self):
+        self.persistence.close()
+        self.tmp.cleanup()
+
+    def save(self, email: Email) -> bool:
+        result = asyncio.run(self.persistence.save_emails_to_db(email))
+        self.persistence.commit()
+        return result
+
+    def threads(self):
+        return self.persistence.conn.execute(  # pyright: ignore[reportOptionalMemberAccess]
+            "SELECT id, message_count FROM email_threads ORDER BY id").fetchall()
+
+    def test_failed_insert_not_counted(self):
+        self.assertTrue(self.save(make_email(1, "IT采购计划", "请提供进度", "<a@example.com>")))
+        reply = make_email(2, "回复：IT采购计划", "已提交。", "<b@example.com>", in_reply_to="<a@example.com>")
+        other = make_email(3, "堡垒机报价", "附件为报价", "<c@example.com>")
+        with mock.patch.object(self.persistence.codec, "encode", side_effect=ValueError("写入失败")):
+            self.assertFalse(self.save(reply))
+            self.assertFalse(self.save(other))
+        self.assertEqual(self.threads(), [(1, 1)])
+
+        self.assertTrue(self.save(reply))
+        self.assertTrue(self.save(reply))
+        self.assertEqual(self.threads(), [(1, 2)])
+
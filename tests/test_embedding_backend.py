@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import unittest
+
+import numpy as np
+
+from email_assistant.embedding_backend import (LocalEmbeddingBackend, OpenAIEmbeddingBackend,
+                                               create_embedding_backend)
+
+
+class FakeModel:
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+class TestLocalEmbeddingBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = LocalEmbeddingBackend(batch_size=8, max_wait=0.05)
+        self.backend.model = FakeModel()
+
+    def tearDown(self):
+        self.backend.close()
+
+    def test_concurrent_requests_are_batched(self):
+        async def run():
+            return await asyncio.gather(*(self.backend.embed_one("x" * i) for i in range(1, 6)))
+
+        vectors = asyncio.run(run())
+        self.assertEqual([v[0] for v in vectors], [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(len(self.backend.model.batches), 1)  # pyright: ignore[reportAttributeAccessIssue]
+
+    def test_batch_size_limit(self):
+        vectors = asyncio.run(self.backend.embed(["段落"] * 20))
+        self.assertEqual(len(vectors), 20)
+        self.assertTrue(all(len(batch) <= 8 for batch in self.backend.model.batches))  # pyright: ignore[reportAttributeAccessIssue]
+
+    def test_error_propagates(self):
+        def broken(texts, **kwargs):
+            raise RuntimeError("推理失败")
+
+        self.backend.model.encode = broken  # pyright: ignore[reportAttributeAccessIssue]
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self.backend.embed(["段落"]))
+
+    def test_close_cancels_batches(self):
+        release = threading.Event()
+
+        def blocked(texts, **kwargs):
+            release.wait(5)
+            return np.zeros((len(texts), 2), dtype=np.float32)
+
+        self.backend.model.encode = blocked  # pyright: ignore[reportAttributeAccessIssue]
+
+        async def run():
+            pending = asyncio.ensure_future(self.backend.embed(["段落"]))
+            while not self.backend._batches:
+                await asyncio.sleep(0.01)
+            self.backend.close()
+            try:
+                with self.assertRaises(asyncio.CancelledError):
+                    await pending
+            finally:
+                release.set()
+
+        asyncio.run(run())
+        self.assertFalse(self.backend._batches)
+
+
+class TestCreateEmbeddingBackend(unittest.TestCase):
+    def test_default_openai(self):
+        backend = create_embedding_backend({"embeddingBaseUrl": "http://127.0.0.1:9997/v1",
+                                            "embeddingModel": "bge-large-zh-v1.5"})
+        self.assertIsInstance(backend, OpenAIEmbeddingBackend)
+
+    def test_local(self):
+        backend = create_embedding_backend({"embeddingBackend": "local",
+                                            "localEmbedding": {"batchSize": 16, "maxWaitMs": 10}})
+        self.assertIsInstance(backend, LocalEmbeddingBackend)
+        if isinstance(backend, LocalEmbeddingBackend):
+            self.assertEqual(backend.batch_size, 16)
+            self.assertAlmostEqual(backend.max_wait, 0.01)
+            self.assertIsNone(backend.model)
+        backend.close()
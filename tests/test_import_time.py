@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import unittest
+from typing import Dict
+
+# 启动时不应加载的重量级模块，它们在第一次使用时才导入
+LAZY_MODULES = ["langextract", "pydantic_ai", "openai", "jieba", "icalendar", "bs4", "pandas",
+                "sentence_transformers"]
+
+# email_assistant.main 的导入耗时上限（毫秒），可通过环境变量调整
+IMPORT_TIME_BUDGET_MS = int(os.environ.get("IMPORT_TIME_BUDGET_MS", "2000"))
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """在新进程中用 -X importtime 导入模块，返回 模块名→累计耗时（微秒）"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_main_budget(self):
+        times = import_times("email_assistant.main")
+        loaded = [module for module in LAZY_MODULES if module in times]
+        self.assertEqual(loaded, [], "启动时加载了重量级模块")
+        self.assertLess(times["email_assistant.main"] / 1000, IMPORT_TIME_BUDGET_MS)
+
+    def test_templates_without_web_app(self):
+        times = import_times("email_assistant.templates")
+        self.assertNotIn("email_assistant.main", times)
+        self.assertNotIn("fastapi", times)
@@ -0,0 +1,68 @@
+import io
+import json
+import logging
+from logging.handlers import QueueListener
+from queue import SimpleQueue
+import unittest
+
+from email_assistant.log_config import JsonFormatter, PayloadFilter, StructuredQueueHandler
+
+
+def make_record(name: str, msg: str, level: int = logging.INFO, args=(), **extra) -> logging.LogRecord:
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class TestPayloadFilter(unittest.TestCase):
+    def test_truncate(self):
+        record = make_record("email_assistant.ai_processor", "提示词: %s", args=("x" * 5000,))
+        self.assertTrue(PayloadFilter(max_length=100).filter(record))
+        message = record.getMessage()
+        self.assertTrue(message.startswith("提示词: xxx"))
+        self.assertIn("共5005字符", message)
+        self.assertLess(len(message), 200)
+
+    def test_sample_rate_by_prefix(self):
+        payload_filter = PayloadFilter(sample_rates={"email_assistant": 1.0, "email_assistant.main": 0.0})
+        self.assertFalse(payload_filter.filter(make_record("email_assistant.main", "进度")))
+        self.assertTrue(payload_filter.filter(make_record("email_assistant.ai_processor", "进度")))
+        # WARNING 及以上不采样
+        self.assertTrue(payload_filter.filter(make_record("email_assistant.main", "失败", logging.WARNING)))
+
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_extra_fields(self):
+        record = make_record("email_assistant.main", "邮件处理进度", count=3, uid=42)
+        payload = json.loads(JsonFormatter().format(record))
+        self.assertEqual(payload["message"], "邮件处理进度")
+        self.assertEqual(payload["level"], "INFO")
+        self.assertEqual(payload["count"], 3)
+        self.assertEqual(payload["uid"], 42)
+
+    def test_exception_through_queue(self):
+        queue = SimpleQueue()
+        stream = io.StringIO()
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JsonFormatter())
+        listener = QueueListener(queue, output)
+        logger = logging.getLogger("email_assistant.test_log_config")
+        handler = StructuredQueueHandler(queue)
+        logger.addHandler(handler)
+        logger.propagate = False
+        listener.start()
+        try:
+            try:
+                raise ValueError("向量化失败")
+            except ValueError:
+                logger.exception("重试失败任务失败: %s", 42, extra={"uid": 42})
+        finally:
+            listener.stop()
+            logger.removeHandler(handler)
+            logger.propagate = True
+        payload = json.loads(stream.getvalue())
+        self.assertEqual(payload["message"], "重试失败任务失败: 42")
+        self.assertEqual(payload["uid"], 42)
+        self.assertIn("Traceback", payload["exception"])
+        self.assertIn("ValueError: 向量化失败", payload["exception"])
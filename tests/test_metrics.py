@@ -0,0 +1,55 @@
+import unittest
+from types import SimpleNamespace
+
+from email_assistant.metrics import (MetricsRegistry, record_tokens, server_timing_header, span,
+                                     start_request_timing, SPAN_SECONDS, TOKENS_TOTAL)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_counter_render(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("test_bytes_total", "字节数", ["kind"])
+        counter.inc(10, kind="imap")
+        counter.inc(5, kind="imap")
+        text = registry.render()
+        self.assertIn("# TYPE test_bytes_total counter", text)
+        self.assertIn('test_bytes_total{kind="imap"} 15', text)
+
+    def test_histogram_render(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "耗时", ["span"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, span="llm")
+        histogram.observe(0.5, span="llm")
+        text = registry.render()
+        self.assertIn('test_seconds_bucket{span="llm",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{span="llm",le="1"} 2', text)
+        self.assertIn('test_seconds_bucket{span="llm",le="+Inf"} 2', text)
+        self.assertIn('test_seconds_count{span="llm"} 2', text)
+
+    def test_duplicate_name(self):
+        registry = MetricsRegistry()
+        registry.counter("test_total", "计数")
+        with self.assertRaises(ValueError):
+            registry.counter("test_total", "计数")
+
+
+class TestSpan(unittest.TestCase):
+    def test_span_records_request_timing(self):
+        before = SPAN_SECONDS.get(span="test_span")
+        timings = start_request_timing()
+        with span("test_span"):
+            pass
+        with span("test_span"):
+            pass
+        self.assertEqual(SPAN_SECONDS.get(span="test_span"), before + 2)
+        self.assertEqual(timings["test_span"][1], 2)
+        header = server_timing_header(timings, total=0.01)
+        self.assertTrue(header.startswith('test_span;desc="x2";dur='))
+        self.assertTrue(header.endswith("total;dur=10.0"))
+
+    def test_record_tokens(self):
+        before = TOKENS_TOTAL.get(model="test-model", kind="prompt")
+        record_tokens("test-model", SimpleNamespace(prompt_tokens=12, completion_tokens=None))
+        record_tokens("test-model", SimpleNamespace(request_tokens=3, response_tokens=4))
+        self.assertEqual(TOKENS_TOTAL.get(model="test-model", kind="prompt"), before + 15)
+        self.assertEqual(TOKENS_TOTAL.get(model="test-model", kind="completion"), 4)
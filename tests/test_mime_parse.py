@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from email_assistant.mime_parse import MessageParsePool, parse_message
+
+
+def make_raw(subject: str = "=?UTF-8?Q?=E6=B5=8B=E8=AF=95?=") -> bytes:
+    msg = MIMEMultipart()
+    msg['Subject'] = subject
+    msg['From'] = '=?UTF-8?Q?=E6=9D=8E=E5=9B=9B?= <li.si@example.com>'
+    msg['To'] = 'chenxin.ma@example.com'
+    msg['Date'] = 'Mon, 18 Aug 2025 10:00:00 +0800'
+    msg.attach(MIMEText("请查收附件，谢谢", 'plain', 'utf-8'))
+    attachment = MIMEApplication(b"x" * 128, Name="report.pdf")
+    attachment['Content-Disposition'] = 'attachment; filename="report.pdf"'
+    msg.attach(attachment)
+    return msg.as_bytes()
+
+
+class TestParseMessage(unittest.TestCase):
+    def test_parse_message(self):
+        parsed = parse_message(make_raw())
+        self.assertEqual(parsed.subject, "测试")
+        self.assertEqual(parsed.sender, "李四 <li.si@example.com>")
+        self.assertEqual(parsed.content, "请查收附件，谢谢")
+        self.assertFalse(parsed.is_calendar)
+        self.assertEqual(len(parsed.attachments), 1)
+        self.assertEqual(parsed.attachments[0].filename, "report.pdf")
+        self.assertEqual(parsed.attachments[0].size, 128)
+
+    def test_pool_keeps_order(self):
+        async def run(workers: int):
+            pool = MessageParsePool(workers=workers, min_batch=4)
+            try:
+                raws = [(i, make_raw(f"subject {i}")) for i in range(10)] + [(99, b"")]
+                results = [(uid, parsed.subject if parsed else None) async for uid, parsed in pool.parse_many(raws)]
+                self.assertEqual(pool.executor is not None, workers > 1)
+                return results
+            finally:
+                pool.close()
+
+        for workers in (1, 2):
+            results = asyncio.run(run(workers))
+            self.assertEqual([uid for uid, _ in results], list(range(10)) + [99])
+            self.assertEqual(results[3][1], "subject 3")
+
+    def test_small_batch_in_process(self):
+        async def run():
+            pool = MessageParsePool(workers=2, min_batch=32)
+            try:
+                results = [parsed async for _, parsed in pool.parse_many((i, make_raw()) for i in range(5))]
+                # 小批量不启动子进程
+                self.assertIsNone(pool.executor)
+                return results
+            finally:
+                pool.close()
+
+        self.assertEqual(len(asyncio.run(run())), 5)
@@ -0,0 +1,68 @@
+import email
+import unittest
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from email_assistant.mime_text import (_lxml_html_to_text, _regex_html_to_text, _selectolax_html_to_text,
+                                      clean_text, extract_body, normalize_charset)
+
+
+class TestMimeText(unittest.TestCase):
+    def test_normalize_charset(self):
+        self.assertEqual(normalize_charset("GB2312"), "gb18030")
+        self.assertEqual(normalize_charset(None), "utf-8")
+        self.assertEqual(normalize_charset("x-unknown-charset"), "utf-8")
+
+    def test_html_declared_charset(self):
+        msg = MIMEMultipart('alternative')
+        msg.attach(MIMEText("<html><body><p>附件为报价，敬请查收</p><script>var x=1;</script></body></html>", 'html', 'gbk'))
+        content = extract_body(email.message_from_bytes(msg.as_bytes()))
+        self.assertIn("附件为报价，敬请查收", content)
+        self.assertNotIn("var x", content)
+
+    def test_plain_preferred_over_html(self):
+        msg = MIMEMultipart('alternative')
+        msg.attach(MIMEText("<p>HTML正文</p>", 'html', 'utf-8'))
+        msg.attach(MIMEText("纯文本正文", 'plain', 'utf-8'))
+        self.assertEqual(extract_body(email.message_from_bytes(msg.as_bytes())), "纯文本正文")
+
+    def test_size_cap(self):
+        msg = MIMEText("测试" * 1000, 'plain', 'utf-8')
+        self.assertEqual(len(extract_body(email.message_from_bytes(msg.as_bytes()), max_chars=100)), 100)
+
+    def test_clean_text(self):
+        text = "  马老师：\n\n  发件人：张三\n  附件为报价\n"
+        self.assertEqual(clean_text(text), "马老师： 附件为报价")
+        self.assertEqual(clean_text("BEGIN:VCALENDAR\nEND:VCALENDAR"), "BEGIN:VCALENDAR\nEND:VCALENDAR")
+
+    def test_single_part_html(self):
+        msg = MIMEText("<html><body><p>堡垒机报价</p></body></html>", 'html', 'gbk')
+        self.assertEqual(extract_body(email.message_from_bytes(msg.as_bytes())).strip(), "堡垒机报价")
+
+    def test_xhtml_declaration(self):
+        html = ('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<html xmlns="http://www.w3.org/1999/xhtml"><body><p>会议纪要</p></body></html>')
+        self.assertEqual(_lxml_html_to_text(html).strip(), "会议纪要")
+        msg = MIMEText(html, 'html', 'utf-8')
+        self.assertIn("会议纪要", extract_body(email.message_from_bytes(msg.as_bytes())))
+
+    def test_block_line_breaks(self):
+        html = "<p>第一段</p><p>第二段<br>第三行</p><div>落款</div>"
+        for html_to_text in (_lxml_html_to_text, _regex_html_to_text):
+            lines = [line for line in html_to_text(html).splitlines() if line.strip()]
+            self.assertEqual(lines, ["第一段", "第二段", "第三行", "落款"])
+
+    def test_html_engines_agree(self):
+        html = "<html><body><p>请于周五前</p><p>提交报价<br>联系人：张三</p><ul><li>堡垒机</li><li>防火墙</li></ul></body></html>"
+        engines = [_lxml_html_to_text, _regex_html_to_text]
+        try:
+            import selectolax.parser  # noqa: F401
+            engines.append(_selectolax_html_to_text)
+        except ImportError:
+            pass
+        for html_to_text in engines:
+            lines = [line for line in html_to_text(html).splitlines() if line.strip()]
+            self.assertEqual(lines, ["请于周五前", "提交报价", "联系人：张三", "堡垒机", "防火墙"], html_to_text.__name__)
+
+    def test_regex_fallback(self):
+        self.assertEqual(_regex_html_to_text("<style>p{}</style><p>A&amp;B</p>").strip(), "A&B")
@@ -0,0 +1,88 @@
+import asyncio
+import importlib
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from email_assistant.profiling import MemoryTracker, ProfilerBusyException, SamplingProfiler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_collapsed_stacks(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+        worker.start()
+        try:
+            stacks = SamplingProfiler(interval=0.001).sample(0.2)
+        finally:
+            stop.set()
+            worker.join()
+
+        busy = [stack for stack in stacks if stack.startswith("busy;")]
+        self.assertTrue(busy)
+        self.assertTrue(any(stack.endswith("busy_loop") for stack in busy))
+        text = SamplingProfiler.to_collapsed(stacks)
+        for line in text.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(int(count) > 0)
+
+    def test_single_profile_at_a_time(self):
+        profiler = SamplingProfiler(interval=0.001)
+        worker = threading.Thread(target=profiler.sample, args=(0.3,))
+        worker.start()
+        time.sleep(0.05)
+        try:
+            with self.assertRaises(ProfilerBusyException):
+                profiler.sample(0.01)
+        finally:
+            worker.join()
+
+
+class TestMemoryTracker(unittest.TestCase):
+    def test_diff(self):
+        tracker = MemoryTracker()
+        with self.assertRaises(RuntimeError):
+            tracker.diff()
+        tracker.start()
+        try:
+            retained = [bytearray(1024) for _ in range(1000)]
+            stats = tracker.diff(top=5)
+            self.assertTrue(stats)
+            self.assertGreaterEqual(stats[0]["sizeDiff"], 1024 * 1000)
+            self.assertIn("test_profiling.py", stats[0]["location"])
+            del retained
+        finally:
+            tracker.stop()
+        self.assertFalse(tracker.running)
+
+
+class TestRequireAdmin(unittest.TestCase):
+    def check(self, host: str = "127.0.0.1", token: str = "secret", **headers):
+        main = importlib.import_module("email_assistant.main")
+        request = SimpleNamespace(
+            state=SimpleNamespace(profiler=object(), config={"admin": {"token": token}}),
+            client=SimpleNamespace(host=host),
+            headers={key.replace("_", "-"): value for key, value in headers.items()})
+        try:
+            asyncio.run(main.require_admin_inject(request))
+        except main.HTTPException as e:
+            return e.status_code
+        return 200
+
+    def test_token_required(self):
+        self.assertEqual(self.check(**{"X-Admin-Token": "secret"}), 200)
+        self.assertEqual(self.check(), 403)
+        self.assertEqual(self.check(**{"X-Admin-Token": "wrong"}), 403)
+        # 未配置令牌时不可用
+        self.assertEqual(self.check(token="", **{"X-Admin-Token": ""}), 403)
+
+    def test_cross_site_rejected(self):
+        self.assertEqual(self.check(origin="https://evil.example.com", **{"X-Admin-Token": "secret"}), 403)
+        self.assertEqual(self.check(origin="http://localhost:3000", **{"X-Admin-Token": "secret"}), 200)
+        self.assertEqual(self.check(host="10.0.0.2", **{"X-Admin-Token": "secret"}), 403)
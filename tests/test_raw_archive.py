@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from email.mime.text import MIMEText
+
+from email_assistant.accounts import make_uid
+from email_assistant.email_processor import EmailPresistence
+from email_assistant.embedding_backend import EmbeddingBackend
+from email_assistant.raw_archive import RawMessageArchive, iter_archived_emails
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+
+class FakeBackend(EmbeddingBackend):
+    model_id = "fake"
+
+    async def embed(self, texts):
+        return [[0.1] * 1024 for _ in texts]
+
+
+def make_raw(subject: str) -> bytes:
+    msg = MIMEText(f"{subject} 正文", 'plain', 'utf-8')
+    msg['Subject'] = subject
+    msg['From'] = 'li.si@example.com'
+    msg['To'] = 'chenxin.ma@example.com'
+    msg['Date'] = 'Mon, 18 Aug 2025 10:00:00 +0800'
+    return msg.as_bytes()
+
+
+class TestRawMessageArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # 分段上限设得很小，验证跨分段读写
+        self.archive = RawMessageArchive(self.tmpdir.name, segment_size=64)
+
+    def tearDown(self):
+        self.archive.close()
+        self.tmpdir.cleanup()
+
+    def test_append_and_get(self):
+        messages = {uid: f"Subject: {uid}\r\n\r\n{'x' * 40}".encode() for uid in range(1, 6)}
+        for uid, raw in messages.items():
+            self.archive.append(uid, "INBOX", raw)
+        self.archive.commit()
+
+        for uid, raw in messages.items():
+            self.assertEqual(self.archive.get(uid), raw)
+        self.assertIsNone(self.archive.get(1, "Sent"))
+        self.assertEqual([uid for uid, _, _ in self.archive.iter_messages("INBOX")], list(messages))
+        self.assertGreater(self.archive.segment, 0)
+
+    def test_reopen(self):
+        self.archive.append(1, "INBOX", b"Subject: a\r\n\r\nbody")
+        self.archive.close()
+        self.archive = RawMessageArchive(self.tmpdir.name, segment_size=64)
+        self.assertEqual(self.archive.get(1), b"Subject: a\r\n\r\nbody")
+        self.assertEqual(self.archive.count(), 1)
+
+
+@unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+class TestReindex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.archive = RawMessageArchive(os.path.join(self.tmpdir.name, "raw"))
+        self.db_file = os.path.join(self.tmpdir.name, "test.db")
+        EmailPresistence.init_database(self.db_file)
+        self.persistence = EmailPresistence(self.db_file, "", embedding_backend=FakeBackend())
+        self.persistence.connect()
+
+    def tearDown(self):
+        self.persistence.close()
+        self.archive.close()
+        self.tmpdir.cleanup()
+
+    def test_reindex_keeps_accounts(self):
+        for account_id, local_uid in ((0, 5), (0, 6), (1, 3)):
+            self.archive.append(make_uid(account_id, local_uid), "INBOX", make_raw(f"{account_id}-{local_uid}"))
+        self.archive.commit()
+
+        async def reindex():
+            async for email in iter_archived_emails(self.archive):
+                self.assertTrue(await self.persistence.save_emails_to_db(email))
+            self.persistence.commit()
+
+        asyncio.run(reindex())
+        rows = self.persistence.conn.execute(  # pyright: ignore[reportOptionalMemberAccess]
+            "SELECT uid, account_id FROM emails ORDER BY uid").fetchall()
+        self.assertEqual(rows, [(5, 0), (6, 0), (make_uid(1, 3), 1)])
+        self.assertEqual(self.persistence.get_last_uid("INBOX", 0), 6)
+        self.assertEqual(self.persistence.get_last_uid("INBOX", 1), 3)
@@ -0,0 +1,70 @@
+import re
+import unittest
+
+import jieba
+
+from email_assistant.task_extract import TaskColumns, extract_tasks, extract_tasks_batch
+
+TEXTS = [
+    "请在周五前完成合同审核，待办事项：整理报价单",
+    "今天天气不错",
+    "下周的工作安排如下：\n- [ ] 部署堡垒机",
+    "",
+    "务必推进项目验收，任务：提交验收报告",
+    "本周计划\r\n下周安排 工作\n请联系TODO: 部署 Agent 工作",
+]
+
+
+def legacy_extract_tasks(text: str):
+    """逐个正则扫描并对整段文本分词的原始实现"""
+    tasks = []
+    for pattern in [
+        r'(?:(?:需要|请|要|应该|必须|务必|得).*?)(?:完成|做|处理|执行|实施|开展|进行|推进|落实)',
+        r'(?:任务|工作|事项).*?(?:：|:)',
+        r'(?:待办|TODO|To-do).*?(?:：|:)',
+        r'- \[ \] .*',
+    ]:
+        tasks.extend(re.findall(pattern, text, re.IGNORECASE))
+    words = jieba.lcut(text)
+    for i, word in enumerate(words):
+        if word in ['任务', '工作', '待办', '计划', '安排'] and i < len(words) - 1:
+            tasks.append(word + words[i + 1])
+    return {task.strip(' -[]') for task in set(tasks) if len(task.strip()) > 2}
+
+
+class TestExtractTasks(unittest.TestCase):
+    def test_single(self):
+        tasks = extract_tasks(TEXTS[0])
+        self.assertIn("请在周五前完成", tasks)
+        self.assertIn("待办事项：", tasks)
+        self.assertEqual(extract_tasks(TEXTS[1]), [])
+
+    def test_batch_matches_single(self):
+        columns = extract_tasks_batch(TEXTS)
+        self.assertIsInstance(columns, TaskColumns)
+        self.assertEqual(len(columns.doc_index), len(columns.task))
+        self.assertEqual(columns.doc_index, sorted(columns.doc_index))
+        for i, text in enumerate(TEXTS):
+            self.assertEqual(columns.for_doc(i), extract_tasks(text), text)
+
+    def test_same_as_legacy(self):
+        # 合并的正则不再返回被同一处更长匹配覆盖的子串，其余结果与原始实现一致
+        for text in TEXTS:
+            tasks = set(extract_tasks(text))
+            legacy = legacy_extract_tasks(text)
+            self.assertTrue(tasks <= legacy, text)
+            for task in legacy - tasks:
+                self.assertTrue(any(task in other for other in tasks), task)
+
+    def test_markdown_and_indicator(self):
+        tasks = extract_tasks(TEXTS[2])
+        self.assertIn("- [ ] 部署堡垒机".strip(' -[]'), tasks)
+        self.assertTrue(any(task.startswith("工作") for task in tasks))
+
+    def test_process_pool(self):
+        texts = TEXTS * 20
+        self.assertEqual(extract_tasks_batch(texts, workers=2, chunksize=8), extract_tasks_batch(texts))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+
+from email_assistant.email_processor import EmailPresistence
+from email_assistant.embedding_backend import EmbeddingBackend
+from email_assistant.tasks import STATUS_DONE, TaskStore
+from email_assistant.type import Email, EmailAttribute
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+REFERENCE = datetime(2025, 8, 20, 10, 0)
+
+
+class FakeBackend(EmbeddingBackend):
+    model_id = "fake"
+
+    async def embed(self, texts):
+        return [[0.1] * 1024 for _ in texts]
+
+
+class TestTaskStore(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE emails (uid INTEGER UNIQUE, subject TEXT, sender TEXT, account_id INTEGER)")
+        self.conn.execute("INSERT INTO emails VALUES (1, '合同', 'a@example.com', 0)")
+        TaskStore.create_table(self.conn)
+        self.store = TaskStore(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def save(self, uid: int, attention_datetime: str, content: str = "提供合同到期进度") -> bool:
+        return self.store.save_from_attribute(
+            EmailAttribute(uid=uid, datetime=attention_datetime, content=content), REFERENCE)
+
+    def test_due_between(self):
+        self.assertTrue(self.save(1, "明天"))
+        self.assertTrue(self.save(2, "2025年9月底"))
+        self.assertTrue(self.save(3, "8月1日"))
+        # 无法解析的日期保留文本，不参与范围查询
+        self.assertTrue(self.save(4, "待定"))
+        self.assertFalse(self.save(5, "-"))
+
+        tasks = self.store.due_between(REFERENCE, datetime(2025, 8, 27))
+        self.assertEqual([task["uid"] for task in tasks], [1])
+        self.assertEqual(tasks[0]["subject"], "合同")
+        self.assertEqual(tasks[0]["due_at"], "2025-08-21T23:59:59")
+        overdue = self.store.due_between(None, datetime(2025, 10, 1))
+        self.assertEqual([task["uid"] for task in overdue], [3, 1, 2])
+        self.assertEqual(self.conn.execute("SELECT count(1) FROM email_tasks").fetchone()[0], 4)
+
+    def test_reextract_keeps_status(self):
+        self.save(1, "明天")
+        task_id = self.store.due_between(None, datetime(2026, 1, 1))[0]["id"]
+        self.assertTrue(self.store.set_status(task_id, STATUS_DONE))
+        self.save(1, "后天")
+        self.assertEqual(self.store.due_between(None, datetime(2026, 1, 1)), [])
+        done = self.store.due_between(None, datetime(2026, 1, 1), status=STATUS_DONE)
+        self.assertEqual(done[0]["due_at"], "2025-08-22T23:59:59")
+        # 重新抽取后没有关注日期时间，删除待办
+        self.save(1, "-")
+        self.assertEqual(self.store.due_between(None, datetime(2026, 1, 1), status=STATUS_DONE), [])
+
+    def test_range_uses_index(self):
+        plan = " ".join(str(row[3]) for row in self.conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT id FROM email_tasks WHERE status = 'open' AND due_at >= 0 AND due_at < 100 ORDER BY due_at
+        '''))
+        self.assertIn("idx_email_tasks_due", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+@unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+class TestPersistenceTasks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        EmailPresistence.init_database(self.db_file)
+        self.persistence = EmailPresistence(self.db_file, "", embedding_backend=FakeBackend())
+        self.persistence.connect()
+
+    def tearDown(self):
+        self.persistence.close()
+        self.tmp.cleanup()
+
+    def test_attribute_creates_task(self):
+        email = Email(uid=1, subject="合同", sender="a@example.com", recipient="b@example.com",
+                      date=REFERENCE.astimezone(), content="请明天提供合同到期进度", folder="INBOX")
+        asyncio.run(self.persistence.save_emails_to_db(email))
+        self.persistence.save_email_attributes_to_db(EmailAttribute(uid=1, datetime="明天", content="提供合同到期进度"))
+        store = TaskStore(self.persistence.conn)  # pyright: ignore[reportArgumentType]
+        # 相对日期以邮件日期为基准
+        tasks = store.due_between(None, datetime(2026, 1, 1))
+        self.assertEqual([task["due_at"] for task in tasks], ["2025-08-21T23:59:59"])
+
+        self.persistence.delete_email(1)
+        self.assertEqual(store.due_between(None, datetime(2026, 1, 1)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from email_assistant.templates import CompiledTemplate, TemplateManager, iter_csv_rows
+from email_assistant.type import Template
+
+
+class TestCompiledTemplate(unittest.TestCase):
+    def test_render(self):
+        template = CompiledTemplate("【会议邀请】{topic}讨论会，时间：{time}")
+        self.assertEqual(template.keys, {"topic", "time"})
+        self.assertEqual(template.render({"topic": "堡垒机", "time": "周一"}), "【会议邀请】堡垒机讨论会，时间：周一")
+
+    def test_missing_value_is_kept(self):
+        template = CompiledTemplate("{date}工作情况：{task1}")
+        self.assertEqual(template.render({"date": "8月18日"}), "8月18日工作情况：{task1}")
+
+    def test_value_is_not_rendered_again(self):
+        template = CompiledTemplate("{a}-{b}")
+        self.assertEqual(template.render({"a": "{b}", "b": 1}), "{b}-1")
+
+
+class TestTemplateManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = TemplateManager(templates=[
+            Template(id=1, name="通知", subject="{name}，{topic}通知", content="{name}您好：\n{topic}安排如下。"),
+        ])
+
+    def test_render_template(self):
+        rendered = self.manager.render_template("通知", name="张三", topic="放假")
+        self.assertEqual(rendered, {"subject": "张三，放假通知", "content": "张三您好：\n放假安排如下。"})
+
+    def test_unknown_template(self):
+        with self.assertRaises(ValueError):
+            self.manager.render_template("不存在")
+
+    def test_render_many_from_csv(self):
+        csv = io.StringIO("email,name,topic\nzhang@example.com,张三,放假\nli@example.com,李四,\n")
+        rendered = list(self.manager.render_many("通知", iter_csv_rows(csv, chunksize=1)))
+        self.assertEqual(len(rendered), 2)
+        self.assertEqual(rendered[0]["recipient"], "zhang@example.com")
+        self.assertEqual(rendered[1]["subject"], "李四，通知")
+
+    def test_replacing_templates_clears_cache(self):
+        self.manager.render_template("通知")
+        self.manager.templates = [Template(id=1, name="通知", subject="新{name}", content="")]
+        self.assertEqual(self.manager.render_template("通知", name="通知")["subject"], "新通知")
+
+
+class TestTemplateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("CREATE TABLE templates (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, subject TEXT, content TEXT)")
+        conn.close()
+        self.manager = TemplateManager(self.db_file)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_defaults_created_once(self):
+        self.assertEqual([t.name for t in self.manager.templates], ["工作汇报", "会议邀请"])
+        self.assertEqual(len(TemplateManager(self.db_file).templates), 2)
+
+    def test_write_through(self):
+        etag = self.manager.etag
+        listing = self.manager.list_templates()
+        # 修改后不再重新读取整张表
+        self.manager.load_templates = None  # pyright: ignore[reportAttributeAccessIssue]
+
+        template = Template(name="通知", subject="{name}通知", content="")
+        self.assertTrue(self.manager.save_template(template))
+        self.assertNotEqual(self.manager.etag, etag)
+        self.assertIsNot(self.manager.list_templates(), listing)
+        self.assertEqual(self.manager.render_template("通知", name="放假")["subject"], "放假通知")
+
+        template.name = "公告"
+        self.assertTrue(self.manager.save_template(template))
+        self.assertIsNone(self.manager.get_template_by_name("通知"))
+        self.assertTrue(self.manager.delete_template(template.id))
+        self.assertIsNone(self.manager.get_template_by_name("公告"))
+        self.assertEqual([t.name for t in TemplateManager(self.db_file).templates], ["工作汇报", "会议邀请"])
+
+    def test_failed_write_keeps_cache(self):
+        version = self.manager.version
+        self.assertFalse(self.manager.save_template(Template(name="工作汇报", subject="", content="")))
+        self.assertEqual(self.manager.version, version)
+        self.assertEqual(self.manager.get_template_by_name("工作汇报").subject, "【工作汇报】{date}工作情况")  # pyright: ignore[reportOptionalMemberAccess]
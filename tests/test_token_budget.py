@@ -0,0 +1,110 @@
+import asyncio
+import datetime
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from email_assistant.ai_processor import AIProcessor, SummaryBudget, summary_cache
+from email_assistant.email_processor import EmailPresistence
+from email_assistant.token_budget import HEURISTIC, TokenCounter, get_token_counter
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+
+class TestTokenCounter(unittest.TestCase):
+    def test_heuristic_count(self):
+        counter = get_token_counter("", HEURISTIC)
+        self.assertEqual(counter.name, HEURISTIC)
+        self.assertEqual(counter.count(""), 0)
+        self.assertEqual(counter.count(None), 0)
+        # 中文每字 1 个，其余每 4 个字符 1 个
+        self.assertEqual(counter.count("请在周五前提交"), 7)
+        self.assertEqual(counter.count("abcdefgh"), 2)
+        self.assertEqual(counter.count("提交report"), 2 + 2)
+
+    def test_heuristic_truncate(self):
+        counter = TokenCounter()
+        self.assertEqual(counter.truncate("请在周五前提交", 4), "请在周五")
+        self.assertEqual(counter.truncate("短文本", 10), "短文本")
+        self.assertEqual(counter.truncate("短文本", 0), "短文本")
+        self.assertLessEqual(counter.count(counter.truncate("a" * 100 + "中文" * 50, 30)), 30)
+
+
+@unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+class TestSummaryBatching(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        EmailPresistence.init_database(self.db_file)
+        self.conn = sqlite3.connect(self.db_file)
+        for uid in range(1, 21):
+            self.conn.execute('''
+                INSERT INTO emails (uid, subject, content, folder, local_day) VALUES (?, '周报', '正文', 'INBOX', ?)
+            ''', (uid, "2025-08-18"))
+            self.conn.execute('''
+                INSERT INTO email_attributes (uid, recipient, datetime, content) VALUES (?, '各位同事', '-', ?)
+            ''', (uid, "提交本周工作进度" * 20))
+        self.conn.commit()
+        summary_cache.clear()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def _summarize(self, budget: SummaryBudget):
+        processor = AIProcessor(embedding_base_url="https://example.com", summary_budget=budget)
+        prompts = []
+
+        async def run_summary_agent(prompt: str):
+            prompts.append(prompt)
+            return SimpleNamespace(output=f"摘要{len(prompts)}")
+
+        processor._run_summary_agent = run_summary_agent
+        summary = asyncio.run(processor.generate_summary(datetime.date(2025, 8, 18), "我", self.conn))
+        return summary, prompts
+
+    def test_single_call_when_fits(self):
+        summary, prompts = self._summarize(SummaryBudget(tokenizer=HEURISTIC))
+        self.assertEqual(len(prompts), 1)
+        self.assertEqual(prompts[0].count("<Content>"), 20)
+        self.assertEqual(summary, "摘要1")
+
+    def test_prompts_within_budget(self):
+        budget = SummaryBudget(context_window=2048, budget_ratio=1.0, max_output_tokens=1024,
+                               max_mail_tokens=100, tokenizer=HEURISTIC)
+        summary, prompts = self._summarize(budget)
+        self.assertGreater(len(prompts), 1)
+        self.assertEqual(summary, f"摘要{len(prompts)}")
+        counter = get_token_counter("", HEURISTIC)
+        for prompt in prompts:
+            self.assertLessEqual(counter.count(prompt), budget.prompt_tokens)
+        # 超长内容按 maxMailTokens 截断，所有邮件都被处理
+        self.assertEqual(sum(prompt.count("<Content>") for prompt in prompts), 20)
+        self.assertNotIn("提交本周工作进度" * 20, "".join(prompts))
+
+    def test_counter_loaded_off_event_loop(self):
+        threads = []
+
+        def load(model_name, encoding_name):
+            threads.append(threading.current_thread())
+            return get_token_counter("", HEURISTIC)
+
+        with mock.patch("email_assistant.ai_processor.get_token_counter", load):
+            self._summarize(SummaryBudget(tokenizer=HEURISTIC))
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_oversized_mail_still_sent(self):
+        # 预算小于单封邮件时每次请求仍包含一封邮件
+        budget = SummaryBudget(context_window=100, budget_ratio=1.0, max_output_tokens=10,
+                               max_mail_tokens=0, tokenizer=HEURISTIC)
+        _, prompts = self._summarize(budget)
+        self.assertEqual(len(prompts), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
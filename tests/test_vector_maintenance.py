@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import os
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from email_assistant.email_processor import EmailClient, EmailPresistence, needs_compaction
+from email_assistant.embedding_backend import EmbeddingBackend
+from email_assistant.type import Email
+from email_assistant.work_queue import JOB_EMBEDDING, RepairWorker, WorkQueue
+
+CAN_LOAD_EXTENSION = hasattr(sqlite3.Connection, "enable_load_extension")
+
+
+class FakeBackend(EmbeddingBackend):
+    model_id = "fake"
+
+    def __init__(self):
+        self.texts = []
+
+    async def embed(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text))] * 1024 for text in texts]
+
+
+class LockProbeBackend(FakeBackend):
+    """嵌入请求期间尝试从另一个连接写入，记录数据库是否被锁定"""
+
+    def __init__(self, db_file: str):
+        super().__init__()
+        self.db_file = db_file
+        self.locked = []
+
+    async def embed(self, texts):
+        conn = sqlite3.connect(self.db_file, timeout=0)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ROLLBACK")
+            self.locked.append(False)
+        except sqlite3.OperationalError:
+            self.locked.append(True)
+        finally:
+            conn.close()
+        return await super().embed(texts)
+
+
+def make_email(uid: int, lines: int, message_id: str = "") -> Email:
+    content = "\n".join(f"第{i}行：堡垒机采购进度" for i in range(lines))
+    return Email(uid=uid, subject="周报", sender="张三 <zhang.san@example.com>",
+                 recipient="李四 <li.si@example.com>", date=datetime.datetime(2025, 8, 18, 10, 0, 0),
+                 content=content, folder="INBOX", message_id=message_id)
+
+
+@unittest.skipUnless(CAN_LOAD_EXTENSION, "sqlite3 不支持加载扩展")
+class TestVectorMaintenance(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "test.db")
+        EmailPresistence.init_database(self.db_file)
+        self.backend = FakeBackend()
+        self.persistence = EmailPresistence(self.db_file, "", embedding_backend=self.backend)
+        self.persistence.connect()
+
+    def tearDown(self):
+        self.persistence.close()
+        self.tmp.cleanup()
+
+    def count(self, sql: str) -> int:
+        return self.persistence.conn.execute(sql).fetchone()[0]  # pyright: ignore[reportOptionalMemberAccess]
+
+    def save(self, email: Email):
+        self.assertTrue(asyncio.run(self.persistence.save_emails_to_db(email)))
+        self.persistence.commit()
+
+    def test_reprocess_does_not_duplicate(self):
+        self.save(make_email(1, 12))
+        self.assertEqual(self.count("SELECT count(1) FROM email_vectors"), 3)
+        embedded = len(self.backend.texts)
+
+        self.save(make_email(1, 12))
+        self.assertEqual(self.count("SELECT count(1) FROM email_vectors"), 3)
+        self.assertEqual(len(self.backend.texts), embedded)
+
+    def test_changed_and_removed_segments(self):
+        self.save(make_email(1, 12))
+        email = make_email(1, 6)
+        email.content = email.content.replace("第5行", "第五行")
+        self.save(email)
+        # 第二段内容变化，第三段被删除
+        self.assertEqual(self.count("SELECT count(1) FROM email_vectors"), 2)
+        self.assertEqual(self.count("SELECT count(1) FROM email_segments"), 2)
+        self.assertEqual(self.persistence.vector_stats()["orphans"], 0)
+
+    def test_prune_expunged(self):
+        self.save(make_email(1, 6, "<a@example.com>"))
+        self.save(make_email(2, 6, "<b@example.com>"))
+        pruned = self.persistence.prune_expunged("INBOX", datetime.datetime(2025, 8, 1), {"<a@example.com>"})
+        self.assertEqual(pruned, 1)
+        self.assertIsNone(self.persistence.get_email_by_uid(2))
+        self.assertEqual(self.count("SELECT count(1) FROM email_vectors WHERE uid = 2"), 0)
+        self.assertEqual(self.count("SELECT count(1) FROM email_segments WHERE uid = 2"), 0)
+
+    def test_prune_normalized_message_ids(self):
+        self.save(make_email(1, 6, "<a@example.com>"))
+        self.save(make_email(2, 6, "<b@example.com>"))
+        headers = [b"Message-ID:\r\n <a@example.com>\r\n\r\n", b"Message-ID: <b@example.com> (Postfix)\r\n\r\n"]
+        client = EmailClient("imap.example.com", 993, "", "")
+        client.client = SimpleNamespace(  # pyright: ignore[reportAttributeAccessIssue]
+            select=lambda folder: ("OK", [b"2"]),
+            search=lambda charset, criteria: ("OK", [b"1 2"]),
+            fetch=lambda ids, parts: ("OK", [(b"1 (BODY[HEADER.FIELDS (MESSAGE-ID)]", header) for header in headers]))
+        live = client.list_message_ids(days=30)
+        self.assertEqual(live, {"<a@example.com>", "<b@example.com>"})
+        self.assertEqual(self.persistence.prune_expunged("INBOX", datetime.datetime(2025, 8, 1), live), 0)
+
+    def test_prune_margin(self):
+        # IMAP SINCE 起点一天内的邮件不检查
+        self.save(make_email(1, 6, "<a@example.com>"))
+        self.assertEqual(self.persistence.prune_expunged("INBOX", datetime.datetime(2025, 8, 18), set()), 0)
+        self.assertEqual(self.persistence.prune_expunged("INBOX", datetime.datetime(2025, 8, 17), set()), 1)
+
+    def test_compact_keeps_live_vectors(self):
+        for uid in range(1, 5):
+            self.save(make_email(uid, 6))
+        conn = self.persistence.conn
+        # 模拟旧版本留下的重复向量和已删除邮件的向量
+        conn.execute("INSERT INTO email_vectors (uid, embedding) VALUES (1, ?)", (bytes(4096),))  # pyright: ignore[reportOptionalMemberAccess]
+        conn.execute("DELETE FROM emails WHERE uid = 4")  # pyright: ignore[reportOptionalMemberAccess]
+        self.assertEqual(self.persistence.vector_stats()["orphans"], 3)
+
+        result = self.persistence.compact_vectors()
+        self.assertEqual(result["after"]["orphans"], 0)
+        self.assertEqual(result["after"]["live"], 6)
+        self.assertEqual(self.count("SELECT count(1) FROM email_segments"), 6)
+
+    def test_compact_in_worker_thread(self):
+        # 连接在事件循环线程中打开，压缩在 asyncio.to_thread 的工作线程中执行
+        for uid in range(1, 5):
+            self.save(make_email(uid, 6))
+        self.persistence.delete_email(4)
+        self.persistence.commit()
+        result = asyncio.run(asyncio.to_thread(self.persistence.compact_vectors_isolated))
+        self.assertEqual(result["after"]["live"], 6)
+        self.assertEqual(self.count("SELECT count(1) FROM email_vectors"), 6)
+
+    def test_cheap_stats(self):
+        for uid in range(1, 5):
+            self.save(make_email(uid, 6))
+        self.persistence.delete_email(4)
+        cheap = self.persistence.vector_stats(full=False)
+        full = self.persistence.vector_stats()
+        self.assertEqual(cheap["live"], full["live"])
+        self.assertEqual(cheap["capacity"], full["capacity"])
+
+    def test_repair_worker_compacts(self):
+        for uid in range(1, 5):
+            self.save(make_email(uid, 6))
+        for uid in range(1, 4):
+            self.persistence.delete_email(uid)
+        self.persistence.commit()
+
+        def factory():
+            return EmailPresistence(self.db_file, "", embedding_backend=self.backend)
+
+        compact = mock.patch.object(EmailPresistence, "compact_vectors_isolated", return_value={})
+        # 默认阈值下不足一个 chunk 的无效槽位不压缩
+        with compact as compacted:
+            asyncio.run(RepairWorker(factory, "fake", storage_config={}).run_once())
+            compacted.assert_not_called()
+        with compact as compacted, mock.patch("email_assistant.email_processor.VECTOR_CHUNK_SIZE", 0):
+            asyncio.run(RepairWorker(factory, "fake", storage_config={"vectorCompactRatio": 0.5}).run_once())
+            compacted.assert_called_once()
+
+
+    def test_no_write_lock_while_embedding(self):
+        backend = LockProbeBackend(self.db_file)
+        self.persistence.embedding_backend = backend
+        self.save(make_email(1, 6))
+        email = make_email(1, 12)
+        self.save(email)
+
+        # 重试任务在独立连接上向量化
+        WorkQueue(self.persistence.conn).fail(1, JOB_EMBEDDING, "429")  # pyright: ignore[reportArgumentType]
+        self.persistence.conn.execute("UPDATE email_jobs SET next_retry_at = ?",  # pyright: ignore[reportOptionalMemberAccess]
+                                      (datetime.datetime(2000, 1, 1),))
+        self.persistence.conn.execute("DELETE FROM email_segments WHERE chunk = 2")  # pyright: ignore[reportOptionalMemberAccess]
+        self.persistence.commit()
+
+        def factory():
+            return EmailPresistence(self.db_file, "", embedding_backend=backend)
+
+        done = asyncio.run(RepairWorker(factory, "fake").run_once())
+        self.assertEqual(done[JOB_EMBEDDING], 1)
+        self.assertEqual(backend.locked, [False, False, False])
+        self.assertEqual(self.count("SELECT count(1) FROM email_segments WHERE uid = 1"), 3)
+
+
+class TestNeedsCompaction(unittest.TestCase):
+    def test_threshold(self):
+        self.assertFalse(needs_compaction({"live": 1000, "capacity": 1024, "orphans": 0}, {}))
+        self.assertTrue(needs_compaction({"live": 1000, "capacity": 4096, "orphans": 0}, {}))
+        self.assertFalse(needs_compaction({"live": 1000, "capacity": 4096, "orphans": 0},
+                                          {"vectorCompactRatio": 0}))
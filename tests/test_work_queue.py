@@ -0,0 +1,101 @@
+import asyncio
+import datetime
+import sqlite3
+import unittest
+
+from email_assistant.type import Email
+from email_assistant.work_queue import (JOB_EMBEDDING, JOB_EXTRACTION, RepairWorker, WorkQueue,
+                                        next_retry_delay)
+
+
+def make_email(uid: int) -> Email:
+    return Email(uid=uid, subject="周报", sender="张三 <zhang.san@example.com>",
+                 recipient="李四 <li.si@example.com>", date=datetime.datetime(2025, 8, 18, 10, 0, 0),
+                 content="本周完成堡垒机采购", folder="INBOX")
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        WorkQueue.create_table(self.conn)
+        self.queue = WorkQueue(self.conn, max_attempts=3)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def make_due(self):
+        self.conn.execute("UPDATE email_jobs SET next_retry_at = ?", (datetime.datetime(2000, 1, 1),))
+
+    def test_fail_and_complete(self):
+        self.queue.fail(1, JOB_EMBEDDING, "429 Too Many Requests")
+        self.assertEqual(self.queue.due(JOB_EMBEDDING), [])
+        self.assertEqual(self.queue.depth()[JOB_EMBEDDING], {"pending": 1, "due": 0, "failed": 0})
+
+        self.make_due()
+        jobs = self.queue.due(JOB_EMBEDDING)
+        self.assertEqual([(job.uid, job.attempts) for job in jobs], [(1, 1)])
+
+        self.queue.complete(1, JOB_EMBEDDING)
+        self.assertEqual(self.queue.depth()[JOB_EMBEDDING]["pending"], 0)
+
+    def test_max_attempts(self):
+        for _ in range(3):
+            self.queue.fail(1, JOB_EXTRACTION, "超时")
+        self.make_due()
+        self.assertEqual(self.queue.due(JOB_EXTRACTION), [])
+        self.assertEqual(self.queue.depth()[JOB_EXTRACTION], {"pending": 0, "due": 0, "failed": 1})
+
+    def test_backoff_grows(self):
+        self.assertLess(next_retry_delay(1), next_retry_delay(4))
+        self.assertLessEqual(next_retry_delay(100), datetime.timedelta(hours=6) * 1.2)
+
+
+class FakePersistence:
+    def __init__(self, conn: sqlite3.Connection, succeed: bool):
+        self.conn = conn
+        self.succeed = succeed
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def commit(self):
+        self.conn.commit()
+
+    def get_email_by_uid(self, uid):
+        return make_email(uid) if uid != 404 else None
+
+    async def embed_email(self, email, queue):
+        if self.succeed:
+            queue.complete(int(email.uid), JOB_EMBEDDING)
+        else:
+            queue.fail(int(email.uid), JOB_EMBEDDING, "连接失败")
+        return self.succeed
+
+
+class TestRepairWorker(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        WorkQueue.create_table(self.conn)
+        self.queue = WorkQueue(self.conn)
+        for uid in (1, 404):
+            self.queue.fail(uid, JOB_EMBEDDING, "429")
+        self.conn.execute("UPDATE email_jobs SET next_retry_at = ?", (datetime.datetime(2000, 1, 1),))
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_embedding_retry_succeeds(self):
+        persistence = FakePersistence(self.conn, succeed=True)
+        done = asyncio.run(RepairWorker(lambda: persistence, "qwen").run_once())
+        self.assertEqual(done[JOB_EMBEDDING], 1)
+        self.assertEqual(self.queue.depth()[JOB_EMBEDDING]["pending"], 0)
+
+    def test_embedding_retry_backs_off(self):
+        persistence = FakePersistence(self.conn, succeed=False)
+        asyncio.run(RepairWorker(lambda: persistence, "qwen").run_once())
+        jobs = self.conn.execute("SELECT uid, attempts FROM email_jobs").fetchall()
+        self.assertEqual(jobs, [(1, 2)])
+        self.assertEqual(self.queue.due(JOB_EMBEDDING), [])